@@ -0,0 +1,6 @@
+"""
+Benchmark suite for mini-code-agent.
+
+使用方式: python -m benchmarks run --size small
+详见 benchmarks/README.md
+"""
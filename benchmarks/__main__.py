@@ -0,0 +1,162 @@
+"""
+Command line entry point: python -m benchmarks {run,compare,generate}.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from . import bench_agent, bench_startup, bench_tools
+from .harness import (
+    compare_results,
+    format_results,
+    git_revision,
+    run_case,
+    run_case_in_child,
+    save_results,
+)
+from .workspace import SIZES, ensure_workspace
+
+SUITES = {
+    "tools": bench_tools,
+    "agent": bench_agent,
+    "startup": bench_startup,
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _default_output(size: str) -> str:
+    rev = git_revision(os.path.dirname(os.path.abspath(__file__)))
+    name = rev["commit"] or "unknown"
+    if rev["dirty"]:
+        name += "-dirty"
+    return os.path.join(RESULTS_DIR, f"{name}-{size}.json")
+
+
+def cmd_run(args) -> int:
+    manifest = ensure_workspace(args.size, args.seed, args.workspace_dir)
+    scratch = tempfile.mkdtemp(prefix="mini-code-agent-bench-")
+    ctx = {"manifest": manifest, "root": manifest["root"], "scratch": scratch}
+    print(
+        f"📁 工作区: {manifest['root']} ({manifest['n_files']} 个文件, "
+        f"{manifest['total_bytes'] / 1024 / 1024:.1f} MB)"
+    )
+
+    results = []
+    try:
+        for suite in args.suite.split(","):
+            for case in SUITES[suite].cases(ctx):
+                if args.filter and args.filter not in case.name:
+                    continue
+                if args.repeat:
+                    case.repeat = args.repeat
+                case.params = {**case.params, "size": args.size}
+                print(f"⏱️  {case.suite}/{case.name} ...", flush=True)
+                isolate = not args.no_isolate
+                results.append(run_case(case, ctx, isolate=isolate))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(format_results(results))
+    output = args.output or _default_output(args.size)
+    save_results(
+        output,
+        results,
+        {
+            "size": args.size,
+            "seed": args.seed,
+            "n_files": manifest["n_files"],
+            "total_bytes": manifest["total_bytes"],
+            "suites": args.suite,
+        },
+    )
+    print(f"✅ 结果已保存: {output}")
+    return 1 if any(r.get("error") for r in results) else 0
+
+
+def cmd_case(args) -> int:
+    with open(args.ctx, encoding="utf-8") as f:
+        ctx = json.load(f)
+    case = next(
+        c for c in SUITES[args.suite].cases(ctx) if c.name == args.name
+    )
+    run_case_in_child(case, args.ctx, args.out, args.repeat)
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(compare_results(base, new, args.threshold))
+    return 0
+
+
+def cmd_generate(args) -> int:
+    manifest = ensure_workspace(args.size, args.seed, args.workspace_dir)
+    print(
+        f"✅ {manifest['root']}: {manifest['n_files']} 个文件, "
+        f"{manifest['directories']} 个目录"
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def _workspace_args(p):
+        p.add_argument(
+            "--size",
+            default="small",
+            help=f"workspace size: {', '.join(SIZES)} or a file count",
+        )
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument(
+            "--workspace-dir",
+            default=None,
+            help="where generated workspaces are cached",
+        )
+
+    run = sub.add_parser("run", help="run benchmarks and save JSON results")
+    _workspace_args(run)
+    run.add_argument("--suite", default="tools,agent,startup")
+    run.add_argument("--filter", default=None, help="substring of case name")
+    run.add_argument("--repeat", type=int, default=None)
+    run.add_argument("--output", default=None)
+    run.add_argument(
+        "--no-isolate",
+        action="store_true",
+        help="run cases in this process (peak RSS becomes cumulative)",
+    )
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="compare two results files")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.1)
+    compare.set_defaults(func=cmd_compare)
+
+    case = sub.add_parser("case", help=argparse.SUPPRESS)
+    case.add_argument("--ctx", required=True)
+    case.add_argument("--suite", required=True)
+    case.add_argument("--name", required=True)
+    case.add_argument("--repeat", type=int, required=True)
+    case.add_argument("--out", required=True)
+    case.set_defaults(func=cmd_case)
+
+    generate = sub.add_parser("generate", help="only generate a workspace")
+    _workspace_args(generate)
+    generate.set_defaults(func=cmd_generate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
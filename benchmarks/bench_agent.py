@@ -0,0 +1,491 @@
+"""
+End-to-end Agent benchmarks driven by a scripted fake LM.
+
+The LM is dspy's DummyLM fed a fixed script of thoughts and tool calls, so
+every run performs exactly the same steps against the synthetic workspace
+and measures the agent loop and tools without any network calls.
+
+The concurrency cases run several agents, each with its own model name,
+against the stub LM endpoint (core/stub_lm.py) with simulated latency,
+once one after another and once in a thread pool. Every run checks that
+its answer came from its own agent's model, so the threaded case doubles
+as an isolation stress test. The routing cases run one agent against two
+stub endpoints, a slow "strong" and a fast "fast" model, with and without
+fast-first routing.
+
+The resume case kills a scripted run with SIGKILL in a child process
+halfway through, then times Agent.resume on a copy of its checkpoint and
+checks that no recorded LM answer was requested again.
+
+The LM cache case records one scripted run and then times replays of it
+with an LM that has no answers left, so every LM call must be served from
+the on-disk response cache.
+"""
+
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from .harness import Case
+from .workspace import copy_tree_files
+
+_CONFIG = """\
+dspy:
+  model: "openai/bench-fake"
+  api_key: "bench"
+agent:
+  max_iters: {max_iters}
+  memoize_tools: {memoize}
+tracing:
+  enabled: {traced}
+  memory: {traced}
+  print_summary: false
+checkpoint:
+  enabled: true
+  directory: "{home}/checkpoints"
+"""
+
+
+_REQUIREMENT = "Find the needles and tidy the files."
+
+
+def _call(name: str, **args) -> Dict:
+    return {"name": name, "args": args}
+
+
+def build_script(ctx: Dict, scratch: str, n_steps: int) -> List[Dict]:
+    """
+    Build the LM answers for one run.
+
+    The steps cycle through batched searches, batched reads, a regex search
+    and an edit of a scratch copy, then finish and extract the answer.
+
+    :param ctx: Benchmark context with the workspace manifest
+    :param scratch: Directory holding editable copies of workspace files
+    :param n_steps: Number of tool steps before finish
+    :return: Answers for DummyLM
+    """
+    root = ctx["root"]
+    manifest = ctx["manifest"]
+    needles = manifest["needles"] or [["NEEDLE_0", ""]]
+    samples = manifest["sample_files"]
+    answers = []
+    for step in range(n_steps):
+        kind = step % 4
+        needle = needles[step % len(needles)][0]
+        reads = [
+            os.path.join(root, samples[(step * 4 + i) % len(samples)])
+            for i in range(4)
+        ]
+        if kind == 0:
+            calls = [
+                _call("search_matches", root_path=root, pattern=needle),
+                _call(
+                    "list_file_tree", root_path=os.path.dirname(reads[0])
+                ),
+            ]
+        elif kind == 1:
+            calls = [_call("read_file", file_path=path) for path in reads]
+        elif kind == 2:
+            calls = [
+                _call("search_in_files", root_path=root, pattern=needle)
+            ]
+        else:
+            target = os.path.join(scratch, samples[step % len(samples)])
+            calls = [
+                _call(
+                    "replace_in_file",
+                    file_path=target,
+                    pattern=r"\b(\d+)\b",
+                    replacement=r"\1",
+                )
+            ]
+        answers.append(
+            {
+                "next_thought": f"Step {step}: gathering context.",
+                "next_tool_calls": json.dumps(calls),
+            }
+        )
+    answers.append(
+        {
+            "next_thought": "I have everything I need.",
+            "next_tool_calls": json.dumps([_call("finish")]),
+        }
+    )
+    answers.append(
+        {"reasoning": "Summarise the findings.", "solution": "Done."}
+    )
+    return answers
+
+
+def _agent_setup(n_steps: int, traced: bool = False, memoize: bool = True):
+    def setup(ctx):
+        from core.agent import Agent
+
+        home = tempfile.mkdtemp(dir=ctx["scratch"], prefix="agent-")
+        config_dir = os.path.join(home, ".mini-code-agent")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.yaml"), "w") as f:
+            f.write(
+                _CONFIG.format(
+                    max_iters=n_steps + 5,
+                    traced=str(traced).lower(),
+                    memoize=str(memoize).lower(),
+                    home=home,
+                )
+            )
+        scratch = os.path.join(home, "files")
+        copy_tree_files(ctx["root"], ctx["manifest"]["sample_files"], scratch)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent = Agent(config_path=home)
+        return agent, build_script(ctx, scratch, n_steps), n_steps
+
+    return setup
+
+
+def _agent_run(state):
+    from dspy.utils import DummyLM
+
+    agent, script, n_steps = state
+    agent.lm = DummyLM(list(script))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = agent(requirement=_REQUIREMENT)
+    if result.solution != "Done.":
+        raise RuntimeError(f"unexpected solution: {result.solution!r}")
+    return n_steps
+
+
+# ------------------------------------------------------------------ resume
+
+# 子进程：按脚本运行，在第 kill_step 步的第一个工具结果处用 SIGKILL 自杀
+_KILL_CHILD = """\
+import json, os, signal, sys
+from dspy.utils import DummyLM
+from core.agent import Agent
+
+args = json.load(open(sys.argv[1]))
+agent = Agent(config_path=args["home"])
+agent.lm = DummyLM(args["script"])
+for event in agent.stream(
+    args["requirement"], stream_tokens=False, run_id=args["run_id"]
+):
+    if event["event"] == "tool_result" and event["step"] == args["kill_step"]:
+        os.kill(os.getpid(), signal.SIGKILL)
+sys.exit("run finished before it was killed")
+"""
+
+
+def _resume_setup(n_steps: int, kill_step: int):
+    def setup(ctx):
+        agent, script, _ = _agent_setup(n_steps)(ctx)
+        home = os.path.dirname(agent.checkpoints.directory)
+        args_path = os.path.join(home, "kill.json")
+        with open(args_path, "w") as f:
+            json.dump(
+                {
+                    "home": home,
+                    "script": script,
+                    "requirement": _REQUIREMENT,
+                    "run_id": "killed",
+                    "kill_step": kill_step,
+                },
+                f,
+            )
+        child = subprocess.run(
+            [sys.executable, "-c", _KILL_CHILD, args_path],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode != -signal.SIGKILL:
+            raise RuntimeError(
+                f"child exited with {child.returncode}: {child.stderr[-2000:]}"
+            )
+        checkpoint = agent.checkpoints.load("killed")
+        if checkpoint.interrupted_step != kill_step:
+            raise RuntimeError(
+                f"interrupted at step {checkpoint.interrupted_step}, "
+                f"expected {kill_step}"
+            )
+        return {
+            "agent": agent,
+            # 已记录的 LM 结果不应再被请求：续跑只需要剩下的回答
+            "script": script[len(checkpoint.decisions):],
+            "n_steps": n_steps,
+            "counter": itertools.count(),
+        }
+
+    return setup
+
+
+def _resume_run(state):
+    from dspy.utils import DummyLM
+
+    agent = state["agent"]
+    # 每次续跑一份被杀掉的运行的副本
+    run_id = f"resumed-{next(state['counter'])}"
+    directory = agent.checkpoints.directory
+    shutil.copyfile(
+        directory / "killed.jsonl", directory / f"{run_id}.jsonl"
+    )
+    agent.lm = DummyLM(list(state["script"]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = agent.resume(run_id)
+    if result.solution != "Done.":
+        raise RuntimeError(f"unexpected solution: {result.solution!r}")
+    if len(agent.lm.history) != len(state["script"]):
+        raise RuntimeError(
+            f"resume made {len(agent.lm.history)} LM calls, "
+            f"expected {len(state['script'])}"
+        )
+    thoughts = [k for k in result.trajectory if k.startswith("thought_")]
+    if len(thoughts) != state["n_steps"] + 1:
+        raise RuntimeError(f"resumed run has {len(thoughts)} steps")
+    return state["n_steps"]
+
+
+# ---------------------------------------------------------------- LM cache
+
+
+def _replay_setup(n_steps: int):
+    def setup(ctx):
+        from dspy.utils import DummyLM
+
+        from core.lm_cache import wrap_lm
+
+        agent, script, _ = _agent_setup(n_steps)(ctx)
+        cache_dir = tempfile.mkdtemp(dir=ctx["scratch"], prefix="lm-cache-")
+        agent.lm = wrap_lm(DummyLM(list(script)), "record", cache_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent(requirement=_REQUIREMENT)
+        return agent, cache_dir, n_steps
+
+    return setup
+
+
+def _replay_run(state):
+    from dspy.utils import DummyLM
+
+    from core.lm_cache import wrap_lm
+
+    agent, cache_dir, n_steps = state
+    # 没有任何回答的 LM：所有调用都必须命中缓存，未命中即报错
+    agent.lm = wrap_lm(DummyLM([]), "replay", cache_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = agent(requirement=_REQUIREMENT)
+    if result.solution != "Done.":
+        raise RuntimeError(f"unexpected solution: {result.solution!r}")
+    return n_steps
+
+
+# ------------------------------------------------------------- concurrency
+
+# 每次 LM 调用的模拟延迟（秒）
+STUB_DELAY = 0.05
+
+
+def _start_stub_lm(delay: float):
+    """Run the stub LM endpoint on a background event loop."""
+    from core.stub_lm import StubLMServer
+
+    loop = asyncio.new_event_loop()
+    stub = StubLMServer(delay)
+    server = loop.run_until_complete(stub.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    return (loop, stub, thread), server.sockets[0].getsockname()[1]
+
+
+def _stop_stub_lm(handle):
+    loop, stub, thread = handle
+    asyncio.run_coroutine_threadsafe(stub.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _concurrent_setup(n_agents: int, threaded: bool):
+    def setup(ctx):
+        from core.agent import Agent
+        from core.config import AgentConfig, Config, DSPyConfig
+
+        stub, port = _start_stub_lm(STUB_DELAY)
+        workspace = tempfile.mkdtemp(dir=ctx["scratch"], prefix="ws-")
+        agents = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(n_agents):
+                config = Config(
+                    dspy=DSPyConfig(
+                        model=f"openai/stub-{i}",
+                        api_key="stub",
+                        api_base=f"http://127.0.0.1:{port}/v1",
+                    ),
+                    agent=AgentConfig(max_iters=5),
+                )
+                agents.append(Agent(config=config))
+        return {
+            "agents": agents,
+            "workspace": workspace,
+            "threaded": threaded,
+            "stub": stub,
+            # 每次运行用不同的需求，避免命中 dspy 的 LM 缓存
+            "counter": itertools.count(),
+        }
+
+    return setup
+
+
+def _run_one(state, index: int):
+    agent = state["agents"][index]
+    requirement = (
+        f"Run {next(state['counter'])}: look around.\n\n"
+        f"工作目录: {state['workspace']}"
+    )
+    result = agent(requirement=requirement)
+    expected = f"Stub solution from stub-{index}."
+    if result.solution != expected:
+        raise RuntimeError(
+            f"agent {index} got {result.solution!r}, expected {expected!r}"
+        )
+
+
+def _concurrent_run(state):
+    n = len(state["agents"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        if state["threaded"]:
+            with ThreadPoolExecutor(max_workers=n) as pool:
+                list(pool.map(lambda i: _run_one(state, i), range(n)))
+        else:
+            for i in range(n):
+                _run_one(state, i)
+    return n
+
+
+def _concurrent_teardown(state):
+    for agent in state["agents"]:
+        agent.close()
+    _stop_stub_lm(state["stub"])
+
+
+# ----------------------------------------------------------------- routing
+
+# 快速模型的模拟延迟（秒）
+FAST_STUB_DELAY = 0.005
+
+ROUTING_RUNS = 5
+
+
+def _routing_setup(routed: bool):
+    def setup(ctx):
+        from core.agent import Agent
+        from core.config import (
+            AgentConfig,
+            CheckpointConfig,
+            Config,
+            DSPyConfig,
+            RoutingConfig,
+        )
+
+        strong, strong_port = _start_stub_lm(STUB_DELAY)
+        fast, fast_port = _start_stub_lm(FAST_STUB_DELAY)
+        routing = RoutingConfig()
+        if routed:
+            routing = RoutingConfig(
+                fast_model="openai/fast",
+                fast_api_base=f"http://127.0.0.1:{fast_port}/v1",
+            )
+        config = Config(
+            dspy=DSPyConfig(
+                model="openai/strong",
+                api_key="stub",
+                api_base=f"http://127.0.0.1:{strong_port}/v1",
+            ),
+            agent=AgentConfig(max_iters=5),
+            routing=routing,
+            checkpoint=CheckpointConfig(enabled=False),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent = Agent(config=config)
+        return {
+            "agent": agent,
+            "workspace": tempfile.mkdtemp(dir=ctx["scratch"], prefix="ws-"),
+            "stubs": (strong, fast),
+            "counter": itertools.count(),
+        }
+
+    return setup
+
+
+def _routing_run(state):
+    agent = state["agent"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(ROUTING_RUNS):
+            result = agent(
+                requirement=f"Run {next(state['counter'])}: look around."
+                f"\n\n工作目录: {state['workspace']}"
+            )
+            # 最终答案必须来自强模型
+            if result.solution != "Stub solution from strong.":
+                raise RuntimeError(f"unexpected solution: {result.solution!r}")
+    return ROUTING_RUNS
+
+
+def _routing_teardown(state):
+    state["agent"].close()
+    for stub in state["stubs"]:
+        _stop_stub_lm(stub)
+
+
+def cases(ctx: Dict) -> List[Case]:
+    """
+    Agent benchmark cases.
+
+    :param ctx: Context with "manifest", "root" and "scratch"
+    :return: List of cases
+    """
+    return [
+        Case("agent", "e2e.8_steps", _agent_run, setup=_agent_setup(8),
+             unit="steps", repeat=3, params={"steps": 8}),
+        Case("agent", "e2e.40_steps", _agent_run, setup=_agent_setup(40),
+             unit="steps", repeat=3, params={"steps": 40}),
+        Case("agent", "e2e.40_steps.traced", _agent_run,
+             setup=_agent_setup(40, traced=True), unit="steps", repeat=3,
+             params={"steps": 40, "tracing": True}),
+        Case("agent", "e2e.40_steps.no_memo", _agent_run,
+             setup=_agent_setup(40, memoize=False), unit="steps", repeat=3,
+             params={"steps": 40, "memoize_tools": False}),
+        Case("agent", "resume.40_steps.killed_at_19", _resume_run,
+             setup=_resume_setup(40, kill_step=19), unit="steps", repeat=3,
+             params={"steps": 40, "kill_step": 19}),
+        Case("agent", "lm_cache.replay.40_steps", _replay_run,
+             setup=_replay_setup(40), unit="steps", repeat=3,
+             params={"steps": 40}),
+        Case("agent", "concurrent.8_agents.serial", _concurrent_run,
+             setup=_concurrent_setup(8, threaded=False),
+             teardown=_concurrent_teardown, unit="runs", repeat=3,
+             params={"agents": 8, "lm_delay_s": STUB_DELAY}),
+        Case("agent", "concurrent.8_agents.threads", _concurrent_run,
+             setup=_concurrent_setup(8, threaded=True),
+             teardown=_concurrent_teardown, unit="runs", repeat=3,
+             params={"agents": 8, "lm_delay_s": STUB_DELAY}),
+        Case("agent", "routing.strong_only", _routing_run,
+             setup=_routing_setup(routed=False),
+             teardown=_routing_teardown, unit="runs", repeat=3,
+             params={"strong_delay_s": STUB_DELAY}),
+        Case("agent", "routing.fast_first", _routing_run,
+             setup=_routing_setup(routed=True),
+             teardown=_routing_teardown, unit="runs", repeat=3,
+             params={"strong_delay_s": STUB_DELAY,
+                     "fast_delay_s": FAST_STUB_DELAY}),
+    ]
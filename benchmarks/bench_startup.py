@@ -0,0 +1,62 @@
+"""
+Cold-start benchmarks: each run starts a fresh interpreter.
+
+"python -c pass" is the interpreter baseline; subtract it from the other
+cases to get the cost of importing mini-code-agent itself.
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+from .harness import Case
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_AGENT = """\
+import contextlib, io
+from core.agent import Agent
+with contextlib.redirect_stdout(io.StringIO()):
+    Agent(config_path={home!r})
+"""
+
+
+def _python(code: str):
+    def run(_state):
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=_ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return 1
+
+    return run
+
+
+def _agent_code(ctx: Dict) -> str:
+    home = os.path.join(ctx["scratch"], "startup")
+    config_dir = os.path.join(home, ".mini-code-agent")
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "config.yaml"), "w") as f:
+        f.write('dspy:\n  model: "openai/bench-fake"\n  api_key: "bench"\n')
+        f.write("agent:\n  max_iters: 10\n")
+    return _AGENT.format(home=home)
+
+
+def cases(ctx: Dict) -> List[Case]:
+    """
+    Startup benchmark cases.
+
+    :param ctx: Context with "scratch"
+    :return: List of cases
+    """
+    return [
+        Case("startup", "python -c pass", _python("pass"), unit="procs"),
+        Case("startup", "import core.tool", _python("import core.tool"),
+             unit="procs"),
+        Case("startup", "import core.agent", _python("import core.agent"),
+             unit="procs"),
+        Case("startup", "Agent()", _python(_agent_code(ctx)), unit="procs"),
+    ]
@@ -0,0 +1,365 @@
+"""
+Microbenchmarks for the tools in core/tool.
+
+Web tools are measured on their cache-hit path (the disk cache is filled
+in setup), since rendering real pages depends on the network.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+from typing import Dict, List
+
+# 提前导入，避免把导入耗时算进第一次运行
+import core.tool  # noqa: F401
+
+from .harness import Case
+
+
+def _settings(use_index: bool = False, engine: str = "serial", **kwargs):
+    from core.tool.search_tools import configure_search
+
+    configure_search(use_index=use_index, engine=engine, **kwargs)
+
+
+def _sample(ctx: Dict, n: int) -> List[str]:
+    files = ctx["manifest"]["sample_files"]
+    rng = random.Random(0)
+    picked = rng.sample(files, min(n, len(files)))
+    return [os.path.join(ctx["root"], rel) for rel in picked]
+
+
+def _rare_pattern(ctx: Dict) -> str:
+    needles = ctx["manifest"]["needles"]
+    return needles[len(needles) // 2][0] if needles else "NEEDLE_0"
+
+
+# ---------------------------------------------------------------- file tools
+
+def _read_small(state):
+    from core.tool import read_file
+
+    for path in state:
+        read_file(path)
+    return len(state)
+
+
+def _large_file(ctx: Dict) -> str:
+    large = ctx["manifest"]["large_files"]
+    if not large:
+        raise RuntimeError("workspace has no large files")
+    return os.path.join(ctx["root"], large[0])
+
+
+def _read_large(path):
+    from core.tool import read_file
+
+    read_file(path)
+    return os.path.getsize(path) / (1024 * 1024)
+
+
+def _read_range(path):
+    from core.tool import read_file
+
+    for start in range(1, 2001, 100):
+        read_file(path, start_line=start, end_line=start + 49)
+    return 20
+
+
+def _read_batch(state):
+    from core.tool import read_files
+
+    read_files(state)
+    return len(state)
+
+
+def _read_ranges_batch(path):
+    from core.tool import read_files
+
+    read_files([
+        {"file_path": path, "start_line": start, "end_line": start + 49}
+        for start in range(1, 2001, 100)
+    ])
+    return 20
+
+
+def _list_tree(ctx):
+    from core.tool import list_file_tree
+
+    list_file_tree(ctx["root"])
+    return ctx["manifest"]["n_files"]
+
+
+# -------------------------------------------------------------- search tools
+
+def _search_setup(**settings):
+    def setup(ctx):
+        _settings(**settings)
+        return ctx
+
+    return setup
+
+
+def _search_indexed_setup(ctx):
+    index_dir = tempfile.mkdtemp(dir=ctx["scratch"], prefix="index-")
+    _settings(use_index=True, index_dir=index_dir)
+    return ctx
+
+
+def _search(pattern_of):
+    def run(ctx):
+        from core.tool import search_in_files
+
+        search_in_files(ctx["root"], pattern_of(ctx))
+        return ctx["manifest"]["n_files"]
+
+    return run
+
+
+def _search_matches(ctx):
+    from core.tool import search_matches
+
+    search_matches(ctx["root"], r"TODO: handle \w+", max_results=50)
+    return 50
+
+
+def _shutdown_pools(_state):
+    from core.tool.search_tools import shutdown_search_pools
+
+    shutdown_search_pools()
+
+
+# -------------------------------------------------------------- symbol tools
+
+def _symbol_setup(ctx):
+    from core.tool.symbol_tools import configure_symbols
+
+    # 冷启动包含三元组索引的构建：find_symbol 靠它挑出候选文件
+    index_dir = tempfile.mkdtemp(dir=ctx["scratch"], prefix="symbols-")
+    _settings(use_index=True, index_dir=index_dir)
+    configure_symbols(index_dir=index_dir)
+    py_needles = [n for n, rel in ctx["manifest"]["needles"]
+                  if rel.endswith(".py")]
+    if not py_needles:
+        raise RuntimeError("workspace has no Python needles")
+    return ctx, py_needles[len(py_needles) // 2].lower()
+
+
+def _find_symbol(state):
+    from core.tool import find_symbol
+
+    ctx, name = state
+    if not find_symbol(ctx["root"], name):
+        raise RuntimeError(f"symbol not found: {name}")
+    return ctx["manifest"]["n_files"]
+
+
+def _outline_setup(ctx):
+    return [p for p in _sample(ctx, 200) if p.endswith(".py")][:20]
+
+
+def _outline(paths):
+    from core.tool import file_outline
+
+    for path in paths:
+        file_outline(path)
+    return len(paths)
+
+
+# ---------------------------------------------------------- retrieval tool
+
+def _retrieve_setup(ctx):
+    from core.tool.retrieval_tools import configure_retrieval
+
+    index_dir = tempfile.mkdtemp(dir=ctx["scratch"], prefix="bm25-")
+    configure_retrieval(index_dir=index_dir)
+    return ctx
+
+
+def _retrieve(ctx):
+    from core.tool import retrieve
+
+    if not retrieve("handle request timeout error", ctx["root"], k=10):
+        raise RuntimeError("retrieve returned nothing")
+    return ctx["manifest"]["n_files"]
+
+
+# ----------------------------------------------------------- write tools
+
+def _write_setup(ctx):
+    return tempfile.mkdtemp(dir=ctx["scratch"], prefix="write-")
+
+
+def _create_edit(scratch):
+    from core.tool import create_path, edit_path, replace_in_file
+
+    base = tempfile.mkdtemp(dir=scratch)
+    body = "def handler(value):\n    return value * 2\n" * 50
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(50):
+            path = create_path(
+                os.path.join(base, f"pkg{i % 5}"), f"m{i}.py", True, body
+            )
+            replace_in_file(path, r"value \* 2", "value * 3")
+            edit_path(path, new_name=f"m{i}_old.py")
+    return 50
+
+
+def _patch_setup(ctx):
+    base = tempfile.mkdtemp(dir=ctx["scratch"], prefix="patch-")
+    body = "".join(f"def handler_{i}(value):\n    return value * 2\n"
+                   for i in range(1000))
+    forward, backward = [], []
+    for i in range(50):
+        name = f"m{i}.py"
+        with open(os.path.join(base, name), "w") as f:
+            f.write(body)
+        for old, new, patches in (("2", "3", forward), ("3", "2", backward)):
+            hunks = "".join(
+                f"@@ -{line},2 +{line},2 @@\n def handler_{n}(value):\n"
+                f"-    return value * {old}\n+    return value * {new}\n"
+                for n, line in ((100, 201), (900, 1801))
+            )
+            patches.append(f"--- a/{name}\n+++ b/{name}\n{hunks}")
+    return base, "".join(forward), "".join(backward)
+
+
+def _apply_patch(state):
+    from core.tool import apply_patch
+
+    base, forward, backward = state
+    with contextlib.redirect_stdout(io.StringIO()):
+        for patch in (forward, backward):
+            result = apply_patch(patch=patch, base_dir=base)
+            if not result.startswith("✅"):
+                raise RuntimeError(result)
+    return 100
+
+
+def _tell_human(_ctx):
+    from core.tool import tell_human_something
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(1000):
+            tell_human_something(f"🔍 step {i}")
+    return 1000
+
+
+# ------------------------------------------------------------- web tools
+
+_HTML = (
+    "<html><head><title>Bench page</title><script>var x = 1;</script>"
+    "</head><body><nav><a href='/'>home</a></nav><main>"
+    + "".join(
+        f"<h2>Section {i}</h2><p>Some <b>text</b> with a "
+        f"<a href='/p{i}'>link</a>.</p><ul><li>one</li><li>two</li></ul>"
+        f"<pre>code = {i}</pre>"
+        for i in range(300)
+    )
+    + "</main><footer>footer</footer></body></html>"
+)
+
+
+def _web_setup(ctx):
+    from core.tool.web_tools import configure_web, get_web_cache
+    from core.tool.web_tools import normalize_url
+
+    cache_dir = tempfile.mkdtemp(dir=ctx["scratch"], prefix="web-")
+    configure_web(cache_dir=cache_dir, cache_ttl=10**9)
+    cache = get_web_cache()
+    urls = [f"https://example.com/page/{i}" for i in range(20)]
+    for url in urls:
+        cache.set(f"html:{normalize_url(url)}", _HTML)
+    results = [
+        {"title": f"t{i}", "url": f"https://e.com/{i}", "desc": "d"}
+        for i in range(10)
+    ]
+    for i in range(20):
+        cache.set(f"search:bing:query {i}", results)
+    return urls
+
+
+def _fetch_cached(urls):
+    from core.tool import fetch_website_html
+
+    async def _all():
+        for url in urls:
+            await fetch_website_html(url)
+
+    asyncio.run(_all())
+    return len(urls)
+
+
+def _search_engine_cached(urls):
+    from core.tool import use_search_engine
+
+    async def _all():
+        for i in range(20):
+            await use_search_engine(f"query {i}")
+
+    asyncio.run(_all())
+    return 20
+
+
+def _extract(_ctx):
+    from core.tool.html_extract import extract_content
+
+    for _ in range(5):
+        extract_content(_HTML, max_chars=20000)
+    return 5 * len(_HTML) / (1024 * 1024)
+
+
+def cases(ctx: Dict) -> List[Case]:
+    """
+    Tool benchmark cases for a workspace.
+
+    :param ctx: Context with "manifest", "root" and "scratch"
+    :return: List of cases
+    """
+    rare = _rare_pattern
+    common = lambda _ctx: r"def \w+\("  # noqa: E731
+    return [
+        Case("tools", "read_file.small_x100", _read_small,
+             setup=lambda c: _sample(c, 100), unit="files"),
+        Case("tools", "read_file.large_budget", _read_large,
+             setup=_large_file, unit="MB"),
+        Case("tools", "read_file.line_ranges", _read_range,
+             setup=_large_file, unit="reads"),
+        Case("tools", "read_files.small_x100", _read_batch,
+             setup=lambda c: _sample(c, 100), unit="files"),
+        Case("tools", "read_files.line_ranges", _read_ranges_batch,
+             setup=_large_file, unit="reads"),
+        Case("tools", "list_file_tree", _list_tree, unit="files",
+             repeat=3),
+        Case("tools", "search_in_files.rare.scan", _search(rare),
+             setup=_search_setup(), unit="files", repeat=3),
+        Case("tools", "search_in_files.common.scan", _search(common),
+             setup=_search_setup(), unit="files", repeat=3),
+        Case("tools", "search_in_files.rare.index", _search(rare),
+             setup=_search_indexed_setup, unit="files", repeat=3),
+        Case("tools", "search_in_files.rare.parallel", _search(rare),
+             setup=_search_setup(engine="parallel"),
+             teardown=_shutdown_pools, unit="files", repeat=3),
+        Case("tools", "search_matches.first50", _search_matches,
+             setup=_search_setup(), unit="matches"),
+        Case("tools", "find_symbol.index", _find_symbol,
+             setup=_symbol_setup, unit="files", repeat=3),
+        Case("tools", "file_outline.x20", _outline,
+             setup=_outline_setup, unit="files"),
+        Case("tools", "retrieve.index", _retrieve,
+             setup=_retrieve_setup, unit="files", repeat=3),
+        Case("tools", "create_replace_rename.x50", _create_edit,
+             setup=_write_setup, unit="files"),
+        Case("tools", "apply_patch.50_files", _apply_patch,
+             setup=_patch_setup, unit="files", repeat=3),
+        Case("tools", "tell_human_something.x1000", _tell_human,
+             unit="calls"),
+        Case("tools", "fetch_website_html.cached", _fetch_cached,
+             setup=_web_setup, unit="pages"),
+        Case("tools", "use_search_engine.cached", _search_engine_cached,
+             setup=_web_setup, unit="queries"),
+        Case("tools", "extract_content", _extract, unit="MB"),
+    ]
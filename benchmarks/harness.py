@@ -0,0 +1,292 @@
+"""
+Benchmark harness: timing, peak RSS and JSON result files.
+
+Every case runs in its own child interpreter, so its peak RSS is not
+inflated by earlier cases and process-wide caches (file content cache,
+search index cache, browser pool) start cold. Inside the child the case is
+set up once and then timed `repeat` times; the first run is reported
+separately as the cold run.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_VERSION = 1
+
+
+@dataclass
+class Case:
+    """
+    One benchmark.
+
+    setup(ctx) returns a state object; run(state) performs the measured
+    work and returns the amount of work done, in `unit`s, for throughput;
+    teardown(state) releases resources such as process pools.
+    """
+
+    suite: str
+    name: str
+    run: Callable[[Any], float]
+    setup: Optional[Callable[[Dict], Any]] = None
+    teardown: Optional[Callable[[Any], None]] = None
+    unit: str = "ops"
+    repeat: int = 5
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Result:
+    suite: str
+    name: str
+    params: Dict[str, Any]
+    repeat: int
+    cold_s: Optional[float] = None
+    min_s: Optional[float] = None
+    median_s: Optional[float] = None
+    throughput: Optional[float] = None
+    unit: str = "ops"
+    peak_rss_mb: Optional[float] = None
+    error: Optional[str] = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size in MB of the current process, or of its largest
+    child process if that was bigger (process pools, subprocesses).
+    """
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def _measure(case: Case, ctx: Dict) -> Dict:
+    state = None
+    try:
+        state = case.setup(ctx) if case.setup else ctx
+        times, work = [], 0.0
+        for _ in range(max(1, case.repeat)):
+            start = time.perf_counter()
+            work = case.run(state)
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        return asdict(
+            Result(
+                suite=case.suite,
+                name=case.name,
+                params=case.params,
+                repeat=len(times),
+                cold_s=times[0],
+                min_s=min(times),
+                median_s=median,
+                throughput=(work / median) if work and median else None,
+                unit=case.unit,
+                peak_rss_mb=peak_rss_mb(),
+            )
+        )
+    except Exception:
+        return asdict(
+            Result(
+                suite=case.suite,
+                name=case.name,
+                params=case.params,
+                repeat=0,
+                unit=case.unit,
+                error=traceback.format_exc(limit=3).strip(),
+            )
+        )
+    finally:
+        if case.teardown is not None and state is not None:
+            case.teardown(state)
+
+
+def run_case(case: Case, ctx: Dict, isolate: bool = True) -> Dict:
+    """
+    Run one case, by default in a fresh interpreter.
+
+    :param case: The benchmark
+    :param ctx: Shared context (workspace manifest, scratch dir); must be
+        JSON serialisable
+    :param isolate: Run in a child process to measure its own peak RSS
+    :return: Result as a dict
+    """
+    if not isolate:
+        return _measure(case, ctx)
+    fd, ctx_path = tempfile.mkstemp(suffix=".json", dir=ctx["scratch"])
+    with os.fdopen(fd, "w") as f:
+        json.dump(ctx, f)
+    out_path = ctx_path[: -len(".json")] + ".result.json"
+    cmd = [
+        sys.executable, "-m", "benchmarks", "case",
+        "--ctx", ctx_path, "--suite", case.suite, "--name", case.name,
+        "--repeat", str(case.repeat), "--out", out_path,
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(cmd, cwd=root)
+    try:
+        with open(out_path, encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = asdict(
+            Result(
+                suite=case.suite,
+                name=case.name,
+                params=case.params,
+                repeat=0,
+                unit=case.unit,
+                error=f"child process failed (exit code {proc.returncode})",
+            )
+        )
+    result["params"] = case.params
+    return result
+
+
+def run_case_in_child(
+    case: Case, ctx_path: str, out_path: str, repeat: int
+):
+    """Entry point of the child process started by run_case."""
+    with open(ctx_path, encoding="utf-8") as f:
+        ctx = json.load(f)
+    case.repeat = repeat
+    result = _measure(case, ctx)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def git_revision(cwd: Optional[str] = None) -> Dict[str, Any]:
+    """Current commit and whether the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=cwd, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(path: str, results: List[Dict], meta: Dict[str, Any]):
+    """
+    Write a results file.
+
+    :param path: Output JSON path
+    :param results: Result dicts
+    :param meta: Run metadata (workspace size, options)
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    data = {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **git_revision(os.path.dirname(os.path.abspath(__file__))),
+        "environment": environment(),
+        "meta": meta,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+
+
+def format_results(results: List[Dict]) -> str:
+    """Fixed-width table of results."""
+    header = (
+        f"{'suite':<7} {'name':<34} {'cold s':>9} {'median s':>9} "
+        f"{'throughput':>16} {'RSS MB':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        if r.get("error"):
+            reason = r["error"].strip().splitlines()[-1]
+            lines.append(f"{r['suite']:<7} {r['name']:<34} ERROR {reason}")
+            continue
+        tput = (
+            f"{r['throughput']:.1f} {r['unit']}/s"
+            if r.get("throughput") else "-"
+        )
+        rss = f"{r['peak_rss_mb']:.0f}" if r.get("peak_rss_mb") else "-"
+        lines.append(
+            f"{r['suite']:<7} {r['name'][:34]:<34} {r['cold_s']:>9.4f} "
+            f"{r['median_s']:>9.4f} {tput:>16} {rss:>8}"
+        )
+    return "\n".join(lines)
+
+
+def compare_results(
+    base: Dict, new: Dict, threshold: float = 0.1
+) -> str:
+    """
+    Compare two results files case by case.
+
+    :param base: Baseline results (loaded JSON)
+    :param new: New results (loaded JSON)
+    :param threshold: Relative median change reported as a regression or
+        an improvement
+    :return: Table text
+    """
+    def _key(r):
+        return (r["suite"], r["name"])
+
+    base_by_key = {_key(r): r for r in base["results"] if not r.get("error")}
+    header = (
+        f"{'suite':<7} {'name':<34} {'base s':>9} {'new s':>9} "
+        f"{'change':>8} {'RSS MB':>13}"
+    )
+    lines = [
+        f"base: {base.get('commit')} ({base['meta'].get('size')})   "
+        f"new: {new.get('commit')} ({new['meta'].get('size')})",
+        header,
+        "-" * len(header),
+    ]
+    for r in new["results"]:
+        old = base_by_key.get(_key(r))
+        if old is None or r.get("error"):
+            status = "error" if r.get("error") else "new"
+            lines.append(f"{r['suite']:<7} {r['name'][:34]:<34} {status}")
+            continue
+        change = r["median_s"] / old["median_s"] - 1 if old["median_s"] else 0
+        mark = ""
+        if change > threshold:
+            mark = " ⚠️"
+        elif change < -threshold:
+            mark = " ✅"
+        rss = "-"
+        if old.get("peak_rss_mb") and r.get("peak_rss_mb"):
+            rss = f"{old['peak_rss_mb']:.0f}->{r['peak_rss_mb']:.0f}"
+        lines.append(
+            f"{r['suite']:<7} {r['name'][:34]:<34} {old['median_s']:>9.4f} "
+            f"{r['median_s']:>9.4f} {change:>+8.1%} {rss:>13}{mark}"
+        )
+    return "\n".join(lines)
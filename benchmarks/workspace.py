@@ -0,0 +1,266 @@
+"""
+Deterministic synthetic workspaces for benchmarking.
+
+A workspace is a directory tree of generated files that looks roughly like
+a real repository: mostly source files of mixed sizes, some docs and data
+files, a few large logs, binaries, deep directory chains and the usual
+excluded directories (.git, node_modules, __pycache__). The same size and
+seed always produce the same tree, and generated trees are reused from the
+cache directory across benchmark runs.
+"""
+
+import json
+import os
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_WORKSPACE_DIR = (
+    Path.home() / ".mini-code-agent" / "bench" / "workspaces"
+)
+
+# 文件数量预设
+SIZES = {"small": 1000, "medium": 10000, "large": 100000}
+
+# 生成规则变化时加一，旧的缓存目录会被忽略
+GENERATOR_VERSION = 1
+
+# 每 NEEDLE_EVERY 个文本文件中有一个包含稀有标记 NEEDLE_<n>
+NEEDLE_EVERY = 97
+
+_WORDS = (
+    "agent tool file path search index cache token buffer stream request "
+    "response config parser result error value items count offset range "
+    "session worker queue thread process module signature trajectory step "
+    "observation budget limit state handler client server payload record"
+).split()
+
+_EXCLUDED = (".git", "node_modules", "__pycache__")
+
+
+def _ident(rng: random.Random) -> str:
+    return "_".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def _python_source(rng: random.Random, target: int, needle: str) -> str:
+    parts = [f'"""Module {_ident(rng)}."""\n\nimport os\nimport re\n\n']
+    size = len(parts[0])
+    while size < target:
+        name = _ident(rng)
+        if rng.random() < 0.3:
+            block = (
+                f"\nclass {name.title().replace('_', '')}:\n"
+                f"    def __init__(self, {_ident(rng)}):\n"
+                f"        self.{name} = {rng.randint(0, 9999)}\n"
+            )
+        else:
+            args = ", ".join(_ident(rng) for _ in range(rng.randint(0, 3)))
+            block = (
+                f"\ndef {name}({args}):\n"
+                f"    # TODO: handle {_ident(rng)} for {_ident(rng)}\n"
+                f"    value = {rng.randint(0, 9999)}\n"
+                f"    return value * {rng.randint(1, 9)}\n"
+            )
+        parts.append(block)
+        size += len(block)
+    if needle:
+        parts.insert(len(parts) // 2, f"\n{needle.lower()} = '{needle}'\n")
+    return "".join(parts)
+
+
+def _prose(rng: random.Random, target: int, needle: str) -> str:
+    lines, size = [f"# {_ident(rng).replace('_', ' ').title()}\n\n"], 0
+    while size < target:
+        line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 16)))
+        line = line.capitalize() + ".\n"
+        lines.append(line)
+        size += len(line)
+    if needle:
+        lines.insert(len(lines) // 2, f"See {needle} for details.\n")
+    return "".join(lines)
+
+
+def _json_data(rng: random.Random, target: int, needle: str) -> str:
+    items, size = [], 0
+    while size < target:
+        item = {_ident(rng): rng.randint(0, 10**6) for _ in range(4)}
+        items.append(item)
+        size += 80
+    if needle:
+        items.append({"marker": needle})
+    return json.dumps(items, indent=1)
+
+
+def _log(rng: random.Random, target: int, needle: str) -> str:
+    lines, size = [], 0
+    while size < target:
+        line = (
+            f"2024-01-{rng.randint(1, 28):02d} INFO {_ident(rng)}: "
+            f"{rng.choice(_WORDS)} took {rng.randint(1, 999)}ms\n"
+        )
+        lines.append(line)
+        size += len(line)
+    if needle:
+        lines.insert(len(lines) // 2, f"ERROR {needle} failed\n")
+    return "".join(lines)
+
+
+def _text_size(rng: random.Random) -> int:
+    """Mostly small files with a long tail, like a real repository."""
+    roll = rng.random()
+    if roll < 0.6:
+        return rng.randint(200, 4000)
+    if roll < 0.95:
+        return rng.randint(4000, 40000)
+    if roll < 0.99:
+        return rng.randint(40000, 200000)
+    return rng.randint(256 * 1024, 2 * 1024 * 1024)
+
+
+def _directories(rng: random.Random, n_files: int) -> List[str]:
+    """Build a tree with about 20 files per directory plus deep chains."""
+    n_dirs = max(1, n_files // 20)
+    dirs = [""]
+    while len(dirs) < n_dirs:
+        parent = rng.choice(dirs)
+        if parent.count("/") >= 8:
+            continue
+        dirs.append(f"{parent}/{_ident(rng)}{len(dirs)}".lstrip("/"))
+    for chain in range(max(1, n_files // 5000)):
+        path = f"deep{chain}"
+        for level in range(24):
+            path = f"{path}/level{level}"
+            dirs.append(path)
+    return dirs
+
+
+def generate_workspace(root: str, n_files: int, seed: int = 0) -> Dict:
+    """
+    Generate a synthetic workspace.
+
+    :param root: Directory to create (must not exist or be empty)
+    :param n_files: Number of files outside the excluded directories
+    :param seed: Random seed; the same seed gives the same tree
+    :return: Manifest describing the tree (see load_manifest)
+    """
+    rng = random.Random(seed)
+    root_path = Path(root)
+    dirs = _directories(rng, n_files)
+    for d in dirs:
+        (root_path / d).mkdir(parents=True, exist_ok=True)
+
+    kinds = [
+        (".py", _python_source, 0.6),
+        (".md", _prose, 0.2),
+        (".json", _json_data, 0.1),
+        (".log", _log, 0.07),
+    ]
+    manifest = {
+        "n_files": 0,
+        "text_files": 0,
+        "binary_files": 0,
+        "total_bytes": 0,
+        "needles": [],
+        "large_files": [],
+        "sample_files": [],
+    }
+    for i in range(n_files):
+        directory = root_path / rng.choice(dirs)
+        if rng.random() < 0.03:
+            path = directory / f"blob{i}.bin"
+            data = bytes(rng.getrandbits(8) for _ in range(64)) * rng.randint(
+                16, 256
+            )
+            path.write_bytes(b"\x00PNG" + data)
+            manifest["binary_files"] += 1
+        else:
+            roll, acc = rng.random(), 0.0
+            ext, make = kinds[-1][0], kinds[-1][1]
+            for kind_ext, kind_make, weight in kinds:
+                acc += weight
+                if roll < acc:
+                    ext, make = kind_ext, kind_make
+                    break
+            needle = ""
+            if manifest["text_files"] % NEEDLE_EVERY == 0:
+                needle = f"NEEDLE_{len(manifest['needles'])}"
+            text = make(rng, _text_size(rng), needle)
+            path = directory / f"{_ident(rng)}_{i}{ext}"
+            path.write_text(text, encoding="utf-8")
+            rel = str(path.relative_to(root_path))
+            if needle:
+                manifest["needles"].append([needle, rel])
+            if len(text) >= 256 * 1024:
+                manifest["large_files"].append(rel)
+            if len(manifest["sample_files"]) < 200 and len(text) < 40000:
+                manifest["sample_files"].append(rel)
+            manifest["text_files"] += 1
+        manifest["n_files"] += 1
+        manifest["total_bytes"] += path.stat().st_size
+
+    # 常被排除的目录，搜索和遍历工具应跳过它们
+    for name in _EXCLUDED:
+        excluded = root_path / name / "objects"
+        excluded.mkdir(parents=True, exist_ok=True)
+        for i in range(max(10, n_files // 100)):
+            (excluded / f"x{i}.js").write_text(
+                "NEEDLE_0 " * 20, encoding="utf-8"
+            )
+
+    manifest["directories"] = len(dirs)
+    with open(root_path / ".bench-manifest.json", "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_manifest(root: str) -> Optional[Dict]:
+    """
+    Read the manifest of a generated workspace.
+
+    :param root: Workspace directory
+    :return: Manifest dict, or None if the workspace is incomplete
+    """
+    try:
+        with open(Path(root) / ".bench-manifest.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_workspace(
+    size: str, seed: int = 0, base_dir: Optional[str] = None
+) -> Dict:
+    """
+    Return a cached workspace of the given size, generating it if needed.
+
+    :param size: One of SIZES ("small", "medium", "large") or a file count
+    :param seed: Random seed
+    :param base_dir: Cache directory (default ~/.mini-code-agent/bench)
+    :return: Manifest with an extra "root" key
+    """
+    n_files = SIZES[size] if size in SIZES else int(size)
+    base = Path(base_dir) if base_dir else DEFAULT_WORKSPACE_DIR
+    root = base / f"{n_files}-s{seed}-v{GENERATOR_VERSION}"
+    manifest = load_manifest(str(root))
+    if manifest is None:
+        if root.exists():
+            import shutil
+
+            shutil.rmtree(root)
+        print(f"⏳ 生成 {n_files} 个文件的测试工作区: {root}")
+        root.mkdir(parents=True)
+        manifest = generate_workspace(str(root), n_files, seed)
+    manifest["root"] = str(root)
+    manifest["size"] = size
+    return manifest
+
+
+def copy_tree_files(src_root: str, rel_paths: List[str], dst_root: str):
+    """Copy a few workspace files into a scratch directory."""
+    for rel in rel_paths:
+        dst = os.path.join(dst_root, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(os.path.join(src_root, rel), "rb") as f:
+            data = f.read()
+        with open(dst, "wb") as f:
+            f.write(data)
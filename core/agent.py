@@ -1,95 +1,676 @@
 """
 Agent core implementation for mini-code-agent.
+
+Importing this module is cheap: dspy, the YAML config and the default
+agent are only loaded when first used.
 """
 
-import dspy
-from typing import Optional
-from .config import Config
+import asyncio
+import contextlib
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+from .checkpoint import CheckpointStore
+from .compaction import TrajectoryCompactor
+from .tracing import JsonlSink, MemorySink, Tracer
 from .tool import (
     read_file,
+    read_files,
     list_file_tree,
     search_in_files,
+    search_matches,
+    find_symbol,
+    find_references,
+    file_outline,
+    retrieve,
     create_path,
     edit_path,
     replace_in_file,
+    apply_patch,
     tell_human_something,
     fetch_website_html,
     use_search_engine,
+    READ_ONLY_TOOLS,
 )
+from .tool.browser_pool import acquire_browser_pool, release_browser_pool
+from .tool.budget import ToolBudget, ToolLimits
+from .tool.confine import confine_tools
+from .tool.content_cache import acquire_cache, release_cache
+from .tool.settings import derive_tool_settings, use_tool_settings
+
 
+def _code_agent_signature():
+    """Build the signature class (requires importing dspy)."""
+    import dspy
 
-class CodeAgentSignature(dspy.Signature):
-    """Signature for the Code Agent."""
+    class CodeAgentSignature(dspy.Signature):
+        """Signature for the Code Agent."""
 
-    requirement: str = dspy.InputField(desc="用户需求")
-    solution: str = dspy.OutputField(desc="具体解决方案")
+        requirement: str = dspy.InputField(desc="用户需求")
+        solution: str = dspy.OutputField(desc="具体解决方案")
+
+    return CodeAgentSignature
 
 
 class Agent:
     """
-    Main Agent class that integrates DSPy ReAct with tools and configuration.
+    Main Agent class that integrates a batched ReAct loop with tools and
+    configuration.
     """
 
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        config=None,
+        lm=None,
+        fast_lm=None,
+        async_max_workers: Optional[int] = None,
+    ):
         """
         Initialize the Agent.
 
         :param config_path: Optional directory path to check for
             config.yaml first
+        :param config: Already loaded Config (skips reading config.yaml)
+        :param lm: Existing dspy.LM to reuse, sharing its HTTP connections
+        :param fast_lm: Existing fast LM to reuse (routing.fast_model)
+        :param async_max_workers: DSPy's thread limit for this agent's
+            streamed runs (default: the process-wide dspy setting)
         """
-        self.config = Config.load(config_path)
-        self._setup_dspy()
-        self._setup_agent()
+        from .config import Config
 
-    def _setup_dspy(self):
-        """Configure DSPy with loaded configuration."""
-        lm = dspy.LM(
-            self.config.dspy.model,
-            api_key=self.config.dspy.api_key,
-            api_base=self.config.dspy.api_base,
+        self.config = config if config is not None else Config.load(
+            config_path
         )
-        dspy.configure(
-            lm=lm,
+        self.async_max_workers = async_max_workers
+        self._setup_dspy(lm, fast_lm)
+        self._setup_tools()
+        self._setup_tracing()
+        self._setup_checkpoints()
+        self._setup_agent()
+
+    def _setup_dspy(self, lm=None, fast_lm=None):
+        """
+        Create this agent's LM, and the fast LM when routing is configured.
+
+        The LM and DSPy settings are applied per call with dspy.context
+        rather than the process-wide dspy.configure, so agents with
+        different models can run side by side in threads or asyncio tasks.
+        With lm_cache enabled the LM is wrapped in a record/replay cache.
+        """
+        import dspy
+
+        if lm is None:
+            lm = dspy.LM(
+                self.config.dspy.model,
+                api_key=self.config.dspy.api_key,
+                api_base=self.config.dspy.api_base,
+            )
+        routing = self.config.routing
+        if fast_lm is None and routing.fast_model:
+            fast_lm = dspy.LM(
+                routing.fast_model,
+                api_key=routing.fast_api_key or self.config.dspy.api_key,
+                api_base=routing.fast_api_base or self.config.dspy.api_base,
+            )
+        cache = self.config.lm_cache
+        if cache.mode != "off":
+            from .lm_cache import wrap_lm
+
+            lm = wrap_lm(lm, cache.mode, cache.directory, cache.max_bytes)
+            if fast_lm is not None:
+                fast_lm = wrap_lm(
+                    fast_lm, cache.mode, cache.directory, cache.max_bytes
+                )
+        self.lm = lm
+        self.fast_lm = fast_lm
+
+    @contextlib.contextmanager
+    def _run_context(self, confine: Optional[str] = None):
+        """
+        DSPy and tool settings of this agent, for a `with` block.
+
+        :param confine: Refuse tool calls outside this directory (None
+            allows any path)
+        """
+        import dspy
+
+        overrides = {}
+        if self.async_max_workers is not None:
+            overrides["async_max_workers"] = self.async_max_workers
+        with dspy.context(
+            lm=self.lm,
             allow_tool_async_sync_conversion=self.config.dspy
             .allow_tool_async_sync_conversion,
+            **overrides,
+        ), use_tool_settings(self.tool_settings), confine_tools(confine):
+            yield
+
+    def _setup_tools(self):
+        """
+        Build this agent's tool settings from the loaded configuration.
+
+        They only apply inside this agent's runs (see _run_context), so
+        agents with different settings can run side by side. The file
+        content cache and the browser pool are shared by every agent of
+        the process; the cache is sized to the largest cache_max_bytes of
+        the open agents.
+        """
+        search = self.config.search
+        files = self.config.files.model_dump()
+        web = self.config.web.model_dump()
+        browser_keys = ("headless", "max_concurrency", "timeout_ms")
+        browser = {k: web.pop(k) for k in browser_keys}
+        retrieval = self.config.retrieval.model_dump(
+            exclude={"prime_first_step", "prime_k"}
+        )
+        self._cache_bytes = files.pop("cache_max_bytes")
+        self.tool_settings = derive_tool_settings(
+            search=search.model_dump(),
+            symbols={"index_dir": search.index_dir},
+            retrieval={"index_dir": search.index_dir, **retrieval},
+            files=files,
+            web=web,
+        )
+        acquire_browser_pool(**browser)
+        self._browser_acquired = True
+        acquire_cache(self._cache_bytes)
+        self._cache_acquired = True
+
+    def _setup_tracing(self):
+        """Create the tracer and its sinks when tracing is enabled."""
+        tracing = self.config.tracing
+        self.tracer = None
+        self.trace_memory = None
+        if not tracing.enabled:
+            return
+        sinks = []
+        if tracing.jsonl_path:
+            sinks.append(JsonlSink(tracing.jsonl_path))
+        if tracing.memory:
+            self.trace_memory = MemorySink()
+            sinks.append(self.trace_memory)
+        self.tracer = Tracer(sinks)
+
+    def _tool_budget(self) -> ToolBudget:
+        """Build per-tool execution limits from the tools section."""
+        tools = self.config.tools
+        return ToolBudget(
+            default=ToolLimits(tools.timeout_s, tools.max_output_chars),
+            per_tool={
+                name: ToolLimits(**limits.model_dump())
+                for name, limits in tools.per_tool.items()
+            },
         )
 
     def _setup_agent(self):
         """Setup the ReAct agent with tools."""
-        self.react_agent = dspy.ReAct(
-            signature=CodeAgentSignature,
+        from .react import BatchReAct
+        from .routing import ModelRouter
+
+        agent = self.config.agent
+        self.compactor = None
+        if agent.trajectory_max_tokens is not None:
+            self.compactor = TrajectoryCompactor(
+                max_tokens=agent.trajectory_max_tokens,
+                keep_recent_steps=agent.compaction_keep_steps,
+                min_observation_chars=agent.compaction_min_chars,
+            )
+        self.router = None
+        if self.fast_lm is not None:
+            routing = self.config.routing
+            self.router = ModelRouter(
+                self.fast_lm,
+                verify_finish=routing.verify_finish,
+                escalate_on_repeat=routing.escalate_on_repeat,
+            )
+        self.react_agent = BatchReAct(
+            signature=_lazy("CodeAgentSignature"),
             tools=[
                 read_file,
+                read_files,
                 list_file_tree,
                 search_in_files,
+                search_matches,
+                find_symbol,
+                find_references,
+                file_outline,
+                retrieve,
                 create_path,
                 edit_path,
                 replace_in_file,
+                apply_patch,
                 tell_human_something,
                 fetch_website_html,
                 use_search_engine,
             ],
-            max_iters=self.config.agent.max_iters,
+            max_iters=agent.max_iters,
+            read_only_tools=READ_ONLY_TOOLS,
+            max_calls_per_step=agent.max_tool_calls_per_step,
+            max_workers=agent.tool_workers,
+            compactor=self.compactor,
+            tracer=self.tracer,
+            budget=self._tool_budget(),
+            memoize=agent.memoize_tools,
+            router=self.router,
         )
 
-    def __call__(self, requirement: str):
+    def _setup_checkpoints(self):
+        """Create the checkpoint store when checkpointing is enabled."""
+        checkpoint = self.config.checkpoint
+        self.checkpoints = None
+        if checkpoint.enabled:
+            self.checkpoints = CheckpointStore(
+                checkpoint.directory, checkpoint.keep_runs
+            )
+
+    def __call__(
+        self,
+        requirement: str,
+        workspace: Optional[str] = None,
+        run_id: Optional[str] = None,
+    ):
         """
         Process a user requirement.
 
         :param requirement: User's requirement or task description
+        :param workspace: Directory the requirement is about (used to
+            prime the first step; defaults to the current directory)
+        :param run_id: Checkpoint id of the run (default: generated; the
+            prediction's run_id names it)
+        :return: Result from the agent
+        """
+        checkpoint = self._start_checkpoint(requirement, workspace, run_id)
+        return self._execute(checkpoint, requirement, workspace)
+
+    def resume(self, run_id: Optional[str] = None):
+        """
+        Continue a run that was interrupted, from its checkpoint.
+
+        Completed steps are replayed from disk without calling the LM or
+        any tool. In the step that was running, recorded tool results are
+        reused; a side-effecting call that had started but not finished is
+        not repeated, and the model is told to check its effect instead.
+        Resuming a finished run returns its recorded result.
+
+        :param run_id: Run to resume (default: the newest unfinished run
+            that no other process is running)
         :return: Result from the agent
+        :raises ValueError: Checkpointing is disabled, the run has no
+            checkpoint or another process is running it
         """
-        return self.react_agent(requirement=requirement)
+        if self.checkpoints is None:
+            raise ValueError("Checkpointing is disabled (checkpoint.enabled)")
+        if run_id is None:
+            run_id = self.checkpoints.latest_unfinished()
+            if run_id is None:
+                raise ValueError("No unfinished run to resume")
+        checkpoint = self.checkpoints.load(run_id)
+        start = checkpoint.start
+        kwargs = {}
+        if start.get("max_iters") is not None:
+            kwargs["max_iters"] = start["max_iters"]
+        return self._execute(
+            checkpoint,
+            start["inputs"]["requirement"],
+            start.get("workspace"),
+            **kwargs,
+        )
+
+    def _start_checkpoint(
+        self,
+        requirement: str,
+        workspace: Optional[str],
+        run_id: Optional[str],
+    ):
+        """Checkpoint of a new run, or None when checkpointing is off."""
+        if self.checkpoints is None:
+            if run_id is not None:
+                raise ValueError(
+                    "run_id requires checkpointing (checkpoint.enabled)"
+                )
+            return None
+        return self.checkpoints.create(
+            run_id,
+            inputs={"requirement": requirement},
+            workspace=workspace,
+            max_iters=self.react_agent.max_iters,
+            model=self.config.dspy.model,
+        )
+
+    def _execute(self, checkpoint, requirement: str, workspace, **kwargs):
+        """Forward a requirement with its checkpoint and report the run."""
+        try:
+            with self._run_context():
+                result = self.react_agent(
+                    requirement=requirement,
+                    prime=self._prime_calls(requirement, workspace),
+                    checkpoint=checkpoint,
+                    **kwargs,
+                )
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        if checkpoint is not None:
+            result.run_id = checkpoint.run_id
+        self._report(result)
+        return result
+
+    def _prime_calls(self, requirement: str, workspace: Optional[str]):
+        """Retrieval run before the first LM step, when enabled."""
+        retrieval = self.config.retrieval
+        if not retrieval.prime_first_step:
+            return None
+        from .react import ToolCall
 
-    def run(self, requirement: str):
+        args = {
+            "query": requirement,
+            "root_path": os.path.abspath(workspace or os.getcwd()),
+            "k": retrieval.prime_k,
+        }
+        return [ToolCall(name="retrieve", args=args)]
+
+    def _report(self, result):
+        """Print the run summary when tracing asks for it."""
+        trace = getattr(result, "trace", None)
+        tracing = self.config.tracing
+        if trace is not None and tracing.enabled and tracing.print_summary:
+            print(f"📊 运行统计:\n{trace.summary()}")
+
+    def run(
+        self,
+        requirement: str,
+        workspace: Optional[str] = None,
+        run_id: Optional[str] = None,
+    ):
         """
         Alias for __call__ method.
 
         :param requirement: User's requirement or task description
+        :param workspace: Directory the requirement is about
+        :param run_id: Checkpoint id of the run (default: generated)
         :return: Result from the agent
         """
-        return self(requirement=requirement)
+        return self(
+            requirement=requirement, workspace=workspace, run_id=run_id
+        )
+
+    async def astream(
+        self,
+        requirement: str,
+        stream_tokens: bool = True,
+        cancel: Optional[threading.Event] = None,
+        workspace: Optional[str] = None,
+        run_id: Optional[str] = None,
+        confine: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a requirement, yielding progress events as they happen.
+
+        Every event is a dict with an "event" key:
+
+        - step: {step} - an LM step begins
+        - token: {field, text} - streamed LM output of next_thought or
+          solution (when the LM supports streaming)
+        - thought: {step, text}
+        - tool_call: {step, index, name, args}
+        - tool_result: {step, index, name, observation, error, duration_ms}
+        - result: {solution, steps, prediction}, cancelled: {error} or
+          error: {error} - always the last event; all three carry the
+          run_id of the checkpoint (None when checkpointing is off)
+
+        Closing the generator early (e.g. leaving the `async for` loop)
+        cancels the run at its next step or tool call and waits for it to
+        stop.
+
+        :param requirement: User's requirement or task description
+        :param stream_tokens: Stream LM tokens through dspy.streamify
+        :param cancel: Event that cancels the run when set
+        :param workspace: Directory the requirement is about
+        :param run_id: Checkpoint id of the run (default: generated)
+        :param confine: Refuse tool calls that touch paths outside the
+            workspace
+        :return: Async iterator of event dicts
+        """
+        import dspy
+        from dspy.streaming import StreamResponse
+
+        from .react import RunCancelled
+
+        loop = asyncio.get_running_loop()
+        cancel = cancel or threading.Event()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def emit(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        checkpoint = self._start_checkpoint(requirement, workspace, run_id)
+        kwargs = dict(
+            requirement=requirement,
+            on_event=emit,
+            cancel=cancel,
+            prime=self._prime_calls(requirement, workspace),
+            checkpoint=checkpoint,
+        )
+
+        root = os.path.abspath(workspace or os.getcwd()) if confine else None
+
+        async def drive():
+            try:
+                result = None
+                with self._run_context(root):
+                    if not stream_tokens:
+                        result = await asyncio.to_thread(
+                            self.react_agent, **kwargs
+                        )
+                    else:
+                        program = dspy.streamify(
+                            self.react_agent,
+                            stream_listeners=self._stream_listeners(),
+                        )
+                        async for value in program(**kwargs):
+                            if isinstance(value, StreamResponse):
+                                if not value.chunk:
+                                    continue
+                                events.put_nowait(
+                                    {
+                                        "event": "token",
+                                        "field": value.signature_field_name,
+                                        "text": value.chunk,
+                                    }
+                                )
+                            elif isinstance(value, dspy.Prediction):
+                                result = value
+                if checkpoint is not None:
+                    result.run_id = checkpoint.run_id
+                self._report(result)
+                final = {
+                    "event": "result",
+                    "solution": result.solution,
+                    "steps": sum(
+                        1 for key in result.trajectory
+                        if key.startswith("thought_")
+                    ),
+                    "prediction": result,
+                }
+            except RunCancelled as e:
+                final = {"event": "cancelled", "error": str(e)}
+            except Exception as e:
+                final = {"event": "error", "error": f"{type(e).__name__}: {e}"}
+            finally:
+                if checkpoint is not None:
+                    checkpoint.close()
+            final["run_id"] = checkpoint.run_id if checkpoint else None
+            # 排在运行线程已提交的事件之后
+            loop.call_soon(events.put_nowait, final)
+            loop.call_soon(events.put_nowait, None)
+
+        task = asyncio.ensure_future(drive())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            cancel.set()
+            if not task.done():
+                await asyncio.wait({task})
+
+    def stream(
+        self,
+        requirement: str,
+        stream_tokens: bool = True,
+        workspace: Optional[str] = None,
+        run_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Synchronous version of astream(), driven by a background event loop.
+
+        Leaving the loop early (or closing the generator) cancels the run;
+        it stops in the background at its next step or tool call.
+
+        :param requirement: User's requirement or task description
+        :param stream_tokens: Stream LM tokens through dspy.streamify
+        :param workspace: Directory the requirement is about
+        :param run_id: Checkpoint id of the run (default: generated)
+        :return: Iterator of event dicts (see astream)
+        """
+        events: queue.Queue = queue.Queue()
+        cancel = threading.Event()
+        done = object()
+
+        async def pump():
+            try:
+                async for event in self.astream(
+                    requirement, stream_tokens, cancel, workspace, run_id
+                ):
+                    events.put(event)
+            finally:
+                events.put(done)
+
+        threading.Thread(
+            target=asyncio.run, args=(pump(),), name="agent-stream",
+            daemon=True,
+        ).start()
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    return
+                yield event
+        finally:
+            cancel.set()
+
+    def _stream_listeners(self) -> list:
+        """Token listeners for the step thoughts and the final solution."""
+        from dspy.streaming import StreamListener
+
+        react = self.react_agent
+        return [
+            StreamListener(
+                "next_thought",
+                predict=react.react,
+                predict_name="react",
+                allow_reuse=True,
+            ),
+            StreamListener(
+                "solution",
+                predict=react.extract.predict,
+                predict_name="extract.predict",
+            ),
+        ]
+
+    def compaction_stats(self) -> dict:
+        """
+        Bytes saved by trajectory compaction across all runs of this agent.
+
+        :return: Counters, or an empty dict when compaction is disabled
+        """
+        return self.compactor.stats() if self.compactor else {}
+
+    def model_stats(self) -> dict:
+        """
+        Fast/strong routing counters across all runs of this agent.
+
+        :return: fast_steps, escalations by reason and calls, latency and
+            tokens per model, or an empty dict when routing is off
+        """
+        return self.router.stats() if self.router else {}
+
+    def lm_cache_stats(self) -> dict:
+        """
+        Hits, misses and recorded responses of the LM response cache.
+
+        :return: Counters, or an empty dict when lm_cache is off
+        """
+        from .lm_cache import CachedLM
+
+        return self.lm.stats() if isinstance(self.lm, CachedLM) else {}
+
+    def trace_spans(self) -> list:
+        """
+        Spans kept in memory when tracing.memory is enabled.
+
+        :return: List of tracing.Span
+        """
+        return list(self.trace_memory.spans) if self.trace_memory else []
+
+    def add_trace_sink(self, sink):
+        """
+        Deliver this agent's spans to another sink (e.g. CallbackSink).
+
+        Creates the tracer if tracing is disabled in the configuration.
+
+        :param sink: Object with emit(span) and close() methods
+        """
+        if self.tracer is None:
+            self.tracer = Tracer()
+            self.react_agent.tracer = self.tracer
+        self.tracer.add_sink(sink)
+
+    def close(self):
+        """
+        Release tool threads and this agent's hold on shared resources.
+
+        The shared browser is shut down once every agent using it is closed.
+        """
+        self.react_agent.close()
+        if self.tracer is not None:
+            self.tracer.close()
+        if self._browser_acquired:
+            self._browser_acquired = False
+            release_browser_pool()
+        if self._cache_acquired:
+            self._cache_acquired = False
+            release_cache(self._cache_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_lazy_lock = threading.RLock()
+_lazy_factories = {
+    "CodeAgentSignature": _code_agent_signature,
+    # Default agent instance (backwards compatibility)
+    "default_agent": Agent,
+}
+
+
+def _lazy(name: str):
+    """Module attribute created by its factory on first access."""
+    with _lazy_lock:
+        if name not in globals():
+            globals()[name] = _lazy_factories[name]()
+    return globals()[name]
 
 
-# Create default agent instance (backwards compatibility)
-default_agent = Agent()
+def __getattr__(name: str):
+    """Create CodeAgentSignature and default_agent on first access."""
+    if name not in _lazy_factories:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _lazy(name)
@@ -0,0 +1,415 @@
+"""
+Checkpoints of agent runs, so that a run can be resumed after the process
+died or the network failed.
+
+Every run is an append-only JSON Lines file, <directory>/<run_id>.jsonl,
+with one record per event:
+
+    {"type": "start", "run_id", "inputs", "workspace", "max_iters", ...}
+    {"type": "decision", "step", "thought", "calls"}  # LM answer of a step
+    {"type": "tool_start", "step", "index", "name"}   # side-effecting tools
+    {"type": "tool", "step", "index", "observation"}  # each tool result
+    {"type": "step", "step", "extra", "finished"}     # step complete
+    {"type": "result", "outputs"}                     # final extraction
+
+Each record is flushed as soon as it is written, so a killed process loses
+at most the line being written, which is ignored when the file is read.
+Resuming replays the records instead of calling the LM or the tools again.
+
+Next to each run file, <run_id>.json holds a small summary (inputs, steps
+completed, finished) rewritten after every step, so listing, pruning and
+picking the run to resume do not read whole checkpoints. While a process
+writes a run it holds an exclusive lock on its file (where fcntl exists);
+locked and unfinished runs are never pruned, and a locked run cannot be
+resumed by a second process.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .compaction import step_of
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are not locked
+    fcntl = None
+
+DEFAULT_DIR = Path.home() / ".mini-code-agent" / "checkpoints"
+
+# 续跑时，中断那一步里已开始但没有结果的写工具的观察结果
+INTERRUPTED_OBSERVATION = (
+    "Interrupted: the run stopped while {name} was executing, so it may or "
+    "may not have taken effect. Check its effect before calling it again."
+)
+
+
+def new_run_id() -> str:
+    """A sortable, unique run id such as 20260101-120000-1a2b3c."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _locked(path: Path) -> bool:
+    """Whether another open checkpoint (in any process) holds the lock."""
+    if fcntl is None:
+        return False
+    try:
+        with open(path, "rb") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+    except FileNotFoundError:
+        return False
+
+
+def _tool_key(key: str, step: int) -> Optional[int]:
+    """Index of a tool observation key (observation_<step>_<index>)."""
+    suffix = key[len(f"observation_{step}_"):]
+    if key.startswith(f"observation_{step}_") and suffix.isdigit():
+        return int(suffix)
+    return None
+
+
+class RunCheckpoint:
+    """
+    The checkpoint file of one run: records new progress and serves the
+    progress of an earlier attempt when the run is resumed.
+    """
+
+    def __init__(self, path: Path, records: Iterable[Dict[str, Any]] = ()):
+        """
+        :param path: JSONL file of the run
+        :param records: Records already in the file (when resuming)
+        """
+        self.path = Path(path)
+        self.run_id = self.path.stem
+        self.start: Dict[str, Any] = {}
+        self.decisions: Dict[int, Tuple[str, List[Dict[str, Any]]]] = {}
+        self.started_tools: set = set()
+        self.tools: Dict[Tuple[int, int], Any] = {}
+        self.steps: Dict[int, Dict[str, Any]] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._file = None
+        for record in records:
+            self._apply(record)
+        # 上次运行中断时正在执行的一步（已有 LM 结果但没有完成）
+        pending = [step for step in self.decisions if step not in self.steps]
+        self.interrupted_step: Optional[int] = max(pending, default=None)
+
+    def _apply(self, record: Dict[str, Any]):
+        kind = record.get("type")
+        if kind == "start":
+            self.start = record
+        elif kind == "decision":
+            self.decisions[record["step"]] = (
+                record["thought"],
+                record["calls"],
+            )
+        elif kind == "tool_start":
+            self.started_tools.add((record["step"], record["index"]))
+        elif kind == "tool":
+            self.tools[(record["step"], record["index"])] = record[
+                "observation"
+            ]
+        elif kind == "step":
+            self.steps[record["step"]] = record
+        elif kind == "result":
+            self.result = record["outputs"]
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = self._open()
+            self._file.write(line)
+            self._file.flush()
+
+    def _open(self):
+        """Open the file for appending and take the run's lock."""
+        f = open(self.path, "a", encoding="utf-8")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                raise ValueError(
+                    f"Run {self.run_id} is in use by another process"
+                )
+        return f
+
+    def summary(self) -> Dict[str, Any]:
+        """run_id, inputs, created, steps completed and finished."""
+        return {
+            "run_id": self.run_id,
+            "inputs": self.start.get("inputs", {}),
+            "created": self.start.get("created"),
+            "steps": len(self.steps),
+            "finished": self.finished,
+        }
+
+    def _save_summary(self):
+        path = self.path.with_suffix(".json")
+        data = json.dumps(self.summary(), ensure_ascii=False, default=str)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            # 摘要只用于列出运行，缺失时会读取检查点本身
+            print(f"⚠️ 无法保存检查点摘要: {path} ({e})")
+
+    @property
+    def finished(self) -> bool:
+        """Whether the recorded run produced its final outputs."""
+        return self.result is not None
+
+    def record_start(self, **fields):
+        """Write the start record (inputs and settings of the run)."""
+        self.start = {
+            "type": "start",
+            "run_id": self.run_id,
+            "created": time.time(),
+            **fields,
+        }
+        self._write(self.start)
+        self._save_summary()
+
+    def record_decision(
+        self, step: int, thought: str, calls: List[Dict[str, Any]]
+    ):
+        """Write the thought and tool calls chosen for a step."""
+        self._write(
+            {"type": "decision", "step": step, "thought": thought,
+             "calls": calls}
+        )
+
+    def record_tool_start(self, step: int, index: int, name: str):
+        """Write that a side-effecting tool call is about to run."""
+        self._write(
+            {"type": "tool_start", "step": step, "index": index, "name": name}
+        )
+
+    def record_tool(self, step: int, index: int, observation: Any):
+        """Write the observation of a tool call."""
+        self._write(
+            {"type": "tool", "step": step, "index": index,
+             "observation": observation}
+        )
+
+    def record_step(
+        self, step: int, trajectory: Dict[str, Any], finished: bool
+    ):
+        """
+        Write that a step completed.
+
+        Thought, calls and tool observations are already recorded; only
+        the step's other trajectory entries (skipped calls, finish) are
+        stored here.
+        """
+        skip = {f"thought_{step}", f"tool_calls_{step}"}
+        extra = {
+            key: value
+            for key, value in trajectory.items()
+            if key not in skip
+            and step_of(key) == step
+            and _tool_key(key, step) is None
+        }
+        record = {"type": "step", "step": step, "extra": extra,
+                  "finished": finished}
+        self._write(record)
+        self.steps[step] = record
+        self._save_summary()
+
+    def record_result(self, outputs: Dict[str, Any]):
+        """Write the final outputs of the run."""
+        self._write({"type": "result", "outputs": outputs})
+        self.result = outputs
+        self._save_summary()
+
+    def replay_step(self, step: int, trajectory: Dict[str, Any]) -> bool:
+        """
+        Add a completed step's entries to the trajectory.
+
+        :param step: Step index
+        :param trajectory: Trajectory to extend
+        :return: Whether the model finished in this step
+        """
+        thought, calls = self.decisions[step]
+        trajectory[f"thought_{step}"] = thought
+        trajectory[f"tool_calls_{step}"] = calls
+        for (tool_step, index), observation in sorted(self.tools.items()):
+            if tool_step == step:
+                trajectory[f"observation_{step}_{index}"] = observation
+        record = self.steps[step]
+        trajectory.update(record["extra"])
+        return record["finished"]
+
+    def close(self):
+        """Close the file; later records reopen it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_records(path: Path) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Read the records of a checkpoint file.
+
+    A line cut off by a killed process (and anything after it) is ignored.
+
+    :param path: JSONL file
+    :return: Records in order, and the byte length of the intact part
+    """
+    records = []
+    valid = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                break
+            valid += len(line)
+    return records, valid
+
+
+class CheckpointStore:
+    """
+    A directory of run checkpoints, pruned to the newest keep_runs
+    finished runs.
+    """
+
+    def __init__(self, directory: Optional[str] = None, keep_runs: int = 100):
+        """
+        :param directory: Where checkpoint files are kept (default
+            ~/.mini-code-agent/checkpoints)
+        :param keep_runs: Number of newest finished runs kept when a run
+            starts (0 keeps all); unfinished runs are always kept
+        """
+        self.directory = Path(directory) if directory else DEFAULT_DIR
+        self.keep_runs = keep_runs
+
+    def _path(self, run_id: str) -> Path:
+        if not run_id or os.sep in run_id or run_id.startswith("."):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        return self.directory / f"{run_id}.jsonl"
+
+    def create(self, run_id: Optional[str] = None, **start) -> RunCheckpoint:
+        """
+        Start the checkpoint of a new run.
+
+        :param run_id: Id of the run (default: generated)
+        :param start: Fields of the start record (inputs, workspace, ...)
+        :return: RunCheckpoint to record the run's progress in
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(run_id or new_run_id())
+        if path.exists():
+            raise ValueError(f"Run {path.stem} already exists")
+        self._prune()
+        checkpoint = RunCheckpoint(path)
+        checkpoint.record_start(**start)
+        return checkpoint
+
+    def load(self, run_id: str) -> RunCheckpoint:
+        """
+        Open the checkpoint of an earlier run to resume it.
+
+        :param run_id: Id of the run
+        :return: RunCheckpoint holding the recorded progress
+        :raises ValueError: No usable checkpoint exists for the run
+        """
+        path = self._path(run_id)
+        if not path.exists():
+            raise ValueError(f"No checkpoint for run {run_id}")
+        if _locked(path):
+            raise ValueError(f"Run {run_id} is in use by another process")
+        records, valid = read_records(path)
+        if valid < path.stat().st_size:
+            # 去掉被打断的半行，续跑的记录从完整的行之后追加
+            os.truncate(path, valid)
+        checkpoint = RunCheckpoint(path, records)
+        if not checkpoint.start:
+            raise ValueError(f"Checkpoint of run {run_id} has no start record")
+        return checkpoint
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """
+        Recorded runs, newest first.
+
+        :return: Dicts with run_id, requirement inputs, steps completed and
+            whether the run finished
+        """
+        summaries = (self._summary(path) for path in self._files())
+        return [summary for summary in summaries if summary is not None]
+
+    def latest_unfinished(self) -> Optional[str]:
+        """
+        The newest run that has not finished and is not running.
+
+        :return: Its run id, or None
+        """
+        for path in self._files():
+            summary = self._summary(path)
+            if summary and not summary["finished"] and not _locked(path):
+                return summary["run_id"]
+        return None
+
+    def _summary(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Summary of a run; read from the checkpoint when it has none."""
+        try:
+            with open(path.with_suffix(".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        try:
+            return RunCheckpoint(path, read_records(path)[0]).summary()
+        except FileNotFoundError:
+            return None
+
+    def _files(self) -> List[Path]:
+        """Checkpoint files, newest first."""
+        if not self.directory.is_dir():
+            return []
+        files = []
+        for path in self.directory.glob("*.jsonl"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        return [path for _, path in sorted(files, reverse=True)]
+
+    def _prune(self):
+        """Delete finished runs beyond the newest keep_runs - 1."""
+        if not self.keep_runs:
+            return
+        kept = 0
+        for path in self._files():
+            summary = self._summary(path)
+            # 未完成的运行可能还要续跑，正在写的运行属于其他进程
+            if summary is None or not summary["finished"] or _locked(path):
+                continue
+            kept += 1
+            if kept < self.keep_runs:
+                continue
+            for stale in (path, path.with_suffix(".json")):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
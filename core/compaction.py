@@ -0,0 +1,192 @@
+"""
+Trajectory compaction for long agent runs.
+
+The ReAct trajectory grows by one thought and a batch of observations per
+step. Once its estimated size exceeds a token budget, TrajectoryCompactor
+replaces the oldest large observations with short stubs that name the tool
+call that produced them, so the model can re-expand a stub by calling the
+tool again. The full trajectory is kept; only the prompt view is compacted.
+"""
+
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+# 粗略估算：每个 token 约 4 个字符
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, without calling a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class CompactionStats:
+    """Counters describing how much compaction saved."""
+
+    lm_calls: int = 0
+    compacted_calls: int = 0
+    observations_stubbed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # 上下文溢出时从提示词中丢弃的最早步数（由 BatchReAct 记录）
+    truncated_steps: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def add(self, other: "CompactionStats"):
+        self.lm_calls += other.lm_calls
+        self.compacted_calls += other.compacted_calls
+        self.observations_stubbed += other.observations_stubbed
+        self.bytes_before += other.bytes_before
+        self.bytes_after += other.bytes_after
+        self.truncated_steps += other.truncated_steps
+
+    def as_dict(self) -> Dict[str, int]:
+        return {**asdict(self), "bytes_saved": self.bytes_saved}
+
+
+def step_of(key: str) -> int:
+    """Return the step index of a trajectory key such as observation_3_1."""
+    for prefix in ("thought_", "tool_calls_", "observation_"):
+        if key.startswith(prefix):
+            return int(key[len(prefix):].split("_")[0])
+    raise ValueError(f"Not a trajectory key: {key}")
+
+
+def _size(value: Any) -> int:
+    return len(str(value).encode("utf-8"))
+
+
+def _observation_call(
+    key: str, trajectory: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Find the tool call behind observation_<step>_<n>."""
+    parts = key.split("_")
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    calls = trajectory.get(f"tool_calls_{parts[1]}") or []
+    pos = int(parts[2]) - 1
+    return calls[pos] if 0 <= pos < len(calls) else None
+
+
+class TrajectoryCompactor:
+    """
+    Keeps the prompt view of a trajectory within a token budget.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        keep_recent_steps: int = 2,
+        min_observation_chars: int = 1000,
+        stub_chars: int = 200,
+    ):
+        """
+        :param max_tokens: Token budget for the formatted trajectory
+        :param keep_recent_steps: Number of latest steps never compacted
+        :param min_observation_chars: Observations shorter than this are
+            left as they are
+        :param stub_chars: Characters of the original output kept in a stub
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent_steps = keep_recent_steps
+        self.min_observation_chars = min_observation_chars
+        self.stub_chars = stub_chars
+        self._lock = threading.Lock()
+        self._totals = CompactionStats()
+
+    def compact(
+        self,
+        trajectory: Dict[str, Any],
+        stats: Optional[CompactionStats] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return a copy of the trajectory whose oldest large observations are
+        replaced by stubs until it fits the budget.
+
+        :param trajectory: Full trajectory (not modified)
+        :param stats: Optional per-run counters to update
+        :return: Trajectory to format into the prompt
+        """
+        view = dict(trajectory)
+        before = sum(_size(v) for v in view.values())
+        tokens = sum(estimate_tokens(str(v)) for v in view.values())
+        stubbed = 0
+
+        if tokens > self.max_tokens:
+            steps = sorted({step_of(key) for key in view})
+            keep = self.keep_recent_steps
+            recent = set(steps[-keep:]) if keep > 0 else set()
+            for key in self._candidates(view, recent):
+                stub = self._stub(key, view)
+                tokens -= estimate_tokens(str(view[key]))
+                tokens += estimate_tokens(stub)
+                view[key] = stub
+                stubbed += 1
+                if tokens <= self.max_tokens:
+                    break
+
+        run = CompactionStats(
+            lm_calls=1,
+            compacted_calls=1 if stubbed else 0,
+            observations_stubbed=stubbed,
+            bytes_before=before,
+            bytes_after=sum(_size(v) for v in view.values())
+            if stubbed else before,
+        )
+        if stats is not None:
+            stats.add(run)
+        with self._lock:
+            self._totals.add(run)
+        return view
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cumulative counters over every compact() call.
+
+        :return: lm_calls/compacted_calls/observations_stubbed/bytes_*
+        """
+        with self._lock:
+            return self._totals.as_dict()
+
+    def keeps_full(self, step: int, latest_step: int, observation) -> bool:
+        """
+        Whether an observation is never stubbed while latest_step is the
+        newest step of the trajectory.
+
+        :param step: Step of the observation
+        :param latest_step: Newest step
+        :param observation: The observation
+        """
+        return (
+            latest_step - step < self.keep_recent_steps
+            or len(str(observation)) < self.min_observation_chars
+        )
+
+    def _candidates(self, view: Dict[str, Any], recent: set) -> List[str]:
+        return [
+            key
+            for key in view
+            if key.startswith("observation_")
+            and step_of(key) not in recent
+            and len(str(view[key])) >= self.min_observation_chars
+        ]
+
+    def _stub(self, key: str, view: Dict[str, Any]) -> str:
+        text = str(view[key])
+        head = " ".join(text[: self.stub_chars].split())
+        call = _observation_call(key, view)
+        if call is None:
+            source = "This observation"
+        else:
+            args = json.dumps(call.get("args", {}), ensure_ascii=False)
+            source = f"{call.get('name')}({args})"
+        return (
+            f"[compacted: {source} returned {len(text)} chars, starting "
+            f"with: {head} ... Call the tool again to see the full output.]"
+        )
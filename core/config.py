@@ -4,7 +4,7 @@ Configuration management for mini-code-agent.
 
 import yaml
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -21,12 +21,285 @@ class DSPyConfig(BaseModel):
     )
 
 
+class RoutingConfig(BaseModel):
+    """Fast/strong model routing configuration settings."""
+
+    fast_model: Optional[str] = Field(
+        default=None,
+        description="LM asked first for each tool-selection step; doubtful "
+        "answers escalate to dspy.model (None disables routing)",
+    )
+    fast_api_key: Optional[str] = Field(
+        default=None, description="API key of the fast model (default: "
+        "dspy.api_key)",
+    )
+    fast_api_base: Optional[str] = Field(
+        default=None, description="API base URL of the fast model "
+        "(default: dspy.api_base)",
+    )
+    verify_finish: bool = Field(
+        default=True,
+        description="Escalate when the fast model calls finish, so the "
+        "strong model confirms the task is done",
+    )
+    escalate_on_repeat: bool = Field(
+        default=True,
+        description="Escalate when the fast model repeats the previous "
+        "step's tool calls",
+    )
+
+
+class LMCacheConfig(BaseModel):
+    """LM response record/replay cache configuration settings."""
+
+    mode: Literal["off", "record", "replay", "read_through"] = Field(
+        default="off",
+        description="record: call the LM and store responses; replay: only "
+        "answer from the cache (a miss is an error); read_through: answer "
+        "from the cache, calling the LM on a miss",
+    )
+    directory: Optional[str] = Field(
+        default=None,
+        description="Cache directory (default: ~/.mini-code-agent/cache/lm)",
+    )
+    max_bytes: int = Field(
+        default=512 * 1024 * 1024,
+        description="Size limit of the cache on disk; least recently used "
+        "responses are evicted",
+    )
+
+
 class AgentConfig(BaseModel):
     """Agent configuration settings."""
 
     max_iters: int = Field(
         default=200, description="Maximum iterations for ReAct"
     )
+    max_tool_calls_per_step: int = Field(
+        default=8,
+        description="Maximum tool calls the model may batch into one step",
+    )
+    tool_workers: int = Field(
+        default=8,
+        description="Threads for running read-only tool calls concurrently",
+    )
+    trajectory_max_tokens: Optional[int] = Field(
+        default=32000,
+        description="Token budget for the trajectory in the prompt; older "
+        "large observations are compacted into stubs (None disables)",
+    )
+    compaction_keep_steps: int = Field(
+        default=2, description="Latest steps that are never compacted"
+    )
+    compaction_min_chars: int = Field(
+        default=1000,
+        description="Observations shorter than this are never compacted",
+    )
+    memoize_tools: bool = Field(
+        default=True,
+        description="Reuse results of repeated read-only tool calls within "
+        "a run until a write touches the files they depend on",
+    )
+
+
+class SearchConfig(BaseModel):
+    """Search tool configuration settings."""
+
+    use_index: bool = Field(
+        default=True,
+        description="Narrow search_in_files candidates with a trigram index",
+    )
+    index_dir: Optional[str] = Field(
+        default=None,
+        description="Index cache directory (default ~/.mini-code-agent/cache)",
+    )
+    index_refresh_interval: float = Field(
+        default=30.0,
+        ge=0,
+        description="Seconds a workspace file listing is reused (checking "
+        "only directory mtimes) before a search re-stats every file",
+    )
+    engine: Literal["serial", "parallel"] = Field(
+        default="serial",
+        description="search_in_files engine: single thread or process pool",
+    )
+    workers: Optional[int] = Field(
+        default=None,
+        description="Process count for the parallel engine (default CPUs)",
+    )
+    max_file_size: Optional[int] = Field(
+        default=None, description="Skip files larger than this many bytes"
+    )
+
+
+class RetrievalConfig(BaseModel):
+    """BM25 retrieval tool configuration settings."""
+
+    chunk_lines: int = Field(
+        default=50, description="Lines per indexed chunk of a file"
+    )
+    max_file_bytes: int = Field(
+        default=1024 * 1024, description="Larger files are not indexed"
+    )
+    snippet_lines: int = Field(
+        default=6, description="Best-matching lines shown per result"
+    )
+    prime_first_step: bool = Field(
+        default=False,
+        description="Run retrieve on the requirement before the first LM "
+        "step and put the results in the trajectory",
+    )
+    prime_k: int = Field(
+        default=8, description="Results retrieved when priming"
+    )
+
+
+class FileConfig(BaseModel):
+    """File tool configuration settings."""
+
+    read_max_bytes: Optional[int] = Field(
+        default=256 * 1024,
+        description="Byte budget for read_file output (None for no limit)",
+    )
+    mmap_threshold: int = Field(
+        default=8 * 1024 * 1024,
+        description="Serve reads of files at least this large via mmap",
+    )
+    cache_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description="Size limit of the shared file content cache",
+    )
+    read_workers: int = Field(
+        default=8, description="Threads read_files reads files with"
+    )
+
+
+class WebConfig(BaseModel):
+    """Web tool configuration settings."""
+
+    headless: bool = Field(
+        default=True, description="Run the shared Chromium without a window"
+    )
+    max_concurrency: int = Field(
+        default=4, description="Maximum pages rendering at the same time"
+    )
+    timeout_ms: int = Field(
+        default=30000, description="Default page operation timeout (ms)"
+    )
+    cache_enabled: bool = Field(
+        default=True, description="Cache rendered pages and search results"
+    )
+    cache_ttl: int = Field(
+        default=24 * 3600,
+        description="Seconds before a cached entry is refreshed",
+    )
+    cache_max_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        description="Size limit of the web response cache on disk",
+    )
+    cache_dir: Optional[str] = Field(
+        default=None,
+        description="Web cache directory (default under ~/.mini-code-agent)",
+    )
+    max_output_chars: Optional[int] = Field(
+        default=20000,
+        description="Budget for extracted page text (None for no limit)",
+    )
+
+
+class ToolLimitsConfig(BaseModel):
+    """Limits of one tool; unset fields use the tools section defaults."""
+
+    timeout_s: Optional[float] = Field(
+        default=None, description="Wall-clock limit per call (0 for none)"
+    )
+    max_output_chars: Optional[int] = Field(
+        default=None, description="Output cap per call (0 for none)"
+    )
+
+
+class ToolsConfig(BaseModel):
+    """Execution limits applied to every tool call."""
+
+    timeout_s: Optional[float] = Field(
+        default=120,
+        description="Seconds before a tool call is stopped (None for none)",
+    )
+    max_output_chars: Optional[int] = Field(
+        default=40000,
+        description="Longer tool output is truncated with a marker "
+        "(None for no limit)",
+    )
+    per_tool: Dict[str, ToolLimitsConfig] = Field(
+        default_factory=dict,
+        description="Overrides keyed by tool name",
+    )
+
+
+class TracingConfig(BaseModel):
+    """Run tracing configuration settings."""
+
+    enabled: bool = Field(
+        default=False,
+        description="Record spans for every LM call and tool invocation",
+    )
+    jsonl_path: Optional[str] = Field(
+        default=None, description="Append spans to this JSONL file"
+    )
+    memory: bool = Field(
+        default=False,
+        description="Keep spans in memory (Agent.trace_spans())",
+    )
+    print_summary: bool = Field(
+        default=True, description="Print a summary table after each run"
+    )
+
+
+class CheckpointConfig(BaseModel):
+    """Run checkpoint (Agent.resume) configuration settings."""
+
+    enabled: bool = Field(
+        default=False,
+        description="Write each run's LM decisions, tool results and steps "
+        "to disk as they happen, so Agent.resume can continue the run",
+    )
+    directory: Optional[str] = Field(
+        default=None,
+        description="Checkpoint directory (default: "
+        "~/.mini-code-agent/checkpoints)",
+    )
+    keep_runs: int = Field(
+        default=100,
+        description="Newest finished runs kept; older ones are deleted when "
+        "a run starts (0 keeps all; unfinished runs are always kept)",
+    )
+
+
+class ServerConfig(BaseModel):
+    """Agent server (python -m core.server) configuration settings."""
+
+    host: str = Field(default="127.0.0.1", description="TCP host to bind")
+    port: int = Field(default=8765, description="TCP port to bind")
+    unix_socket: Optional[str] = Field(
+        default=None,
+        description="Serve on this Unix socket path instead of TCP",
+    )
+    agents: int = Field(
+        default=4,
+        description="Warm Agent instances, i.e. requirements run at once",
+    )
+    max_queue: int = Field(
+        default=64,
+        description="Requests allowed to wait for a free agent",
+    )
+    workspace_root: Optional[str] = Field(
+        default=None,
+        description="Directory that request workspaces must lie within",
+    )
+    token: Optional[str] = Field(
+        default=None,
+        description="Bearer token every request must carry",
+    )
 
 
 class Config(BaseModel):
@@ -34,6 +307,16 @@ class Config(BaseModel):
 
     dspy: DSPyConfig
     agent: AgentConfig
+    routing: RoutingConfig = Field(default_factory=RoutingConfig)
+    lm_cache: LMCacheConfig = Field(default_factory=LMCacheConfig)
+    search: SearchConfig = Field(default_factory=SearchConfig)
+    retrieval: RetrievalConfig = Field(default_factory=RetrievalConfig)
+    files: FileConfig = Field(default_factory=FileConfig)
+    web: WebConfig = Field(default_factory=WebConfig)
+    tools: ToolsConfig = Field(default_factory=ToolsConfig)
+    tracing: TracingConfig = Field(default_factory=TracingConfig)
+    checkpoint: CheckpointConfig = Field(default_factory=CheckpointConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
 
     @classmethod
     def load(cls, config_dir: Optional[str] = None) -> "Config":
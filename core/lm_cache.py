@@ -0,0 +1,215 @@
+"""
+Record/replay cache of LM responses, so repeated runs of the same
+requirement can skip the LM.
+
+Responses are keyed on the model, the full prompt (messages) and every
+request parameter, and stored one JSON file per entry in a DiskCache with
+size-based eviction. Modes:
+
+- record: always call the LM and store (overwrite) its response
+- replay: answer only from the cache; a miss raises LMCacheMiss
+- read_through: answer from the cache, calling the LM and storing the
+  response on a miss
+
+Replayed answers make no LM call, so they are not streamed token by token
+and do not appear as LM spans in tracing; they are added to the history of
+the CachedLM with "cache_hit": True.
+
+This module imports dspy; Agent only imports it when the cache is enabled.
+"""
+
+import datetime
+import hashlib
+import json
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import dspy
+
+from .tool.disk_cache import DiskCache
+
+CACHE_MODES = ("off", "record", "replay", "read_through")
+
+DEFAULT_DIR = Path.home() / ".mini-code-agent" / "cache" / "lm"
+
+
+class LMCacheMiss(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def cache_key(
+    lm,
+    prompt: Optional[str],
+    messages: Optional[list],
+    kwargs: Dict[str, Any],
+) -> str:
+    """
+    The cache key of one LM request.
+
+    :param lm: LM that would serve the request
+    :param prompt: Prompt string (text models)
+    :param messages: Chat messages
+    :param kwargs: Request parameters; they override the LM defaults
+    :return: sha256 of the canonical JSON of model, prompt and parameters
+    """
+    params = {**getattr(lm, "kwargs", {}), **kwargs}
+    params = {
+        key: value
+        for key, value in params.items()
+        if not key.startswith("api_")
+    }
+    canonical = json.dumps(
+        {
+            "model": lm.model,
+            "model_type": getattr(lm, "model_type", "chat"),
+            "prompt": prompt,
+            "messages": messages,
+            "params": params,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    # 条目里只存摘要，不重复保存整段提示词
+    return "lm:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CachedLM(dspy.BaseLM):
+    """
+    Wraps a dspy LM and records or replays its responses.
+
+    Cache misses are forwarded to the wrapped LM unchanged, so its
+    streaming, retries, history and callbacks (tracing) still apply.
+    """
+
+    def __init__(self, lm, cache: DiskCache, mode: str = "read_through"):
+        """
+        :param lm: LM that serves cache misses
+        :param cache: Where responses are stored
+        :param mode: "record", "replay" or "read_through"
+        """
+        if mode not in CACHE_MODES[1:]:
+            raise ValueError(f"Unknown LM cache mode: {mode}")
+        super().__init__(
+            lm.model,
+            model_type=getattr(lm, "model_type", "chat"),
+            num_retries=getattr(lm, "num_retries", 3),
+        )
+        self.lm = lm
+        self.store = cache
+        self.mode = mode
+        # 与被包装的 LM 共用默认参数，这样键里的参数与实际请求一致
+        self.kwargs = lm.kwargs
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def supports_function_calling(self) -> bool:
+        return self.lm.supports_function_calling
+
+    @property
+    def supports_reasoning(self) -> bool:
+        return self.lm.supports_reasoning
+
+    @property
+    def supports_response_schema(self) -> bool:
+        return self.lm.supports_response_schema
+
+    @property
+    def supported_params(self) -> set:
+        return self.lm.supported_params
+
+    def __call__(self, prompt=None, *, messages=None, **kwargs):
+        key = cache_key(self.lm, prompt, messages, kwargs)
+        outputs = self._lookup(key, prompt, messages, kwargs)
+        if outputs is None:
+            outputs = self.lm(prompt, messages=messages, **kwargs)
+            self._save(key, outputs)
+        return outputs
+
+    async def acall(self, prompt=None, *, messages=None, **kwargs):
+        key = cache_key(self.lm, prompt, messages, kwargs)
+        outputs = self._lookup(key, prompt, messages, kwargs)
+        if outputs is None:
+            outputs = await self.lm.acall(prompt, messages=messages, **kwargs)
+            self._save(key, outputs)
+        return outputs
+
+    def _lookup(self, key: str, prompt, messages, kwargs) -> Optional[list]:
+        """Recorded outputs of a request, or None when the LM must answer."""
+        if self.mode == "record":
+            return None
+        entry = self.store.get(key)
+        if entry is None:
+            if self.mode == "replay":
+                raise LMCacheMiss(
+                    f"No recorded response for this {self.lm.model} "
+                    f"request (lm_cache.mode is replay)"
+                )
+            return None
+        outputs = entry[0]
+        self.update_history(
+            {
+                "prompt": prompt,
+                "messages": messages,
+                "kwargs": kwargs,
+                "response": None,
+                "outputs": outputs,
+                "usage": {},
+                "cost": None,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "uuid": str(uuid.uuid4()),
+                "model": self.model,
+                "model_type": self.model_type,
+                "cache_hit": True,
+            }
+        )
+        return outputs
+
+    def _save(self, key: str, outputs):
+        try:
+            json.dumps(outputs)
+        except (TypeError, ValueError):
+            # 无法序列化的结果（如原生响应对象）不缓存
+            return
+        self.store.set(key, outputs)
+        with self._lock:
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache counters of this LM.
+
+        :return: mode, hits, misses, recorded, plus entries and bytes on
+            disk
+        """
+        return {"mode": self.mode, "recorded": self.recorded,
+                **self.store.stats()}
+
+
+def wrap_lm(
+    lm,
+    mode: str,
+    directory: Optional[str] = None,
+    max_bytes: int = 512 * 1024 * 1024,
+):
+    """
+    Put an LM behind the response cache.
+
+    :param lm: LM to wrap (an already wrapped LM is rewrapped around its
+        inner LM)
+    :param mode: One of CACHE_MODES; "off" returns the LM unwrapped
+    :param directory: Cache directory (default ~/.mini-code-agent/cache/lm)
+    :param max_bytes: Size limit of the cache on disk
+    :return: The LM to use
+    """
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown LM cache mode: {mode}")
+    if isinstance(lm, CachedLM):
+        lm = lm.lm
+    if mode == "off":
+        return lm
+    cache = DiskCache(directory or str(DEFAULT_DIR), max_bytes)
+    return CachedLM(lm, cache, mode)
@@ -0,0 +1,750 @@
+"""
+Batched ReAct loop for mini-code-agent.
+
+Unlike dspy.ReAct, which runs exactly one tool per LM call, BatchReAct lets
+the model request several tool calls in one step. Consecutive read-only
+calls run concurrently on a thread pool; every other call runs serially in
+the order the model gave them.
+
+A run can report its progress through an on_event callback (steps,
+thoughts, tool calls and tool results as they happen) and be stopped early
+with a cancel event, which raises RunCancelled at the next step or tool
+call. With a ToolBudget every tool call gets an output cap, and read-only
+calls get a wall-clock timeout: one that overruns is stopped and the model
+receives a structured error as its observation. Write tools are always
+run to completion, since a thread cannot be stopped halfway through a
+write. `prime` tool calls (e.g. a retrieval for the requirement) run as
+step 0, before the first LM call. Inside tool.confine.confine_tools(root)
+relative paths are resolved against root and calls that would touch paths
+outside root are refused.
+
+With a RunCheckpoint every LM decision, tool result and completed step is
+written to disk as it happens. Forwarding the checkpoint of an interrupted
+run resumes it: recorded steps are replayed without calling the LM or the
+tools, and a side-effecting call that was running when the process died is
+not repeated.
+
+Read-only calls are memoized for the length of a run (tool.memo.ToolMemo):
+repeating a call whose files no write has touched since reuses the earlier
+result, and while that earlier observation is still shown in full the model
+gets a short "unchanged since step N" reference instead of the output again.
+
+With a ModelRouter each step is first asked of a fast model and escalated
+to the strong model (the LM of the dspy context) when the fast answer is
+unusable or doubtful; the final answer always comes from the strong model.
+"""
+
+import asyncio
+import contextvars
+import dataclasses
+import functools
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import dspy
+from dspy.utils.callback import BaseCallback
+from dspy.utils.exceptions import ContextWindowExceededError
+from pydantic import BaseModel, Field
+
+from .checkpoint import INTERRUPTED_OBSERVATION, RunCheckpoint
+from .compaction import CompactionStats, TrajectoryCompactor, step_of
+from .routing import ModelRouter, RoutingStats
+from .tool.budget import (
+    ToolBudget,
+    ToolBudgetError,
+    ToolLimits,
+    run_with_budget,
+)
+from .tool.confine import anchor_args, check_call
+from .tool.memo import MemoEntry, ToolMemo
+from .tracing import RunTrace, Tracer, byte_size
+
+logger = logging.getLogger(__name__)
+
+
+class ToolCall(BaseModel):
+    """One tool invocation requested by the model."""
+
+    name: str = Field(description="Tool name")
+    args: Dict[str, Any] = Field(
+        default_factory=dict, description="Tool arguments as a JSON object"
+    )
+
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+# 重复的只读调用：之前的观察结果仍完整可见时，用这段引用代替
+UNCHANGED_OBSERVATION = (
+    "Unchanged since step {step}: same output as observation_{step}_{index} "
+    "of the identical {name} call; no file it depends on was modified since."
+)
+
+# 预先执行的第 0 步在轨迹中的 thought
+PRIME_THOUGHT = (
+    "Before planning, look up the parts of the workspace most relevant to "
+    "the task."
+)
+
+
+class RunCancelled(Exception):
+    """Raised when a run's cancel event is set before it finished."""
+
+
+def _format_error(err: Exception) -> str:
+    return f"{type(err).__name__}: {err}"
+
+
+def _invoke(
+    tool: dspy.Tool,
+    args: Dict[str, Any],
+    limits: Optional[ToolLimits] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Any:
+    """
+    Run a tool within its limits, converting async tools to sync in the
+    current thread.
+    """
+    is_async = inspect.iscoroutinefunction(tool.func)
+    if limits is None:
+        return asyncio.run(tool.acall(**args)) if is_async else tool(**args)
+    fn = functools.partial(tool.acall if is_async else tool, **args)
+    return run_with_budget(fn, tool.name, limits, cancel, is_async)
+
+
+class _LMSpanCallback(BaseCallback):
+    """Records a tracing span for every LM call."""
+
+    def __init__(self, trace: RunTrace):
+        self.trace = trace
+        self.step: Optional[int] = None
+        self._started: Dict[str, tuple] = {}
+
+    def on_lm_start(self, call_id, instance, inputs):
+        messages = inputs.get("messages") or inputs.get("prompt") or ""
+        self._started[call_id] = (
+            time.perf_counter(),
+            instance,
+            len(instance.history),
+            byte_size(messages),
+            inputs.get("messages"),
+        )
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        started = self._started.pop(call_id, None)
+        if started is None:
+            return
+        start, lm, history_len, input_bytes, messages = started
+        usage = {}
+        # 多个 Agent 可能共用一个 LM，按消息找到本次调用的记录
+        for entry in reversed(lm.history[history_len:]):
+            if entry.get("messages") is messages or (
+                entry.get("messages") == messages
+            ):
+                usage = entry.get("usage") or {}
+                break
+        self.trace.record(
+            "lm",
+            getattr(lm, "model", type(lm).__name__),
+            start,
+            step=self.step,
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            completion_tokens=usage.get("completion_tokens") or 0,
+            input_bytes=input_bytes,
+            output_bytes=byte_size(outputs or ""),
+            error=repr(exception) if exception else None,
+        )
+
+
+class _Run:
+    """Mutable state of one BatchReAct.forward() call."""
+
+    def __init__(
+        self,
+        trace: Optional[RunTrace] = None,
+        on_event: Optional[EventCallback] = None,
+        cancel: Optional[threading.Event] = None,
+        checkpoint: Optional[RunCheckpoint] = None,
+        memo: Optional[ToolMemo] = None,
+    ):
+        self.trajectory: Dict[str, Any] = {}
+        self.compaction = CompactionStats()
+        self.routing = RoutingStats()
+        self.trace = trace
+        self.lm_callback = _LMSpanCallback(trace) if trace else None
+        self.on_event = on_event
+        self.cancel = cancel
+        self.checkpoint = checkpoint
+        self.memo = memo
+        self.step: Optional[int] = None
+        self.steps = 0
+
+    def emit(self, event: str, **fields):
+        if self.on_event is not None:
+            self.on_event({"event": event, **fields})
+
+    def check_cancelled(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise RunCancelled(f"run cancelled after {self.steps} step(s)")
+
+    def set_step(self, step: Optional[int]):
+        self.step = step
+        if self.lm_callback is not None:
+            self.lm_callback.step = step
+
+
+class BatchReAct(dspy.Module):
+    """
+    ReAct variant whose steps may contain a batch of tool calls.
+    """
+
+    def __init__(
+        self,
+        signature,
+        tools: List[Callable],
+        max_iters: int = 20,
+        read_only_tools: Iterable[str] = (),
+        max_calls_per_step: int = 8,
+        max_workers: int = 8,
+        compactor: Optional[TrajectoryCompactor] = None,
+        tracer: Optional[Tracer] = None,
+        budget: Optional[ToolBudget] = None,
+        memoize: bool = True,
+        router: Optional[ModelRouter] = None,
+    ):
+        """
+        :param signature: Signature of the task (inputs and outputs)
+        :param tools: Tool functions or dspy.Tool instances
+        :param max_iters: Maximum number of LM steps
+        :param read_only_tools: Names of tools without side effects, which
+            may run concurrently within a step
+        :param max_calls_per_step: Maximum tool calls executed per step
+        :param max_workers: Thread pool size for concurrent tool calls
+        :param compactor: Keeps the trajectory in the prompt within a token
+            budget (None disables compaction)
+        :param tracer: Records LM and tool spans (None disables tracing)
+        :param budget: Timeout and output limits per tool (None runs tools
+            without limits)
+        :param memoize: Reuse the results of repeated read-only calls
+            within a run until a write touches the files they depend on
+        :param router: Sends steps to a fast model first (None asks the
+            LM of the dspy context for every step)
+        """
+        super().__init__()
+        self.signature = signature = dspy.ensure_signature(signature)
+        self.max_iters = max_iters
+        self.read_only_tools = set(read_only_tools)
+        self.max_calls_per_step = max_calls_per_step
+        self.max_workers = max_workers
+        self.compactor = compactor
+        self.tracer = tracer
+        self.budget = budget
+        self.memoize = memoize
+        self.router = router
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        tools = [
+            t if isinstance(t, dspy.Tool) else dspy.Tool(t) for t in tools
+        ]
+        tools = {tool.name: tool for tool in tools}
+
+        inputs = ", ".join(f"`{k}`" for k in signature.input_fields)
+        outputs = ", ".join(f"`{k}`" for k in signature.output_fields)
+        instr = []
+        if signature.instructions:
+            instr.append(f"{signature.instructions}\n")
+        instr.extend(
+            [
+                f"You are an Agent. In each episode, you will be given the "
+                f"fields {inputs} as input. And you can see your past "
+                f"trajectory so far.",
+                f"Your goal is to use one or more of the supplied tools to "
+                f"collect any necessary information for producing "
+                f"{outputs}.\n",
+                "In each turn, write next_thought and then next_tool_calls: "
+                "a list of tool calls, each with a `name` and JSON `args`.",
+                f"Independent calls (e.g. reading several files or running "
+                f"several searches) should be batched into one turn; up to "
+                f"{max_calls_per_step} calls run per turn. Read-only calls "
+                f"run concurrently, all other calls run in the given order.",
+                "After each turn, you receive one observation per tool call, "
+                "which gets appended to your trajectory.\n",
+                "When writing next_thought, you may reason about the current "
+                "situation and plan for future steps.",
+                "Old large observations may be replaced by a [compacted: ...] "
+                "stub; call the same tool again if you need its output.",
+                "Repeating a read-only call whose files have not changed "
+                "returns a short 'Unchanged since step N' reference to the "
+                "earlier observation.",
+                "Each tool call must use one of the following tools:\n",
+            ]
+        )
+
+        tools["finish"] = dspy.Tool(
+            func=lambda: "Completed.",
+            name="finish",
+            desc=(
+                f"Marks the task as complete. That is, signals that all "
+                f"information for producing the outputs, i.e. {outputs}, "
+                f"are now available to be extracted. Call it alone."
+            ),
+            args={},
+        )
+
+        for idx, tool in enumerate(tools.values()):
+            instr.append(f"({idx + 1}) {tool}")
+
+        react_signature = (
+            dspy.Signature({**signature.input_fields}, "\n".join(instr))
+            .append("trajectory", dspy.InputField(), type_=str)
+            .append("next_thought", dspy.OutputField(), type_=str)
+            .append(
+                "next_tool_calls", dspy.OutputField(), type_=List[ToolCall]
+            )
+        )
+        fallback_signature = dspy.Signature(
+            {**signature.input_fields, **signature.output_fields},
+            signature.instructions,
+        ).append("trajectory", dspy.InputField(), type_=str)
+
+        self.tools = tools
+        self.react = dspy.Predict(react_signature)
+        self.extract = dspy.ChainOfThought(fallback_signature)
+
+    def forward(
+        self,
+        on_event: Optional[EventCallback] = None,
+        cancel: Optional[threading.Event] = None,
+        prime: Optional[List[ToolCall]] = None,
+        checkpoint: Optional[RunCheckpoint] = None,
+        **input_args,
+    ):
+        """
+        Run the loop.
+
+        :param on_event: Called with an event dict ("step", "thought",
+            "tool_call", "tool_result") as the run progresses; tool results
+            may be reported from worker threads
+        :param cancel: When set, the run stops at the next step or tool
+            call and raises RunCancelled
+        :param prime: Tool calls executed as step 0 before the first LM
+            call (e.g. a retrieval for the requirement); their
+            observations start the trajectory
+        :param checkpoint: Records the run's progress; when it holds the
+            progress of an interrupted run, that run is resumed
+        :param input_args: The signature's input fields (and optionally
+            max_iters)
+        """
+        max_iters = input_args.pop("max_iters", self.max_iters)
+        trace = self.tracer.start_run() if self.tracer is not None else None
+        memo = ToolMemo(self.read_only_tools) if self.memoize else None
+        run = _Run(trace, on_event, cancel, checkpoint, memo)
+        if trace is None:
+            return self._loop(run, max_iters, input_args, prime)
+
+        callbacks = [*dspy.settings.callbacks, run.lm_callback]
+        with dspy.context(callbacks=callbacks):
+            try:
+                pred = self._loop(run, max_iters, input_args, prime)
+            except Exception as err:
+                trace.finish(run.steps, error=_format_error(err))
+                raise
+        trace.finish(run.steps)
+        pred.trace = trace
+        return pred
+
+    def _loop(
+        self,
+        run: "_Run",
+        max_iters: int,
+        input_args: Dict[str, Any],
+        prime: Optional[List[ToolCall]] = None,
+    ):
+        trajectory = run.trajectory
+        checkpoint = run.checkpoint
+        for idx in range(max_iters):
+            self._start_step(run, idx)
+            if checkpoint is not None and idx in checkpoint.steps:
+                finished = checkpoint.replay_step(idx, trajectory)
+                run.steps = idx + 1
+                if finished:
+                    break
+                continue
+            if checkpoint is not None and checkpoint.result is not None:
+                break
+
+            if checkpoint is not None and idx in checkpoint.decisions:
+                thought, call_dicts = checkpoint.decisions[idx]
+                calls = [ToolCall(**call) for call in call_dicts]
+            else:
+                if idx == 0 and prime:
+                    thought, calls = PRIME_THOUGHT, list(prime)
+                else:
+                    try:
+                        pred = self._predict_step(run, idx, input_args)
+                    except ContextWindowExceededError as err:
+                        logger.warning(f"Ending the trajectory: {err}")
+                        break
+                    except ValueError as err:
+                        logger.warning(
+                            f"Ending the trajectory: Agent failed to select "
+                            f"valid tools: {err}"
+                        )
+                        break
+                    thought = pred.next_thought
+                    calls = list(pred.next_tool_calls or [])
+                if checkpoint is not None:
+                    checkpoint.record_decision(
+                        idx, thought, [call.model_dump() for call in calls]
+                    )
+
+            self._record_step(run, idx, thought, calls)
+            finished = self._run_step(run, idx, calls)
+            if checkpoint is not None:
+                checkpoint.record_step(idx, trajectory, finished)
+            if finished:
+                break
+
+        run.check_cancelled()
+        run.set_step(None)
+        if checkpoint is not None and checkpoint.result is not None:
+            extract = checkpoint.result
+        else:
+            extract = dict(self._predict_extract(run, input_args).items())
+            if checkpoint is not None:
+                checkpoint.record_result(extract)
+        return dspy.Prediction(
+            trajectory=trajectory,
+            compaction=run.compaction.as_dict(),
+            tool_memo=run.memo.stats() if run.memo is not None else {},
+            routing=run.routing.as_dict() if self.router is not None else {},
+            **extract,
+        )
+
+    def _predict_step(
+        self, run: "_Run", idx: int, input_args: Dict[str, Any]
+    ):
+        """The LM's thought and tool calls for a step, routed if enabled."""
+
+        def predict(**lm):
+            # 快速模型放不下时不截断，由路由交给（上下文更大的）强模型
+            return self._call_with_potential_trajectory_truncation(
+                self.react, run.trajectory, run.compaction,
+                truncate=not lm, **input_args, **lm,
+            )
+
+        if self.router is None:
+            return predict()
+        return self.router.decide(
+            predict,
+            run.routing,
+            self.tools,
+            run.trajectory.get(f"tool_calls_{idx - 1}"),
+        )
+
+    def _predict_extract(self, run: "_Run", input_args: Dict[str, Any]):
+        """The final outputs, always from the strong model."""
+
+        def predict():
+            return self._call_with_potential_trajectory_truncation(
+                self.extract, run.trajectory, run.compaction, **input_args
+            )
+
+        if self.router is None:
+            return predict()
+        return self.router.strong(predict, run.routing)
+
+    def _start_step(self, run: "_Run", idx: int):
+        run.check_cancelled()
+        run.set_step(idx)
+        run.emit("step", step=idx)
+
+    def _record_step(
+        self, run: "_Run", idx: int, thought: str, calls: List[ToolCall]
+    ):
+        run.trajectory[f"thought_{idx}"] = thought
+        run.trajectory[f"tool_calls_{idx}"] = [
+            call.model_dump() for call in calls
+        ]
+        run.steps = idx + 1
+        run.emit("thought", step=idx, text=thought)
+
+    def close(self):
+        """Shut down the tool thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run_step(self, run: "_Run", idx: int, calls: List[ToolCall]) -> bool:
+        """Execute one step's calls; return True when the model finished."""
+        trajectory = run.trajectory
+        if not calls:
+            trajectory[f"observation_{idx}"] = (
+                "No tool calls were given. Call `finish` if the task is done."
+            )
+            return False
+
+        finished = False
+        for pos, call in enumerate(calls):
+            if call.name == "finish":
+                calls, finished = calls[:pos], True
+                break
+
+        skipped = calls[self.max_calls_per_step:]
+        calls = calls[:self.max_calls_per_step]
+        for pos, call in enumerate(calls, start=1):
+            run.emit(
+                "tool_call", step=idx, index=pos, name=call.name,
+                args=call.args,
+            )
+        results = self._execute(run, calls)
+        for pos, (call, result) in enumerate(zip(calls, results), start=1):
+            trajectory[f"observation_{idx}_{pos}"] = result
+        if skipped:
+            trajectory[f"observation_{idx}_skipped"] = (
+                f"{len(skipped)} call(s) beyond the limit of "
+                f"{self.max_calls_per_step} per step were not executed: "
+                f"{[call.name for call in skipped]}"
+            )
+        if finished:
+            trajectory[f"observation_{idx}_finish"] = "Completed."
+        return finished
+
+    def _execute(self, run: "_Run", calls: List[ToolCall]) -> List[Any]:
+        """Run calls in order, grouping consecutive read-only calls."""
+        results: List[Any] = []
+        group: List[Tuple[int, ToolCall]] = []
+
+        def _call(item: Tuple[int, ToolCall]) -> Any:
+            return self._call_tool(run, *item)
+
+        def _flush_group():
+            if len(group) == 1:
+                results.append(_call(group[0]))
+            elif group:
+                executor = self._get_executor()
+                # 每个调用在运行上下文的副本中执行（Agent 的工具设置）
+                contexts = [contextvars.copy_context() for _ in group]
+                results.extend(
+                    executor.map(
+                        lambda context, item: context.run(_call, item),
+                        contexts,
+                        group,
+                    )
+                )
+            group.clear()
+
+        for item in enumerate(calls, start=1):
+            if item[1].name in self.read_only_tools:
+                group.append(item)
+                continue
+            _flush_group()
+            results.append(_call(item))
+        _flush_group()
+        return results
+
+    def _call_tool(self, run: "_Run", index: int, call: ToolCall) -> Any:
+        run.check_cancelled()
+        checkpoint = run.checkpoint
+        if checkpoint is None:
+            return self._run_tool(run, index, call)
+        key = (run.step, index)
+        if run.step == checkpoint.interrupted_step:
+            # 续跑中断的那一步：已有结果的调用不再执行；已开始但没有
+            # 结果的写工具可能已经生效，也不重复执行
+            if key in checkpoint.tools:
+                return checkpoint.tools[key]
+            if key in checkpoint.started_tools:
+                return INTERRUPTED_OBSERVATION.format(name=call.name)
+        if call.name not in self.read_only_tools:
+            checkpoint.record_tool_start(run.step, index, call.name)
+        result = self._run_tool(run, index, call)
+        checkpoint.record_tool(run.step, index, result)
+        return result
+
+    def _run_tool(self, run: "_Run", index: int, call: ToolCall) -> Any:
+        if run.trace is None and run.on_event is None:
+            return self._invoke_memoized(run, index, call)[0]
+        start = time.perf_counter()
+        result, error = self._invoke_memoized(run, index, call)
+        run.emit(
+            "tool_result",
+            step=run.step,
+            index=index,
+            name=call.name,
+            observation=result,
+            error=error,
+            duration_ms=(time.perf_counter() - start) * 1000,
+        )
+        if run.trace is None:
+            return result
+        run.trace.record(
+            "tool",
+            call.name,
+            start,
+            step=run.step,
+            input_bytes=byte_size(call.args),
+            output_bytes=byte_size(result),
+            error=error,
+        )
+        return result
+
+    def _invoke_memoized(
+        self, run: "_Run", index: int, call: ToolCall
+    ) -> Tuple[Any, Optional[str]]:
+        """Run one call through the run's memo of read-only results."""
+        args = anchor_args(call.name, call.args)
+        if args is not call.args:
+            call = call.model_copy(update={"args": args})
+        memo = run.memo
+        if memo is None:
+            return self._invoke_call(call, run.cancel)
+        if call.name not in self.read_only_tools:
+            try:
+                return self._invoke_call(call, run.cancel)
+            finally:
+                memo.invalidate(call.name, call.args)
+        entry = memo.get(call.name, call.args)
+        if entry is not None:
+            reference = self._unchanged_reference(run, call, entry)
+            if reference is not None:
+                return reference, None
+            result, error = entry.result, None
+        else:
+            result, error = self._invoke_call(call, run.cancel)
+        if error is None:
+            # 指向最近一次完整出现的结果
+            memo.put(call.name, call.args, result, run.step, index)
+        return result, error
+
+    def _unchanged_reference(
+        self, run: "_Run", call: ToolCall, entry: MemoEntry
+    ) -> Optional[str]:
+        """Short stand-in for a repeated result still shown in full."""
+        if entry.step == run.step:
+            return None
+        if run.compaction.truncated_steps:
+            # 提示词已开始丢弃最早的步，无法确定第 N 步仍然可见
+            return None
+        if self.compactor is not None and not self.compactor.keeps_full(
+            entry.step, run.step, entry.result
+        ):
+            return None
+        reference = UNCHANGED_OBSERVATION.format(
+            step=entry.step, index=entry.index, name=call.name
+        )
+        return reference if len(reference) < len(str(entry.result)) else None
+
+    def _invoke_call(
+        self, call: ToolCall, cancel: Optional[threading.Event] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """Run one call; return (observation, error or None)."""
+        tool = self.tools.get(call.name)
+        if tool is None:
+            error = f"Unknown tool `{call.name}`"
+            return f"{error}. Available tools: {list(self.tools)}", error
+        denied = check_call(
+            call.name, call.args, call.name in self.read_only_tools
+        )
+        if denied is not None:
+            error = f"Access denied: {denied}"
+            return f"{error}. The call was not run.", error
+        limits = self.budget.limits(call.name) if self.budget else None
+        if limits is not None and call.name not in self.read_only_tools:
+            # 线程无法被强行停止：写工具超时后仍会写入文件，告诉模型它已
+            # 被停止是错误的，因此写工具不设超时，执行完毕再返回
+            limits = dataclasses.replace(limits, timeout_s=None)
+        try:
+            return _invoke(tool, call.args, limits, cancel), None
+        except ToolBudgetError as err:
+            if err.kind == "cancelled":
+                raise RunCancelled(f"run cancelled during {call.name}")
+            return err.observation(), f"{err.kind}: {err}"
+        except Exception as err:
+            error = _format_error(err)
+            return f"Execution error in {call.name}: {error}", error
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="agent-tool"
+            )
+        return self._executor
+
+    def _format_trajectory(
+        self,
+        trajectory: Dict[str, Any],
+        stats: Optional[CompactionStats] = None,
+    ) -> str:
+        if self.compactor is not None:
+            trajectory = self.compactor.compact(trajectory, stats)
+        adapter = dspy.settings.adapter or dspy.ChatAdapter()
+        # 用字段字典而不是 "a, b -> x" 字符串构造签名：字符串要经过
+        # ast.parse，在 CPython 3.11 中多线程并发解析会抛 SystemError
+        fields = {key: (str, dspy.InputField()) for key in trajectory}
+        fields["x"] = (str, dspy.OutputField())
+        trajectory_signature = dspy.Signature(fields, "Trajectory.")
+        return adapter.format_user_message_content(
+            trajectory_signature, trajectory
+        )
+
+    def _call_with_potential_trajectory_truncation(
+        self,
+        module,
+        trajectory: Dict[str, Any],
+        stats: Optional[CompactionStats] = None,
+        truncate: bool = True,
+        **input_args,
+    ):
+        """
+        Call a predictor, dropping the oldest steps from the prompt while
+        it exceeds the context window (the run's trajectory is unchanged).
+
+        :param truncate: Retry with a truncated trajectory; with False a
+            ContextWindowExceededError is raised at once
+        """
+        last_error = None
+        for _ in range(3):
+            try:
+                return module(
+                    **input_args,
+                    trajectory=self._format_trajectory(trajectory, stats),
+                )
+            except ContextWindowExceededError as err:
+                if not truncate:
+                    raise
+                logger.warning(
+                    "Trajectory exceeded the context window, truncating the "
+                    "oldest step."
+                )
+                last_error = err
+                trajectory = self.truncate_trajectory(trajectory)
+                if stats is not None:
+                    stats.truncated_steps += 1
+        raise ContextWindowExceededError(
+            message="The context window was exceeded even after 3 attempts "
+            "to truncate the trajectory."
+        ) from last_error
+
+    def truncate_trajectory(self, trajectory: Dict[str, Any]):
+        """
+        A copy of the trajectory without its oldest step (thought, calls
+        and observations); the given trajectory is not modified.
+        """
+        steps = sorted({step_of(key) for key in trajectory})
+        if len(steps) <= 1:
+            raise ContextWindowExceededError(
+                message="The trajectory is too long so your prompt exceeded "
+                "the context window, but the trajectory cannot be truncated "
+                "because it only has one step."
+            )
+        oldest = steps[0]
+        return {
+            key: value
+            for key, value in trajectory.items()
+            if step_of(key) != oldest
+        }
@@ -0,0 +1,212 @@
+"""
+Routing of ReAct steps between a fast and a strong model.
+
+Most steps only pick the next tool calls, which a small, fast model does
+well. ModelRouter asks the fast model first and escalates the step to the
+strong model (the agent's main LM) when the fast answer cannot be used or
+looks doubtful:
+
+- context_window: the prompt did not fit the fast model's context window
+  (the strong model is tried before the trajectory is truncated)
+- parse_error: the fast model's output could not be parsed
+- no_calls: it requested no tool calls
+- unknown_tool: it called a tool that does not exist
+- repeat: it repeated the previous step's calls exactly (a likely loop)
+- finish: it decided the task is done (verify_finish)
+
+The final answer (extract) always comes from the strong model. Every
+routed LM call is timed and its token usage is collected per model.
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import dspy
+from dspy.utils.exceptions import AdapterParseError, ContextWindowExceededError
+from dspy.utils.usage_tracker import track_usage
+
+ESCALATION_REASONS = (
+    "context_window",
+    "parse_error",
+    "no_calls",
+    "unknown_tool",
+    "repeat",
+    "finish",
+)
+
+
+@dataclass
+class ModelStats:
+    """Calls, latency and tokens of one model."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, other: "ModelStats"):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        avg_ms = self.seconds * 1000 / self.calls if self.calls else 0.0
+        return {**asdict(self), "avg_ms": avg_ms}
+
+
+@dataclass
+class RoutingStats:
+    """Steps kept on the fast model, escalations and per-model usage."""
+
+    fast_steps: int = 0
+    escalations: Dict[str, int] = field(default_factory=dict)
+    models: Dict[str, ModelStats] = field(default_factory=dict)
+
+    def add(self, other: "RoutingStats"):
+        self.fast_steps += other.fast_steps
+        for reason, count in other.escalations.items():
+            self.escalations[reason] = self.escalations.get(reason, 0) + count
+        for name, stats in other.models.items():
+            self.models.setdefault(name, ModelStats()).add(stats)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fast_steps": self.fast_steps,
+            "escalated_steps": sum(self.escalations.values()),
+            "escalations": dict(self.escalations),
+            "models": {
+                name: stats.as_dict() for name, stats in self.models.items()
+            },
+        }
+
+
+def _model_name(lm) -> str:
+    return getattr(lm, "model", None) or type(lm).__name__
+
+
+class ModelRouter:
+    """
+    Sends each step to the fast model first and escalates doubtful ones.
+    """
+
+    def __init__(
+        self,
+        fast_lm,
+        verify_finish: bool = True,
+        escalate_on_repeat: bool = True,
+    ):
+        """
+        :param fast_lm: LM for tool-selection steps
+        :param verify_finish: Escalate when the fast model calls finish, so
+            the strong model confirms the task is done
+        :param escalate_on_repeat: Escalate when the fast model repeats the
+            previous step's calls
+        """
+        self.fast = fast_lm
+        self.verify_finish = verify_finish
+        self.escalate_on_repeat = escalate_on_repeat
+        self._lock = threading.Lock()
+        self._totals = RoutingStats()
+
+    def decide(
+        self,
+        predict: Callable[..., Any],
+        stats: RoutingStats,
+        tool_names: Iterable[str],
+        previous_calls: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Get a step's prediction, from the fast model when it is usable.
+
+        :param predict: Runs the step's predictor; accepts lm= to choose
+            the model (the strong model is used without it). With lm= it
+            should raise ContextWindowExceededError rather than truncate
+            the trajectory, so the strong model gets the full prompt first
+        :param stats: Per-run counters to update
+        :param tool_names: Names of the tools the model may call
+        :param previous_calls: Calls of the previous step, as dicts
+        :return: Prediction with next_thought and next_tool_calls
+        """
+        try:
+            pred = self._timed(predict, self.fast, stats)
+        except ContextWindowExceededError:
+            reason = "context_window"
+        except (AdapterParseError, ValueError):
+            reason = "parse_error"
+        else:
+            reason = self.doubt(pred, tool_names, previous_calls)
+            if reason is None:
+                self._count(stats, RoutingStats(fast_steps=1))
+                return pred
+        self._count(stats, RoutingStats(escalations={reason: 1}))
+        return self.strong(predict, stats)
+
+    def strong(self, predict: Callable[..., Any], stats: RoutingStats):
+        """
+        Run a predictor on the strong model (the LM of the dspy context).
+
+        :param predict: Predictor call
+        :param stats: Per-run counters to update
+        :return: The prediction
+        """
+        return self._timed(predict, None, stats)
+
+    def doubt(
+        self,
+        pred,
+        tool_names: Iterable[str],
+        previous_calls: Optional[List[Dict[str, Any]]] = None,
+    ) -> Optional[str]:
+        """
+        Why a fast-model step should be escalated, if it should.
+
+        :return: One of ESCALATION_REASONS, or None to keep the answer
+        """
+        calls = list(pred.next_tool_calls or [])
+        if not calls:
+            return "no_calls"
+        names = set(tool_names)
+        if any(call.name not in names for call in calls):
+            return "unknown_tool"
+        if self.escalate_on_repeat and previous_calls is not None and [
+            call.model_dump() for call in calls
+        ] == previous_calls:
+            return "repeat"
+        if self.verify_finish and any(call.name == "finish" for call in calls):
+            return "finish"
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cumulative counters over every routed call.
+
+        :return: fast_steps, escalated_steps, escalations by reason and
+            calls/seconds/avg_ms/tokens per model
+        """
+        with self._lock:
+            return self._totals.as_dict()
+
+    def _timed(self, predict: Callable[..., Any], lm, stats: RoutingStats):
+        name = _model_name(lm if lm is not None else dspy.settings.lm)
+        kwargs = {"lm": lm} if lm is not None else {}
+        start = time.perf_counter()
+        with track_usage() as tracker:
+            try:
+                return predict(**kwargs)
+            finally:
+                usage = ModelStats(calls=1)
+                usage.seconds = time.perf_counter() - start
+                for entry in tracker.get_total_tokens().values():
+                    usage.prompt_tokens += entry.get("prompt_tokens") or 0
+                    usage.completion_tokens += (
+                        entry.get("completion_tokens") or 0
+                    )
+                self._count(stats, RoutingStats(models={name: usage}))
+
+    def _count(self, stats: RoutingStats, delta: RoutingStats):
+        stats.add(delta)
+        with self._lock:
+            self._totals.add(delta)
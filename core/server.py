@@ -0,0 +1,473 @@
+"""
+Long-lived agent server.
+
+Keeps a pool of warm Agent instances, so config loading and LM client
+setup happen once and all agents share one dspy.LM (and its HTTP
+connection pool) for the life of the process. Requirements are served
+over a small HTTP/1.1 API on asyncio, on a TCP port or a Unix socket:
+
+    POST /run     {"requirement": "...", "workspace": "/abs/path"}
+                  -> NDJSON stream of progress events
+    GET  /health  -> pool and queue status
+
+At most `agents` requirements run at once, each on its own agent. Up to
+`max_queue` more wait for a free agent and are told their queue position;
+further requests are rejected with 503. Progress is the agent's
+Agent.astream() events; a client that disconnects cancels its run.
+
+Requests must carry `Authorization: Bearer <server.token>` when a token is
+configured (it is required to listen on a non-loopback address), and
+requests from browsers (with an Origin header) or POSTs that are not
+JSON are rejected, so a web page cannot drive the agent. Every run's tools
+are confined to its workspace; a request may only name a workspace under
+`workspace_root`, and a fresh workspace is removed when its run ends.
+
+Run with:  python -m core.server [--port 8765 | --unix /tmp/agent.sock]
+"""
+
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+# 请求体上限
+MAX_BODY_BYTES = 1024 * 1024
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+_WORKSPACE_NOTE = (
+    "\n\n工作目录: {workspace}\n"
+    "所有文件操作都在该目录下进行，请使用以它开头的绝对路径。"
+)
+
+
+class HTTPError(Exception):
+    """Rejects a request with an HTTP status and a message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+Request = Tuple[str, str, Dict[str, str], bytes]
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """
+    Read one HTTP/1.1 request.
+
+    :param reader: Connection stream
+    :return: (method, path, headers, body), or None when the client closed
+        the connection
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _head(status: int, content_type: str, extra: str = "") -> bytes:
+    return (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+        f"Content-Type: {content_type}\r\n{extra}\r\n"
+    ).encode("latin-1")
+
+
+async def send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    data: Any,
+    keep_alive: bool = False,
+):
+    """Write a complete JSON response."""
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    connection = "keep-alive" if keep_alive else "close"
+    writer.write(
+        _head(
+            status,
+            "application/json; charset=utf-8",
+            f"Content-Length: {len(body)}\r\nConnection: {connection}\r\n",
+        )
+        + body
+    )
+    await writer.drain()
+
+
+class NDJSONStream:
+    """Chunked response carrying one JSON object per line."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.closed = False
+
+    async def open(self):
+        self.writer.write(
+            _head(
+                200,
+                "application/x-ndjson; charset=utf-8",
+                "Transfer-Encoding: chunked\r\nConnection: close\r\n",
+            )
+        )
+        await self._drain()
+
+    async def send(self, event: Dict[str, Any]):
+        if self.closed:
+            return
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        data = line.encode("utf-8")
+        self.writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await self._drain()
+
+    async def end(self):
+        if self.closed:
+            return
+        self.writer.write(b"0\r\n\r\n")
+        await self._drain()
+
+    async def _drain(self):
+        # 客户端断开后运行照常进行，只是不再发送进度
+        try:
+            await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.closed = True
+
+
+class AgentServer:
+    """
+    Serves requirements on a pool of warm Agent instances.
+    """
+
+    def __init__(self, config_path: Optional[str] = None, config=None):
+        """
+        :param config_path: Optional directory path to check for
+            config.yaml first
+        :param config: Already loaded Config (overrides config_path)
+        """
+        from .config import Config
+
+        self.config = config if config is not None else Config.load(
+            config_path
+        )
+        self.settings = self.config.server
+        self.agents = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._waiting = 0
+        self._running = 0
+        self._served = 0
+
+    def _create_agents(self):
+        """Build the agents, all sharing one LM client."""
+        import dspy
+
+        from .agent import Agent
+
+        count = max(1, self.settings.agents)
+        # Agent.astream 的运行线程受 dspy 的线程上限约束；只在各 Agent
+        # 自己的运行上下文中放宽，不修改进程级的 dspy 设置
+        workers = max(dspy.settings.async_max_workers, count)
+        lm = fast_lm = None
+        for _ in range(count):
+            agent = Agent(
+                config=self.config,
+                lm=lm,
+                fast_lm=fast_lm,
+                async_max_workers=workers,
+            )
+            lm, fast_lm = agent.lm, agent.fast_lm
+            self.agents.append(agent)
+
+    async def start(self) -> asyncio.AbstractServer:
+        """
+        Create the agents and start listening.
+
+        :return: The asyncio server
+        :raises ValueError: A non-loopback address without server.token
+        """
+        if not self.settings.unix_socket and not self.settings.token:
+            if not _is_loopback(self.settings.host):
+                raise ValueError(
+                    f"server.token is required to listen on "
+                    f"{self.settings.host}"
+                )
+        self._create_agents()
+        self._idle = asyncio.Queue()
+        for agent in self.agents:
+            self._idle.put_nowait(agent)
+        if self.settings.unix_socket:
+            return await asyncio.start_unix_server(
+                self._handle, path=self.settings.unix_socket
+            )
+        return await asyncio.start_server(
+            self._handle, self.settings.host, self.settings.port
+        )
+
+    async def serve_forever(self):
+        """Start the server and serve until cancelled."""
+        server = await self.start()
+        where = self.settings.unix_socket or ", ".join(
+            "{}:{}".format(*sock.getsockname()[:2]) for sock in server.sockets
+        )
+        print(f"✅ Agent 服务已启动: {where}（{len(self.agents)} 个 Agent）")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def status(self) -> Dict[str, Any]:
+        """Pool and queue counters."""
+        return {
+            "status": "ok",
+            "agents": len(self.agents),
+            "idle": self._idle.qsize() if self._idle else 0,
+            "running": self._running,
+            "queued": self._waiting,
+            "served": self._served,
+        }
+
+    def close(self):
+        """Release the agents."""
+        for agent in self.agents:
+            agent.close()
+        self.agents = []
+        if self.settings.unix_socket:
+            try:
+                os.unlink(self.settings.unix_socket)
+            except OSError:
+                pass
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is not None:
+                await self._dispatch(writer, *request)
+        except HTTPError as e:
+            await send_json(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await send_json(
+                writer, 500, {"error": f"{type(e).__name__}: {e}"}
+            )
+        finally:
+            writer.close()
+
+    def _check_client(self, method: str, headers: Dict[str, str]):
+        """Reject browsers, non-JSON posts and requests without the token."""
+        if "origin" in headers:
+            # 浏览器的跨站请求总带 Origin；命令行客户端不带
+            raise HTTPError(403, "cross-origin requests are not allowed")
+        token = self.settings.token
+        if token:
+            scheme, _, given = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(
+                given.strip().encode(), token.encode()
+            ):
+                raise HTTPError(401, "missing or wrong bearer token")
+        content_type = headers.get("content-type", "").split(";")[0]
+        if method == "POST" and content_type.strip() != "application/json":
+            raise HTTPError(415, "use Content-Type: application/json")
+
+    async def _dispatch(self, writer, method, path, headers, body):
+        self._check_client(method, headers)
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            await send_json(writer, 200, self.status())
+        elif path == "/run":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            await self._serve_run(writer, body)
+        else:
+            raise HTTPError(404, f"unknown path: {path}")
+
+    def _workspace(self, requested: Optional[str]) -> Tuple[str, bool]:
+        """
+        Resolve the workspace of a request.
+
+        Without a workspace a fresh directory is created (under
+        workspace_root if set). A requested workspace must lie within
+        workspace_root (relative paths are taken relative to it); without
+        a workspace_root only fresh workspaces are served.
+
+        :return: (path, whether it was created for this request)
+        """
+        root = self.settings.workspace_root
+        if not requested:
+            if root:
+                os.makedirs(root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix="run-", dir=root)
+            return os.path.realpath(path), True
+        if not root:
+            raise HTTPError(
+                400, "server.workspace_root is not set; omit 'workspace'"
+            )
+        path = os.path.realpath(os.path.join(root, requested))
+        real_root = os.path.realpath(root)
+        if os.path.commonpath([path, real_root]) != real_root:
+            raise HTTPError(400, f"workspace outside {root}: {requested}")
+        if not os.path.isdir(path):
+            raise HTTPError(400, f"workspace does not exist: {requested}")
+        return path, False
+
+    def _parse_run(self, body: bytes) -> Tuple[str, Optional[str]]:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        requirement = (
+            payload.get("requirement") if isinstance(payload, dict) else None
+        )
+        if not isinstance(requirement, str) or not requirement.strip():
+            raise HTTPError(400, "missing 'requirement'")
+        workspace = payload.get("workspace")
+        if workspace is not None and not isinstance(workspace, str):
+            raise HTTPError(400, "'workspace' must be a string")
+        return requirement, workspace
+
+    async def _serve_run(self, writer, body: bytes):
+        requirement, requested = self._parse_run(body)
+        if self._idle.empty() and self._waiting >= self.settings.max_queue:
+            raise HTTPError(503, "queue is full, try again later")
+        workspace, fresh = self._workspace(requested)
+
+        run_id = uuid.uuid4().hex[:12]
+        stream = NDJSONStream(writer)
+        try:
+            await stream.open()
+            await stream.send(
+                {"event": "accepted", "id": run_id, "workspace": workspace}
+            )
+            await self._run(stream, run_id, requirement, workspace)
+        except Exception as e:
+            # 响应头已经发出：以 error 事件结束流，而不是另发一个响应
+            await stream.send(
+                {
+                    "event": "error",
+                    "id": run_id,
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            )
+        finally:
+            if fresh:
+                shutil.rmtree(workspace, ignore_errors=True)
+        await stream.end()
+
+    async def _run(self, stream, run_id, requirement, workspace):
+        """Wait for a free agent and stream one run's events."""
+        if self._idle.empty():
+            self._waiting += 1
+            await stream.send({"event": "queued", "position": self._waiting})
+            try:
+                agent = await self._idle.get()
+            finally:
+                self._waiting -= 1
+        else:
+            agent = self._idle.get_nowait()
+
+        self._running += 1
+        started = time.perf_counter()
+        events = None
+        try:
+            await stream.send({"event": "started", "id": run_id})
+            text = requirement + _WORKSPACE_NOTE.format(workspace=workspace)
+            events = agent.astream(text, workspace=workspace, confine=True)
+            async for event in events:
+                if event["event"] in ("result", "cancelled", "error"):
+                    event.pop("prediction", None)
+                    event["id"] = run_id
+                    event["elapsed_s"] = round(
+                        time.perf_counter() - started, 3
+                    )
+                await stream.send(event)
+                if stream.closed:
+                    # 客户端已断开，取消运行
+                    break
+        finally:
+            # 等运行真正结束后再归还 Agent
+            if events is not None:
+                await events.aclose()
+            self._running -= 1
+            self._served += 1
+            self._idle.put_nowait(agent)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.server",
+        description="Serve requirements on a pool of warm agents.",
+    )
+    parser.add_argument(
+        "--config", help="directory to check for config.yaml first"
+    )
+    parser.add_argument("--host", help="TCP host (server.host)")
+    parser.add_argument("--port", type=int, help="TCP port (server.port)")
+    parser.add_argument("--unix", help="Unix socket path (server.unix_socket)")
+    parser.add_argument(
+        "--agents", type=int, help="warm agents / concurrency (server.agents)"
+    )
+    args = parser.parse_args(argv)
+
+    server = AgentServer(config_path=args.config)
+    overrides = {
+        "host": args.host,
+        "port": args.port,
+        "unix_socket": args.unix,
+        "agents": args.agents,
+    }
+    for key, value in overrides.items():
+        if value is not None:
+            setattr(server.settings, key, value)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("👋 Agent 服务已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Stub OpenAI-compatible LM endpoint for running the agent and the agent
+server locally without a model provider.
+
+POST /v1/chat/completions answers in DSPy's chat format: the first ReAct
+step lists the workspace named in the requirement (or the current
+directory), the next one finishes, and the extract step returns a fixed
+solution naming the requested model. `delay` simulates model latency so
+that concurrent runs can be observed. Requests with "stream": true get the
+answer as server-sent events, a few characters per chunk. Connections are
+kept alive, like a real provider's.
+
+    python -m core.stub_lm --port 8766 --delay 0.2
+
+Point the agent at it with:
+
+    dspy:
+      model: "openai/stub"
+      api_key: "stub"
+      api_base: "http://127.0.0.1:8766/v1"
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from .server import HTTPError, read_request, send_json
+
+# 解决方案中带上模型名，便于检查每个 Agent 用的是自己的 LM
+STUB_SOLUTION = "Stub solution from {model}."
+
+# 流式响应中每个分片的字符数
+STREAM_CHUNK_CHARS = 8
+
+_WORKSPACE = re.compile(r"工作目录: (\S+)")
+
+
+def _text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = "".join(
+            part.get("text", "") for part in content if isinstance(part, dict)
+        )
+    return content
+
+
+def stub_answer(messages: List[Dict[str, Any]], model: str = "stub") -> str:
+    """
+    Build the reply to a chat request.
+
+    :param messages: OpenAI-style chat messages sent by DSPy
+    :param model: Model name of the request, echoed in the solution
+    :return: Completion text with DSPy field markers
+    """
+    prompt = _text(messages[-1]) if messages else ""
+    if "`[[ ## next_tool_calls ## ]]`" not in prompt:
+        return (
+            "[[ ## reasoning ## ]]\nThe workspace has been inspected.\n\n"
+            f"[[ ## solution ## ]]\n{STUB_SOLUTION.format(model=model)}\n\n"
+            "[[ ## completed ## ]]"
+        )
+    if "[[ ## observation_0" in prompt:
+        thought = "I have looked at the workspace."
+        calls = [{"name": "finish", "args": {}}]
+    else:
+        match = _WORKSPACE.search(prompt)
+        thought = "Look at the workspace first."
+        calls = [
+            {
+                "name": "list_file_tree",
+                "args": {"root_path": match.group(1) if match else "."},
+            }
+        ]
+    return (
+        f"[[ ## next_thought ## ]]\n{thought}\n\n"
+        f"[[ ## next_tool_calls ## ]]\n{json.dumps(calls)}\n\n"
+        "[[ ## completed ## ]]"
+    )
+
+
+class StubLMServer:
+    """
+    Minimal chat completions endpoint with scripted answers.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        """
+        :param delay: Seconds to wait before each answer
+        """
+        self.delay = delay
+        self.requests = 0
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0
+    ) -> asyncio.AbstractServer:
+        """
+        Start listening.
+
+        :param host: Host to bind
+        :param port: Port to bind (0 picks a free port)
+        :return: The asyncio server
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def close(self):
+        """Stop listening and close kept-alive connections."""
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._handlers.add(asyncio.current_task())
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if method != "POST" or not path.endswith("/chat/completions"):
+                    raise HTTPError(404, f"unknown endpoint: {method} {path}")
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    raise HTTPError(400, "body is not valid JSON")
+                response = await self._complete(payload)
+                if payload.get("stream"):
+                    await self._send_events(writer, response)
+                else:
+                    await send_json(writer, 200, response, keep_alive=True)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except HTTPError as e:
+            await send_json(writer, e.status, {"error": {"message": str(e)}})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+
+    async def _complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        messages = payload.get("messages") or []
+        model = payload.get("model", "stub")
+        answer = stub_answer(messages, model)
+        prompt_chars = sum(len(_text(m)) for m in messages)
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = len(answer) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def _send_events(self, writer, response: Dict[str, Any]):
+        """Send a completion as OpenAI-style server-sent events."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+        base = {
+            key: response[key] for key in ("id", "created", "model")
+        }
+        base["object"] = "chat.completion.chunk"
+        text = response["choices"][0]["message"]["content"]
+        chunks = [
+            {
+                **base,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": piece},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            for piece in (
+                text[i:i + STREAM_CHUNK_CHARS]
+                for i in range(0, len(text), STREAM_CHUNK_CHARS)
+            )
+        ]
+        chunks.append(
+            {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": {}, "finish_reason": "stop"}
+                ],
+                "usage": response["usage"],
+            }
+        )
+        lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+        lines.append("data: [DONE]\n\n")
+        for line in lines:
+            data = line.encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.stub_lm",
+        description="Serve a scripted OpenAI-compatible chat endpoint.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="seconds per answer"
+    )
+    args = parser.parse_args(argv)
+
+    async def _serve():
+        server = await StubLMServer(args.delay).start(args.host, args.port)
+        print(
+            f"✅ Stub LM 已启动: http://{args.host}:{args.port}/v1"
+            f"（延迟 {args.delay}s）"
+        )
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        print("👋 Stub LM 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,21 +5,55 @@ All tools are exported here for easy importing.
 使用方式: from core.tool import read_file, list_file_tree, create_path, etc.
 """
 
-from .file_tools import read_file, list_file_tree
-from .search_tools import search_in_files
+from .file_tools import read_file, read_files, list_file_tree
+from .search_tools import (
+    search_in_files,
+    search_matches,
+    iter_search_matches,
+    aiter_search_matches,
+)
+from .symbol_tools import find_symbol, find_references, file_outline
+from .retrieval_tools import retrieve
 from .path_tools import create_path, edit_path
-from .edit_tools import replace_in_file
+from .edit_tools import replace_in_file, apply_patch
 from .web_tools import fetch_website_html, use_search_engine
 from .io_tools import tell_human_something
 
+# 没有副作用的工具：同一步内可以并发执行
+READ_ONLY_TOOLS = frozenset(
+    {
+        "read_file",
+        "read_files",
+        "list_file_tree",
+        "search_in_files",
+        "search_matches",
+        "find_symbol",
+        "find_references",
+        "file_outline",
+        "retrieve",
+        "fetch_website_html",
+        "use_search_engine",
+    }
+)
+
 __all__ = [
     "read_file",
+    "read_files",
     "list_file_tree",
     "search_in_files",
+    "search_matches",
+    "iter_search_matches",
+    "aiter_search_matches",
+    "find_symbol",
+    "find_references",
+    "file_outline",
+    "retrieve",
     "create_path",
     "edit_path",
     "replace_in_file",
+    "apply_patch",
     "fetch_website_html",
     "use_search_engine",
     "tell_human_something",
+    "READ_ONLY_TOOLS",
 ]
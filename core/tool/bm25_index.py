@@ -0,0 +1,303 @@
+"""
+Persistent BM25 index over line chunks of the text files in a workspace.
+
+每个文本文件按固定行数切成若干块（chunk），每块作为一篇文档建立倒排索引。
+分词同时保留完整标识符及其 snake_case/camelCase 拆分结果，中日韩文字按
+二元组切分。索引按 mtime/size 增量更新：文件改动后旧块记为失效，新块追加
+到倒排表，失效条目过多时再整体压缩，与三元组索引的做法一致。
+"""
+
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .index_store import index_file, load_index, save_index
+from .search_index import BINARY_SNIFF_BYTES, decode_text
+
+INDEX_VERSION = 1
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(
+    r"[A-Za-z0-9_]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+"
+)
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_CJK_START = "\u3040"
+
+
+class Chunk(NamedTuple):
+    """一个文档块（行号从 1 开始，包含 end_line）"""
+
+    path: str
+    start_line: int
+    end_line: int
+    length: int  # 词数
+    terms: int  # 不同词的个数（即在倒排表中的条目数）
+
+
+# (mtime_ns, size, 该文件的块 id 列表)
+FileEntry = Tuple[int, int, Tuple[int, ...]]
+
+
+def _split_identifier(word: str) -> List[str]:
+    parts = []
+    for piece in word.split("_"):
+        parts.extend(p.lower() for p in _CAMEL.findall(piece))
+    return parts
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切分为检索词
+
+    英文/代码：小写的完整标识符，再加上按下划线和大小写拆开的各部分
+    （"parseHTTPResponse" -> parsehttpresponse, parse, http, response）；
+    中日韩文字：相邻两字组成的二元组（单字时取单字）。
+
+    :param text: 文本
+    :return: 检索词列表（保留重复）
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        if word[0] >= _CJK_START:
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        lower = word.lower()
+        tokens.append(lower)
+        parts = _split_identifier(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    A per-workspace BM25 index of line chunks, persisted between processes.
+
+    Postings map a term to parallel arrays of chunk ids and term
+    frequencies. Chunks of a changed file are dropped from `chunks` and
+    their postings entries are skipped until the next compaction.
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        chunk_lines: int = 50,
+        max_file_bytes: int = 1024 * 1024,
+        index_dir: Optional[str] = None,
+    ):
+        """
+        :param root_path: 工作区根目录
+        :param chunk_lines: 每块的行数
+        :param max_file_bytes: 超过该大小的文件不建索引
+        :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.chunk_lines = chunk_lines
+        self.max_file_bytes = max_file_bytes
+        self.path = index_file(
+            "bm25-index",
+            self.root_path,
+            str(chunk_lines),
+            str(max_file_bytes),
+            base_dir=index_dir,
+        )
+        self.files: Dict[str, FileEntry] = {}
+        self.chunks: Dict[int, Chunk] = {}
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.next_id = 0
+        self.total_length = 0
+        self.dead_entries = 0
+        self.lock = threading.Lock()
+        self._dirty = False
+
+        data = load_index(self.path)
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            self.files = data["files"]
+            self.chunks = data["chunks"]
+            self.postings = data["postings"]
+            self.next_id = data["next_id"]
+            self.total_length = data["total_length"]
+            self.dead_entries = data["dead_entries"]
+
+    def update(self, entries: Iterable[Tuple[str, os.stat_result]]):
+        """
+        根据本次遍历得到的文件及其 stat 信息增量更新索引
+
+        :param entries: (文件绝对路径, stat 结果) 序列
+        """
+        seen = set()
+        for path, st in entries:
+            seen.add(path)
+            cached = self.files.get(path)
+            if (
+                cached is not None
+                and cached[0] == st.st_mtime_ns
+                and cached[1] == st.st_size
+            ):
+                continue
+            if cached is not None:
+                self._drop(path)
+            self._add(path, st)
+
+        for path in [p for p in self.files if p not in seen]:
+            if not os.path.exists(path):
+                self._drop(path)
+
+        live_entries = sum(chunk.terms for chunk in self.chunks.values())
+        if self.dead_entries > max(live_entries, 100_000):
+            self._compact()
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[float, Chunk]]:
+        """
+        按 BM25 得分返回最相关的块
+
+        :param query: 查询文本
+        :param k: 返回数量
+        :return: (得分, Chunk) 列表，得分从高到低
+        """
+        n_chunks = len(self.chunks)
+        if not n_chunks:
+            return []
+        avg_length = self.total_length / n_chunks or 1.0
+        chunks = self.chunks
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            live = [(i, tf) for i, tf in zip(ids, tfs) if i in chunks]
+            if not live:
+                continue
+            df = len(live)
+            idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in live:
+                norm = BM25_K1 * (
+                    1 - BM25_B + BM25_B * chunks[chunk_id].length / avg_length
+                )
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * (
+                    tf * (BM25_K1 + 1) / (tf + norm)
+                )
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(score, chunks[chunk_id]) for chunk_id, score in best]
+
+    def save(self):
+        """如有改动则写回磁盘"""
+        if self._dirty and save_index(
+            self.path,
+            {
+                "version": INDEX_VERSION,
+                "files": self.files,
+                "chunks": self.chunks,
+                "postings": self.postings,
+                "next_id": self.next_id,
+                "total_length": self.total_length,
+                "dead_entries": self.dead_entries,
+            },
+        ):
+            self._dirty = False
+
+    def _add(self, path: str, st: os.stat_result):
+        ids = []
+        for start, lines in self._read_chunks(path, st):
+            counts = Counter(tokenize("\n".join(lines)))
+            if not counts:
+                continue
+            chunk_id = self.next_id
+            self.next_id += 1
+            length = sum(counts.values())
+            self.chunks[chunk_id] = Chunk(
+                path, start, start + len(lines) - 1, length, len(counts)
+            )
+            self.total_length += length
+            for term, tf in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("I"), array("I"))
+                posting[0].append(chunk_id)
+                posting[1].append(tf)
+            ids.append(chunk_id)
+        self.files[path] = (st.st_mtime_ns, st.st_size, tuple(ids))
+        self._dirty = True
+
+    def _drop(self, path: str):
+        _, _, ids = self.files.pop(path)
+        for chunk_id in ids:
+            chunk = self.chunks.pop(chunk_id)
+            self.total_length -= chunk.length
+            self.dead_entries += chunk.terms
+        self._dirty = True
+
+    def _compact(self):
+        """从倒排表中清除已失效的块"""
+        live = self.chunks
+        postings = {}
+        for term, (ids, tfs) in self.postings.items():
+            kept_ids, kept_tfs = array("I"), array("I")
+            for chunk_id, tf in zip(ids, tfs):
+                if chunk_id in live:
+                    kept_ids.append(chunk_id)
+                    kept_tfs.append(tf)
+            if kept_ids:
+                postings[term] = (kept_ids, kept_tfs)
+        self.postings = postings
+        self.dead_entries = 0
+        self._dirty = True
+
+    def _read_chunks(
+        self, path: str, st: os.stat_result
+    ) -> Iterable[Tuple[int, List[str]]]:
+        if st.st_size > self.max_file_bytes:
+            return []
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return []
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return []
+        lines = decode_text(data).split("\n")
+        return [
+            (i + 1, lines[i:i + self.chunk_lines])
+            for i in range(0, len(lines), self.chunk_lines)
+        ]
+
+
+_open_indexes: Dict[Tuple[str, int, int, Optional[str]], BM25Index] = {}
+_open_lock = threading.Lock()
+
+
+def get_bm25_index(
+    root_path: str,
+    chunk_lines: int = 50,
+    max_file_bytes: int = 1024 * 1024,
+    index_dir: Optional[str] = None,
+) -> BM25Index:
+    """
+    获取（并在进程内复用）某个工作区的 BM25 索引
+
+    :param root_path: 工作区根目录
+    :param chunk_lines: 每块的行数
+    :param max_file_bytes: 超过该大小的文件不建索引
+    :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+    :return: BM25Index 实例
+    """
+    key = (os.path.abspath(root_path), chunk_lines, max_file_bytes, index_dir)
+    with _open_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = BM25Index(
+                root_path, chunk_lines, max_file_bytes, index_dir
+            )
+            _open_indexes[key] = index
+    return index
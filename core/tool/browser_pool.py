@@ -0,0 +1,239 @@
+"""
+Long-lived Playwright browser pool shared by the web tools.
+
+浏览器在首次使用时启动，运行在独立线程的事件循环中，因此无论调用方使用
+哪个事件循环（DSPy 同步调用异步工具时每次都会新建事件循环），都能复用同一个
+浏览器、上下文和页面。并发页面数受信号量限制。
+
+同一进程中的所有 Agent 共用一个浏览器池：Agent 创建时 acquire_browser_pool，
+close 时 release_browser_pool，最后一个使用者释放时才关闭浏览器。
+"""
+
+import asyncio
+import atexit
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, List, Optional
+
+# 关闭浏览器池时最多等待的秒数
+SHUTDOWN_TIMEOUT = 10
+
+
+class BrowserPool:
+    """
+    A lazily started Chromium instance with a bounded set of reusable pages.
+    """
+
+    def __init__(
+        self,
+        headless: bool = True,
+        max_concurrency: int = 4,
+        timeout_ms: int = 30000,
+    ):
+        """
+        :param headless: 是否以无头模式启动浏览器
+        :param max_concurrency: 同时打开的页面数上限
+        :param timeout_ms: 页面操作默认超时（毫秒）
+        """
+        self.headless = headless
+        self.max_concurrency = max_concurrency
+        self.timeout_ms = timeout_ms
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._idle_pages: List[Any] = []
+
+    async def run(self, fn: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        借用一个页面执行 fn(page)，可在任意事件循环中 await
+
+        :param fn: 接收 Playwright Page 的协程函数
+        :return: fn 的返回值
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(fn), self._ensure_loop()
+        )
+        return await asyncio.wrap_future(future)
+
+    def submit(self, fn: Callable[[Any], Awaitable[Any]]):
+        """
+        借用一个页面在后台执行 fn(page)，不等待结果
+
+        :param fn: 接收 Playwright Page 的协程函数
+        :return: concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._run(fn), self._ensure_loop()
+        )
+
+    def close(self):
+        """关闭页面、浏览器和后台事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self._shutdown(), loop
+            ).result(SHUTDOWN_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ 关闭浏览器失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(SHUTDOWN_TIMEOUT)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="browser-pool",
+                    daemon=True,
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _run(self, fn: Callable[[Any], Awaitable[Any]]) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            page = await self._acquire_page()
+            try:
+                result = await fn(page)
+            except BaseException:
+                await page.close()
+                raise
+            self._idle_pages.append(page)
+            return result
+
+    async def _acquire_page(self):
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed():
+                return page
+        context = await self._ensure_context()
+        page = await context.new_page()
+        page.set_default_timeout(self.timeout_ms)
+        return page
+
+    async def _ensure_context(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._context is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(
+                    headless=self.headless
+                )
+                self._context = await self._browser.new_context()
+        return self._context
+
+    async def _shutdown(self):
+        self._idle_pages.clear()
+        if self._context is not None:
+            await self._context.close()
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._context = self._browser = self._playwright = None
+
+
+@dataclass
+class BrowserSettings:
+    """浏览器池的进程级设置；浏览器池被共用，由第一个使用它的 Agent 决定"""
+
+    headless: bool = True
+    max_concurrency: int = 4
+    timeout_ms: int = 30000
+
+
+_settings = BrowserSettings()
+_pool: Optional[BrowserPool] = None
+_users = 0
+_pool_lock = threading.RLock()
+
+
+def configure_browser(**kwargs) -> BrowserSettings:
+    """
+    修改浏览器池设置（已启动的浏览器池会被关闭，下次使用时按新设置启动）
+
+    :param kwargs: BrowserSettings 的字段
+    :return: 更新后的设置
+    """
+    _check_settings(kwargs)
+    with _pool_lock:
+        changed = any(getattr(_settings, k) != v for k, v in kwargs.items())
+        for key, value in kwargs.items():
+            setattr(_settings, key, value)
+        if changed:
+            shutdown_browser_pool()
+    return _settings
+
+
+def _check_settings(kwargs):
+    for key in kwargs:
+        if not hasattr(_settings, key):
+            raise ValueError(f"未知的浏览器设置: {key}")
+
+
+def acquire_browser_pool(**kwargs) -> BrowserSettings:
+    """
+    登记一个浏览器池的使用者（Agent）
+
+    没有其他使用者时按 kwargs 修改设置；否则沿用当前设置，不会关闭其他
+    使用者正在用的浏览器。
+
+    :param kwargs: BrowserSettings 的字段
+    :return: 生效的设置
+    """
+    global _users
+    _check_settings(kwargs)
+    with _pool_lock:
+        if _users == 0:
+            configure_browser(**kwargs)
+        elif any(getattr(_settings, k) != v for k, v in kwargs.items()):
+            print("⚠️ 浏览器池已被其他 Agent 使用，沿用其设置")
+        _users += 1
+        return _settings
+
+
+def release_browser_pool():
+    """注销一个使用者；最后一个使用者注销时关闭浏览器池"""
+    global _users
+    with _pool_lock:
+        _users = max(0, _users - 1)
+        if _users == 0:
+            shutdown_browser_pool()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    获取共享浏览器池（首次调用时创建，浏览器在首次使用时才启动）
+
+    :return: BrowserPool 实例
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(**asdict(_settings))
+        return _pool
+
+
+@atexit.register
+def shutdown_browser_pool():
+    """关闭共享浏览器池"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,299 @@
+"""
+Execution budgets for tool calls: wall-clock timeouts, output caps and
+cooperative cancellation.
+
+run_with_budget 在单独的线程中执行工具，超时或所在运行被取消时立即返回
+结构化错误，不会卡住 Agent 循环；同时设置该次调用的停止标志，耗时较长的
+工具（遍历目录、搜索文件）在处理每个条目时调用 check_cancelled()，尽快
+主动退出。异步工具直接取消其协程。线程无法被强行停止，因此只应给只读工具
+设置超时（BatchReAct 对写工具不设超时）。超出输出上限的结果保留开头和结尾，
+中间替换为截断说明。
+"""
+
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+# 等待工具时检查超时与取消的间隔（秒）
+POLL_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class _CallState:
+    """当前工具调用的停止标志和输出上限"""
+
+    stop: Optional[threading.Event] = None
+    max_chars: Optional[int] = None
+
+
+# 放在上下文变量中：工具用 contextvars.copy_context() 交给工作线程的
+# 任务同样能看到所在调用的停止标志
+_call: contextvars.ContextVar = contextvars.ContextVar(
+    "tool_call", default=_CallState()
+)
+
+
+class ToolCancelled(Exception):
+    """Raised inside a tool whose call timed out or was cancelled."""
+
+
+class ToolBudgetError(Exception):
+    """
+    A tool call that exceeded its budget or was cancelled.
+
+    kind 为 "timeout" 或 "cancelled"。
+    """
+
+    def __init__(self, kind: str, tool: str, message: str, **details):
+        super().__init__(message)
+        self.kind = kind
+        self.tool = tool
+        self.details = details
+
+    def observation(self) -> Dict[str, Any]:
+        """返回给模型的结构化错误"""
+        return {
+            "error": self.kind,
+            "tool": self.tool,
+            **self.details,
+            "message": str(self),
+        }
+
+
+@dataclass
+class ToolLimits:
+    """Budget of one tool call; None means no limit."""
+
+    timeout_s: Optional[float] = None
+    max_output_chars: Optional[int] = None
+
+
+@dataclass
+class ToolBudget:
+    """Default limits plus per-tool overrides."""
+
+    default: ToolLimits = field(default_factory=ToolLimits)
+    per_tool: Dict[str, ToolLimits] = field(default_factory=dict)
+
+    def limits(self, name: str) -> ToolLimits:
+        """
+        某个工具的实际限制：覆盖值为 None 时沿用默认值，为 0 时不限制
+
+        :param name: 工具名
+        :return: 合并后的限制
+        """
+        override = self.per_tool.get(name) or ToolLimits()
+        merged = {}
+        for key in ("timeout_s", "max_output_chars"):
+            value = getattr(override, key)
+            if value is None:
+                value = getattr(self.default, key)
+            merged[key] = value or None
+        return ToolLimits(**merged)
+
+
+def check_cancelled():
+    """
+    在耗时较长的循环中调用：当前工具调用已超时或被取消时抛出 ToolCancelled
+
+    不在 run_with_budget 中执行时（直接调用工具）什么也不做。
+    """
+    stop = _call.get().stop
+    if stop is not None and stop.is_set():
+        raise ToolCancelled("工具调用已超时或被取消")
+
+
+def output_limit() -> Optional[int]:
+    """
+    当前工具调用的输出字符上限；工具可据此只生成放得下的内容，
+    而不是生成之后再被从中间截断
+
+    不在 run_with_budget 中执行时返回 None。
+    """
+    return _call.get().max_chars
+
+
+def _timeout_error(name: str, timeout: float) -> ToolBudgetError:
+    return ToolBudgetError(
+        "timeout",
+        name,
+        f"{name} did not finish within {timeout:g}s and was stopped. "
+        f"Narrow the request (e.g. a subdirectory, a more specific "
+        f"pattern or a line range) and try again.",
+        timeout_s=timeout,
+    )
+
+
+def _cancelled_error(name: str) -> ToolBudgetError:
+    return ToolBudgetError("cancelled", name, f"{name} was cancelled.")
+
+
+def _run_sync(
+    fn: Callable[[], Any],
+    name: str,
+    limits: ToolLimits,
+    cancel: Optional[threading.Event],
+) -> Any:
+    timeout = limits.timeout_s
+    stop = threading.Event()
+    if timeout is None:
+        # 没有超时限制时直接在当前线程执行，只转发取消标志
+        token = _call.set(_CallState(cancel, limits.max_output_chars))
+        try:
+            return fn()
+        except ToolCancelled:
+            raise _cancelled_error(name)
+        finally:
+            _call.reset(token)
+
+    outcome: Dict[str, Any] = {}
+
+    def _target():
+        _call.set(_CallState(stop, limits.max_output_chars))
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    # 在调用方上下文的副本中执行，工具读取调用方（Agent）的设置
+    thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_target,),
+        name=f"tool-{name}",
+        daemon=True,
+    )
+    deadline = time.monotonic() + timeout
+    thread.start()
+    while True:
+        remaining = deadline - time.monotonic()
+        thread.join(max(0.0, min(POLL_INTERVAL, remaining)))
+        if not thread.is_alive():
+            break
+        if cancel is not None and cancel.is_set():
+            stop.set()
+            raise _cancelled_error(name)
+        if time.monotonic() >= deadline:
+            stop.set()
+            raise _timeout_error(name, timeout)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+async def _run_async(
+    fn: Callable[[], Any],
+    name: str,
+    timeout: Optional[float],
+    cancel: Optional[threading.Event],
+) -> Any:
+    task = asyncio.ensure_future(fn())
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        wait = POLL_INTERVAL if cancel is not None else None
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+            wait = remaining if wait is None else min(wait, remaining)
+        done, _ = await asyncio.wait({task}, timeout=wait)
+        if done:
+            return task.result()
+        if cancel is not None and cancel.is_set():
+            error = _cancelled_error(name)
+        elif deadline is not None and time.monotonic() >= deadline:
+            error = _timeout_error(name, timeout)
+        else:
+            continue
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise error
+
+
+def truncate_output(value: Any, max_chars: Optional[int]) -> Any:
+    """
+    把工具结果限制在 max_chars 个字符以内，并附上截断说明
+
+    开头和结尾各保留一半（错误信息、汇总行常在结尾）：字符串截去中间部分；
+    列表保留能放下的开头和结尾若干项；其他对象按 JSON 文本截断。
+
+    :param value: 工具结果
+    :param max_chars: 字符上限（None 表示不限制）
+    :return: 原结果或截断后的结果
+    """
+    if not max_chars or value is None:
+        return value
+    if isinstance(value, list):
+        sizes = [len(str(item)) + 2 for item in value]
+        if sum(sizes) <= max_chars:
+            return value
+        head = _fit(sizes, max_chars // 2)
+        tail = _fit(sizes[head:][::-1], max_chars - sum(sizes[:head]))
+        omitted = len(value) - head - tail
+        return (
+            value[:head]
+            + [
+                f"...[truncated: {omitted} of {len(value)} items in the "
+                f"middle not shown. Narrow the request to see them.]"
+            ]
+            + value[len(value) - tail:]
+        )
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, dict):
+        text = json.dumps(value, ensure_ascii=False, default=str)
+    else:
+        text = str(value)
+    if len(text) <= max_chars:
+        return value
+    head = max_chars // 2
+    tail = max_chars - head
+    return (
+        f"{text[:head]}\n...[truncated: {len(text) - max_chars} of "
+        f"{len(text)} chars omitted from the middle. Narrow the request "
+        f"(e.g. start_line/end_line, a subdirectory or a more specific "
+        f"pattern) to see them.]...\n{text[len(text) - tail:]}"
+    )
+
+
+def _fit(sizes, budget: int) -> int:
+    """从头开始能放进 budget 的项数"""
+    count = used = 0
+    for size in sizes:
+        used += size
+        if used > budget:
+            break
+        count += 1
+    return count
+
+
+def run_with_budget(
+    fn: Callable[[], Any],
+    name: str,
+    limits: ToolLimits,
+    cancel: Optional[threading.Event] = None,
+    is_async: bool = False,
+) -> Any:
+    """
+    在预算内执行一次工具调用
+
+    :param fn: 无参调用（异步工具传返回协程的函数）
+    :param name: 工具名（用于错误信息）
+    :param limits: 超时与输出上限
+    :param cancel: 所在运行的取消标志，被设置时停止等待
+    :param is_async: fn 是否返回协程
+    :return: 工具结果（超出上限时已截断）
+    :raises ToolBudgetError: 超时或被取消
+    """
+    if is_async:
+        token = _call.set(_CallState(cancel, limits.max_output_chars))
+        try:
+            result = asyncio.run(
+                _run_async(fn, name, limits.timeout_s, cancel)
+            )
+        finally:
+            _call.reset(token)
+    else:
+        result = _run_sync(fn, name, limits, cancel)
+    return truncate_output(result, limits.max_output_chars)
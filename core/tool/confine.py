@@ -0,0 +1,119 @@
+"""
+Confinement of tool calls to a workspace directory.
+
+服务端替不受信任的请求运行 Agent 时，工具只能访问该请求的工作目录：
+confine_tools(root) 在当前上下文中设置允许的根目录（与工具设置一样随
+contextvars 传给工具线程），BatchReAct 在执行每个调用之前用 check_call
+检查其读写的路径（见 memo.read_paths / memo.written_paths）。路径会解析
+符号链接；无法确定路径的调用一律拒绝。
+
+调用的相对路径参数先由 anchor_args 按允许的根目录（而不是进程的当前目录）
+解析；遍历工作区的工具用 escapes_root 跳过指向根目录之外的符号链接。
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .memo import read_paths, written_paths
+
+# 相对路径按工作目录解析的参数
+_PATH_ARGS = frozenset(
+    {"file_path", "root_path", "path", "base_path", "base_dir"}
+)
+
+_root: contextvars.ContextVar = contextvars.ContextVar(
+    "confine_root", default=None
+)
+
+
+@contextmanager
+def confine_tools(root: Optional[str]) -> Iterator[None]:
+    """
+    在当前上下文中把工具调用限制在 root 之内，退出时恢复
+
+    :param root: 允许访问的目录；None 表示不限制
+    """
+    token = _root.set(os.path.realpath(root) if root else None)
+    try:
+        yield
+    finally:
+        _root.reset(token)
+
+
+def confined_root() -> Optional[str]:
+    """当前上下文允许访问的目录（已解析符号链接）；不限制时为 None"""
+    return _root.get()
+
+
+def anchor_args(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把调用中的相对路径参数解析到允许的目录下
+
+    :param name: 工具名
+    :param args: 调用参数（不会被修改）
+    :return: 路径参数均为绝对路径的参数；不限制时原样返回 args
+    """
+    root = _root.get()
+    if root is None:
+        return args
+
+    def _anchor(value: Any) -> Any:
+        if isinstance(value, str) and value and not os.path.isabs(value):
+            return os.path.join(root, value)
+        return value
+
+    anchored = {
+        key: _anchor(value) if key in _PATH_ARGS else value
+        for key, value in args.items()
+    }
+    if name == "read_files" and isinstance(args.get("files"), list):
+        anchored["files"] = [
+            {**item, "file_path": _anchor(item.get("file_path"))}
+            if isinstance(item, dict)
+            else _anchor(item)
+            for item in args["files"]
+        ]
+    if name == "apply_patch" and not anchored.get("base_dir"):
+        # 补丁和 edits 中的路径相对于 base_dir
+        anchored["base_dir"] = root
+    return anchored
+
+
+def escapes_root(path: str) -> bool:
+    """
+    遍历到的条目是否为指向允许目录之外的符号链接
+
+    遍历工具与 os.walk 一样不进入符号链接目录，因此只需检查条目本身
+
+    :param path: 遍历到的文件或目录路径
+    :return: 限制生效且该文件解析后不在允许目录内时为 True
+    """
+    root = _root.get()
+    if root is None or not os.path.islink(path):
+        return False
+    return os.path.commonpath([os.path.realpath(path), root]) != root
+
+
+def check_call(
+    name: str, args: Dict[str, Any], read_only: bool
+) -> Optional[str]:
+    """
+    检查一次调用是否只访问允许的目录
+
+    :param name: 工具名
+    :param args: 调用参数
+    :param read_only: 是否为只读工具
+    :return: 拒绝原因；允许时返回 None
+    """
+    root = _root.get()
+    if root is None:
+        return None
+    paths = read_paths(name, args) if read_only else written_paths(name, args)
+    if paths is None:
+        return f"{name} 的访问路径无法确定，工具只能在 {root} 内使用"
+    for path in paths:
+        if os.path.commonpath([path, root]) != root:
+            return f"{path} 不在工作目录 {root} 内"
+    return None
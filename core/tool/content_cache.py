@@ -0,0 +1,218 @@
+"""
+Process-wide file content cache shared by the file tools.
+
+读工具（read_file、search_in_files、replace_in_file 等）通过 content_cache 读取
+文件字节；条目按路径存放并用 mtime/size/inode 校验，文件在外部被修改后会
+自动失效。写工具写入后调用 store/invalidate 保持缓存与磁盘一致。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 默认缓存总大小上限
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# (mtime_ns, size, inode, 内容)
+_Entry = Tuple[int, int, int, bytes]
+
+
+def _signature(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ContentCache:
+    """
+    A thread-safe LRU cache of file bytes bounded by total size.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param max_bytes: 缓存内容总字节数上限
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, size: int) -> bool:
+        """单个文件不超过总上限的 1/4 才放入缓存"""
+        return size <= self.max_bytes // 4
+
+    def read_bytes(self, path: str) -> bytes:
+        """
+        读取文件全部字节，命中时直接返回缓存内容
+
+        :param path: 文件路径
+        :return: 文件内容
+        :raises OSError: 文件无法读取时
+        """
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        signature = _signature(st)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[:3] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+            self.misses += 1
+
+        with open(key, "rb") as f:
+            data = f.read()
+        if len(data) == st.st_size:
+            self._put(key, signature, data)
+        return data
+
+    def store(self, path: str, data: bytes):
+        """
+        写工具写入文件后调用：用刚写入的内容更新缓存
+
+        :param path: 文件路径
+        :param data: 写入的字节（与磁盘大小不一致时改为失效处理）
+        """
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            self.invalidate(key)
+            return
+        if st.st_size != len(data):
+            self.invalidate(key)
+            return
+        self._put(key, _signature(st), data)
+
+    def invalidate(self, path: str):
+        """
+        使某个文件（或目录下所有文件）的缓存失效
+
+        :param path: 文件或目录路径
+        """
+        key = os.path.abspath(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self._lock:
+            for cached in [
+                p for p in self._entries if p == key or p.startswith(prefix)
+            ]:
+                self._bytes -= len(self._entries.pop(cached)[3])
+
+    def resize(self, max_bytes: int):
+        """
+        修改大小上限；缩小时按最久未使用的顺序淘汰，不清空其余条目
+
+        :param max_bytes: 缓存内容总字节数上限
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if not self.cacheable(len(entry[3]))
+            ]:
+                self._bytes -= len(self._entries.pop(key)[3])
+                self.evictions += 1
+            self._evict()
+
+    def clear(self):
+        """清空缓存（保留计数器）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回命中/未命中/淘汰计数及当前占用，用于调整缓存大小
+
+        :return: 统计信息字典
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _put(self, key: str, signature: Tuple[int, int, int], data: bytes):
+        if not self.cacheable(len(data)):
+            self.invalidate(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[3])
+            self._entries[key] = signature + (data,)
+            self._bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到不超过上限（调用方持有锁）"""
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted[3])
+            self.evictions += 1
+
+
+content_cache = ContentCache()
+
+# 当前各使用者（Agent）要求的缓存上限
+_requested: List[int] = []
+_requested_lock = threading.Lock()
+
+
+def configure_cache(max_bytes: Optional[int] = None) -> ContentCache:
+    """
+    修改共享内容缓存的大小上限
+
+    缓存由进程中所有 Agent 共用（条目按 mtime/size/inode 校验，共用是安全的），
+    因此只按新上限淘汰旧条目，不会清空其他 Agent 正在使用的缓存。
+
+    :param max_bytes: 缓存内容总字节数上限
+    :return: 共享的 ContentCache 实例
+    """
+    if max_bytes is not None and max_bytes != content_cache.max_bytes:
+        content_cache.resize(max_bytes)
+    return content_cache
+
+
+def acquire_cache(max_bytes: int) -> ContentCache:
+    """
+    登记一个共享内容缓存的使用者（Agent）
+
+    缓存上限取所有使用者要求的最大值，因此新使用者只会扩大缓存，
+    不会缩小其他 Agent 正在使用的缓存。
+
+    :param max_bytes: 该使用者要求的缓存上限
+    :return: 共享的 ContentCache 实例
+    """
+    with _requested_lock:
+        _requested.append(max_bytes)
+        return configure_cache(max(_requested))
+
+
+def release_cache(max_bytes: int):
+    """
+    注销一个使用者；上限回落到其余使用者要求的最大值
+
+    :param max_bytes: 该使用者登记时要求的缓存上限
+    """
+    with _requested_lock:
+        if max_bytes in _requested:
+            _requested.remove(max_bytes)
+        if _requested:
+            configure_cache(max(_requested))
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """
+    返回共享内容缓存的统计信息
+
+    :return: hits/misses/evictions/entries/bytes/max_bytes
+    """
+    return content_cache.stats()
@@ -0,0 +1,187 @@
+"""
+Small disk-backed key/value cache with size-based eviction.
+
+每个条目是目录下的一个 JSON 文件（文件名为键的 sha256），读取命中时更新
+文件 mtime，超出大小上限时按 mtime 从旧到新淘汰。总大小首次使用时扫描一次
+目录得到，之后随写入和删除累加，只有超出上限时才重新扫描。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class DiskCache:
+    """
+    A JSON-file-per-entry cache bounded by total size on disk.
+
+    Thread-safe; several processes may share a directory, in which case the
+    running size total is re-synchronised whenever eviction scans it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        :param directory: 缓存目录
+        :param max_bytes: 缓存文件总大小上限
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 条目总大小和数量；None 表示尚未扫描目录
+        self._bytes: Optional[int] = None
+        self._count = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        读取条目
+
+        :param key: 键
+        :return: (值, 写入时间戳)，不存在时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            entry = None
+        hit = entry is not None and entry.get("key") == key
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not hit:
+            return None
+        return entry["value"], entry["created_at"]
+
+    def set(self, key: str, value: Any):
+        """
+        写入条目（原子替换），必要时淘汰最久未使用的条目
+
+        :param key: 键
+        :param value: 可 JSON 序列化的值
+        """
+        data = json.dumps(
+            {"key": key, "created_at": time.time(), "value": value},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            self._load_totals()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.directory, suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                replaced = _size(path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"⚠️ 写入缓存失败: {e}")
+            return
+        with self._lock:
+            if replaced is None:
+                self._count += 1
+                self._bytes += len(data)
+            else:
+                self._bytes += len(data) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        """删除条目"""
+        path = self._path(key)
+        with self._lock:
+            self._load_totals()
+            size = _size(path)
+            try:
+                os.unlink(path)
+            except OSError:
+                return
+            if size is not None:
+                self._count -= 1
+                self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回命中/未命中/淘汰计数及当前占用
+
+        :return: 统计信息字典
+        """
+        with self._lock:
+            self._load_totals()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._count,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_size, st.st_mtime
+        except OSError:
+            return
+
+    def _load_totals(self):
+        """首次使用时扫描目录得到总大小（调用方持有锁）"""
+        if self._bytes is None:
+            entries = list(self._entries())
+            self._bytes = sum(size for _, size, _ in entries)
+            self._count = len(entries)
+
+    def _evict(self):
+        """扫描目录并淘汰最旧的条目直到不超过上限（调用方持有锁）"""
+        entries = list(self._entries())
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        if total > self.max_bytes:
+            for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                self.evictions += 1
+                total -= size
+                count -= 1
+                if total <= self.max_bytes:
+                    break
+        self._bytes = total
+        self._count = count
+
+
+def _size(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
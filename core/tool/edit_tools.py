@@ -3,6 +3,16 @@ File editing tools for mini-code-agent.
 """
 
 import re
+from typing import Any, Dict, List, Optional
+
+from .content_cache import content_cache
+from .patching import (
+    EditTransaction,
+    PatchError,
+    parse_unified_diff,
+    write_atomic,
+)
+from .search_index import decode_text, notify_changed
 
 
 def replace_in_file(
@@ -27,16 +37,17 @@ def replace_in_file(
         return False
 
     try:
-        with open(file_path, "r", encoding=encoding, errors="ignore") as f:
-            content = f.read()
+        content = decode_text(content_cache.read_bytes(file_path), encoding)
 
         new_content, count = re.subn(pattern, replacement, content)
         if count == 0:
             print(f"⚠️ 未匹配到任何内容: {pattern}")
             return False
 
-        with open(file_path, "w", encoding=encoding) as f:
-            f.write(new_content)
+        data = new_content.encode(encoding)
+        write_atomic(file_path, data)
+        content_cache.store(file_path, data)
+        notify_changed(file_path)
 
         print(f"✅ 替换完成: {file_path}，共替换 {count} 处")
         return True
@@ -44,3 +55,59 @@ def replace_in_file(
     except Exception as e:
         print(f"❌ 替换失败: {e}")
         return False
+
+
+def apply_patch(
+    patch: Optional[str] = None,
+    edits: Optional[List[Dict[str, Any]]] = None,
+    base_dir: Optional[str] = None,
+) -> str:
+    """
+    一次调用修改多个文件：应用 unified diff，和/或一组精确的查找替换。
+    修改大文件时只需给出改动的部分，不必重发整个文件。
+    所有修改先全部校验，任何一处不匹配都不会改动任何文件；写入是原子的
+    （临时文件 + 重命名），中途失败会回滚已写入的文件
+
+    :param patch: unified diff 文本（diff -u / git diff 格式，可包含多个文件，
+        支持新建 --- /dev/null 和删除 +++ /dev/null）；@@ 行号不准时按上下文定位
+    :param edits: 查找替换列表，每项为 {"file_path": 路径, "search": 原文,
+        "replace": 新文本}，search 须与文件内容逐字一致且只出现一次
+        （可加 "replace_all": true 替换全部）；search 为空表示新建文件。
+        同一文件的多项按顺序应用，在 patch 之后执行
+    :param base_dir: 相对路径的基准目录（默认当前目录）
+    :return: 每个文件的修改摘要，失败时为错误说明（此时没有修改任何文件）
+    """
+    if not patch and not edits:
+        return "❌ 需要提供 patch 或 edits"
+
+    transaction = EditTransaction(base_dir)
+    try:
+        if patch:
+            for file_patch in parse_unified_diff(patch):
+                transaction.apply_file_patch(file_patch)
+        for number, edit in enumerate(edits or [], 1):
+            if not isinstance(edit, dict) or "file_path" not in edit:
+                transaction.errors.append(
+                    f"edits 第 {number} 项缺少 file_path: {edit!r}"
+                )
+                continue
+            transaction.replace(
+                edit["file_path"],
+                edit.get("search") or "",
+                edit.get("replace") or "",
+                bool(edit.get("replace_all", False)),
+            )
+        changes = transaction.commit()
+    except PatchError as e:
+        print(f"❌ 补丁未应用: {str(e).splitlines()[0]}")
+        return f"❌ 补丁未应用，没有修改任何文件:\n{e}"
+
+    if not changes:
+        return "⚠️ 补丁没有改变任何文件内容"
+    added = sum(change[2] for change in changes)
+    removed = sum(change[3] for change in changes)
+    lines = [f"✅ 已修改 {len(changes)} 个文件 (+{added} -{removed})"]
+    for status, path, file_added, file_removed in changes:
+        lines.append(f"  {status} {path} (+{file_added} -{file_removed})")
+    print(lines[0])
+    return "\n".join(lines)
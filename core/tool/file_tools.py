@@ -2,20 +2,333 @@
 File operation tools for mini-code-agent.
 """
 
+import contextvars
+import io
+import math
+import mmap
 import os
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+from .budget import check_cancelled, output_limit
+from .confine import escapes_root
+from .content_cache import content_cache
+from .search_index import decode_text
+from .settings import ScopedSettings
 
-def read_file(file_path: str, encoding: str = "utf-8") -> str:
+
+@dataclass
+class FileSettings:
+    """文件工具的设置；Agent 运行时使用根据 Config 生成的副本（见 settings.py）"""
+
+    read_max_bytes: Optional[int] = None
+    mmap_threshold: int = 8 * 1024 * 1024
+    read_workers: int = 8
+
+
+_settings = ScopedSettings("files", "文件工具", FileSettings())
+_pools: Dict[int, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+# path -> (mtime_ns, size, 每行起始字节偏移)；与 decode_text 一致，
+# \n、\r\n 和单独的 \r 都是换行
+_line_index: "OrderedDict[str, Tuple[int, int, array]]" = OrderedDict()
+_line_index_lock = threading.Lock()
+_LINE_INDEX_ENTRIES = 64
+_INDEX_CHUNK = 1024 * 1024
+_LINE_BREAK = re.compile(rb"\r\n?|\n")
+
+# 受工具输出上限约束时，为摘要、分段标题和截断标记预留的字符数
+_SUMMARY_RESERVE = 400
+_PART_RESERVE = 200
+
+
+def configure_files(**kwargs) -> FileSettings:
+    """
+    修改文件工具的进程级默认设置
+
+    :param kwargs: FileSettings 的字段
+    :return: 更新后的默认设置
+    """
+    return _settings.configure(**kwargs)
+
+
+def _line_offsets(path: str, st: os.stat_result) -> array:
+    """返回文件每行起始字节偏移（按 mtime/size 缓存）"""
+    with _line_index_lock:
+        cached = _line_index.get(path)
+        if cached and (cached[0], cached[1]) == (st.st_mtime_ns, st.st_size):
+            _line_index.move_to_end(path)
+            return cached[2]
+
+    offsets = array("Q", [0])
+    if _use_cache(st.st_size):
+        chunks = iter([content_cache.read_bytes(path)])
+        f = None
+    else:
+        f = open(path, "rb")
+        chunks = iter(lambda: f.read(_INDEX_CHUNK), b"")
+    try:
+        base = 0
+        pending_cr = False  # 上一块以 \r 结尾
+        for chunk in chunks:
+            start = 0
+            if pending_cr:
+                # 上一块末尾的 \r 与本块开头的 \n 组成一个 \r\n
+                start = 1 if chunk.startswith(b"\n") else 0
+                offsets.append(base + start)
+            pending_cr = chunk.endswith(b"\r")
+            end = len(chunk) - 1 if pending_cr else len(chunk)
+            if b"\r" in chunk:
+                for match in _LINE_BREAK.finditer(chunk, start, end):
+                    offsets.append(base + match.end())
+            else:
+                idx = chunk.find(b"\n", start)
+                while idx != -1:
+                    offsets.append(base + idx + 1)
+                    idx = chunk.find(b"\n", idx + 1)
+            base += len(chunk)
+        if pending_cr:
+            offsets.append(base)
+    finally:
+        if f is not None:
+            f.close()
+
+    with _line_index_lock:
+        _line_index[path] = (st.st_mtime_ns, st.st_size, offsets)
+        while len(_line_index) > _LINE_INDEX_ENTRIES:
+            _line_index.popitem(last=False)
+    return offsets
+
+
+def _use_cache(size: int) -> bool:
+    return size < _settings.mmap_threshold and content_cache.cacheable(size)
+
+
+class _FileSpan:
+    """按字节区间读取文件：小文件走共享内容缓存，大文件通过 mmap 提供"""
+
+    def __init__(self, path: str, size: int):
+        self._data = None
+        self._file = None
+        self._mmap = None
+        if _use_cache(size):
+            self._data = content_cache.read_bytes(path)
+            return
+        self._file = open(path, "rb")
+        if size >= _settings.mmap_threshold:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+    def read(self, start: int, end: int) -> bytes:
+        if self._data is not None:
+            return self._data[start:end]
+        if self._mmap is not None:
+            return self._mmap[start:end]
+        self._file.seek(start)
+        return self._file.read(end - start)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _line_range(
+    offsets: array,
+    size: int,
+    start_line: Optional[int],
+    end_line: Optional[int],
+) -> Optional[Tuple[int, int, int, int]]:
     """
-    读取指定路径文件内容并返回字符串
+    把行范围换算为字节区间
+
+    :return: (首行, 末行, 起始字节, 结束字节)，范围为空时返回 None
+    """
+    line_count = len(offsets) - (1 if offsets[-1] == size else 0)
+    first = max(start_line or 1, 1)
+    last = min(end_line or line_count, line_count)
+    if first > last:
+        return None
+    end = offsets[last] if last < len(offsets) else size
+    return first, last, offsets[first - 1], end
+
+
+def _read_budget(max_bytes: Optional[int], reserve: int) -> Optional[int]:
+    """
+    读取预算：max_bytes（默认取配置）与当前工具调用输出上限中较小的一个，
+    这样返回的摘录不会再被工具预算从中间截断
+
+    :param max_bytes: 调用方指定的字节数
+    :param reserve: 输出中除文件内容外的部分预留的字符数
+    :return: 字节预算；不限制时为 None
+    :raises ValueError: max_bytes 不是非负整数
+    """
+    if max_bytes is not None:
+        try:
+            number = int(max_bytes)
+        except (TypeError, ValueError):
+            raise ValueError(f"max_bytes 必须是整数: {max_bytes!r}")
+        if isinstance(max_bytes, float) and number != max_bytes or number < 0:
+            raise ValueError(f"max_bytes 必须是非负整数: {max_bytes!r}")
+        max_bytes = number
+    budget = max_bytes if max_bytes is not None else _settings.read_max_bytes
+    limit = output_limit()
+    if limit is not None:
+        # UTF-8 解码后的字符数不超过字节数，按字节计算不会超出上限
+        limit = max(limit - reserve, limit // 2)
+        budget = limit if budget is None else min(budget, limit)
+    return budget
+
+
+def _check_line_range(
+    start_line: Any, end_line: Any
+) -> Tuple[int, Optional[int]]:
+    """
+    校验行范围参数
+
+    :return: (起始行, 结束行)，结束行为 None 表示到文件末尾
+    :raises ValueError: 行号不是正整数，或结束行小于起始行
+    """
+    values = []
+    for name, value in (("start_line", start_line), ("end_line", end_line)):
+        if value is None:
+            values.append(None)
+            continue
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} 必须是整数: {value!r}")
+        if isinstance(value, float) and number != value or number < 1:
+            raise ValueError(f"{name} 必须是从 1 开始的行号: {value!r}")
+        values.append(number)
+    first, last = values
+    first = first or 1
+    if last is not None and last < first:
+        raise ValueError(f"end_line ({last}) 小于 start_line ({first})")
+    return first, last
+
+
+def _excerpt(
+    span: _FileSpan,
+    start: int,
+    end: int,
+    budget: int,
+    encoding: str,
+    offsets: Optional[array] = None,
+) -> str:
+    """读取 [start, end) 区间，超出预算时只保留开头和结尾并插入截断标记"""
+    if end - start <= budget:
+        return decode_text(span.read(start, end), encoding)
+
+    head = span.read(start, start + budget // 2)
+    cut = max(head.rfind(b"\n"), head.rfind(b"\r"))
+    if cut > 0:
+        head = head[:cut + 1]
+    tail = span.read(end - (budget - len(head)), end)
+    match = _LINE_BREAK.search(tail)
+    if match is not None and match.end() < len(tail):
+        tail = tail[match.end():]
+
+    omit_start = start + len(head)
+    omit_end = end - len(tail)
+    where = f"字节 {omit_start}-{omit_end}"
+    if offsets is not None:
+        first = bisect_right(offsets, omit_start)
+        last = bisect_right(offsets, max(omit_start, omit_end - 1))
+        where = f"第 {first}-{last} 行"
+    marker = (
+        f"... [已截断 {omit_end - omit_start} 字节（{where}），"
+        f"可用 start_line/end_line 或 start_byte/end_byte 分段读取] ...\n"
+    )
+    if not head.endswith((b"\n", b"\r")):
+        marker = "\n" + marker
+    return decode_text(head, encoding) + marker + decode_text(tail, encoding)
+
+
+def read_file(
+    file_path: str,
+    encoding: str = "utf-8",
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    start_byte: Optional[int] = None,
+    end_byte: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> str:
+    """
+    读取指定路径文件内容并返回字符串，支持按行或按字节范围读取
+    内容超过 max_bytes 时只返回开头和结尾，中间插入截断标记
 
     :param file_path: 文件路径 入参格式 r"path"
     :param encoding: 文件编码（默认 utf-8）
+    :param start_line: 起始行号（从 1 开始，包含）
+    :param end_line: 结束行号（包含）
+    :param start_byte: 起始字节偏移（从 0 开始，包含）
+    :param end_byte: 结束字节偏移（不包含）
+    :param max_bytes: 最多返回的字节数（默认取配置，不限制则为 None；
+        不超过工具输出上限）
     :return: 文件内容字符串
     """
+    by_line = start_line is not None or end_line is not None
+    by_byte = start_byte is not None or end_byte is not None
+    if by_line and by_byte:
+        print("❌ 不能同时指定行范围和字节范围")
+        return ""
+    if by_line:
+        try:
+            start_line, end_line = _check_line_range(start_line, end_line)
+        except ValueError as e:
+            print(f"❌ 无效的行范围: {e}")
+            return ""
+    try:
+        budget = _read_budget(max_bytes, _PART_RESERVE)
+    except ValueError as e:
+        print(f"❌ 无效的读取上限: {e}")
+        return ""
+
     try:
-        with open(file_path, "r", encoding=encoding) as f:
-            return f.read()
+        st = os.stat(file_path)
+        size = st.st_size
+        if not by_line and not by_byte and (budget is None or size <= budget):
+            if content_cache.cacheable(size):
+                data = content_cache.read_bytes(file_path)
+                with io.TextIOWrapper(
+                    io.BytesIO(data), encoding=encoding
+                ) as f:
+                    return f.read()
+            with open(file_path, "r", encoding=encoding) as f:
+                return f.read()
+
+        offsets = None
+        if by_line:
+            offsets = _line_offsets(file_path, st)
+            span_range = _line_range(offsets, size, start_line, end_line)
+            if span_range is None:
+                return ""
+            start, end = span_range[2:]
+        else:
+            start = max(start_byte or 0, 0)
+            end = min(end_byte if end_byte is not None else size, size)
+            if start >= end:
+                return ""
+
+        span = _FileSpan(file_path, size)
+        try:
+            if budget is None:
+                return decode_text(span.read(start, end), encoding)
+            if offsets is None and end - start > budget:
+                offsets = _line_offsets(file_path, st)
+            return _excerpt(span, start, end, budget, encoding, offsets)
+        finally:
+            span.close()
     except FileNotFoundError:
         print(f"❌ 文件未找到: {file_path}")
     except PermissionError:
@@ -25,10 +338,299 @@ def read_file(file_path: str, encoding: str = "utf-8") -> str:
     return ""
 
 
+def _get_pool(workers: int) -> ThreadPoolExecutor:
+    """获取（并复用）指定线程数的读取线程池"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="read-files"
+            )
+            _pools[workers] = pool
+        return pool
+
+
+def _map(fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+    """
+    在读取线程池中并发执行，按输入顺序返回结果；
+    每个线程处理连续的一批，避免为每个文件提交一个任务的开销
+    """
+    workers = min(_settings.read_workers, len(items))
+    if workers <= 1:
+        results = []
+        for item in items:
+            check_cancelled()
+            results.append(fn(item))
+        return results
+    step = -(-len(items) // workers)
+    pool = _get_pool(_settings.read_workers)
+
+    def _batch(batch: List[Any]) -> List[Any]:
+        results = []
+        for item in batch:
+            check_cancelled()
+            results.append(fn(item))
+        return results
+
+    # 每批在调用方上下文的副本中执行，使用调用方（Agent）的工具设置，
+    # 并能看到所在调用的停止标志，超时或取消后不再读取剩余的文件
+    futures = [
+        pool.submit(contextvars.copy_context().run, _batch, items[i:i + step])
+        for i in range(0, len(items), step)
+    ]
+    try:
+        results = []
+        for future in futures:
+            check_cancelled()
+            results.extend(future.result())
+        return results
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# 行范围：(起始行, 结束行)，None 表示整个文件
+_Range = Optional[Tuple[int, Optional[int]]]
+
+
+@dataclass
+class _Part:
+    """read_files 的一段输出：一个文件或文件中的一个行范围"""
+
+    label: str
+    path: str
+    line_range: _Range
+    st: Optional[os.stat_result] = None
+    start: int = 0
+    end: int = 0
+    lines: Optional[Tuple[int, int]] = None
+    offsets: Optional[array] = None
+    error: Optional[str] = None
+    text: str = ""
+    truncated: bool = False
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def _merge_ranges(ranges: List[_Range]) -> List[_Range]:
+    """合并同一文件的重叠或相邻的行范围；包含整个文件时只保留整个文件"""
+    if any(r is None for r in ranges):
+        return [None]
+    merged: List[List[float]] = []
+    for first, last in sorted(ranges, key=lambda r: r[0]):
+        end = math.inf if last is None else last
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([first, end])
+    return [
+        (int(first), None if end == math.inf else int(end))
+        for first, end in merged
+    ]
+
+
+def _parse_file_requests(
+    files: List[Union[str, Dict[str, Any]]]
+) -> Tuple[List[_Part], int]:
+    """
+    按首次出现的顺序归并请求：同一文件（按绝对路径）的多个请求合并
+
+    :return: (各段, 被合并掉的请求数)
+    """
+    grouped: "OrderedDict[str, Tuple[str, List[_Range]]]" = OrderedDict()
+    invalid: Dict[str, _Part] = {}
+    for number, item in enumerate(files):
+        if isinstance(item, str):
+            label, line_range = item, None
+        elif isinstance(item, dict) and item.get("file_path"):
+            label = item["file_path"]
+            first, last = item.get("start_line"), item.get("end_line")
+            line_range = None
+            if first is not None or last is not None:
+                try:
+                    line_range = _check_line_range(first, last)
+                except ValueError as e:
+                    key = f"\0{number}"
+                    invalid[key] = _Part(
+                        label, "", None, error=f"❌ 无效的行范围: {e}"
+                    )
+                    grouped[key] = (label, [None])
+                    continue
+        else:
+            key = f"\0{number}"
+            invalid[key] = _Part(str(item), "", None, error="❌ 无效的请求")
+            grouped[key] = (str(item), [None])
+            continue
+        key = os.path.abspath(label)
+        grouped.setdefault(key, (label, []))[1].append(line_range)
+
+    parts: List[_Part] = []
+    requested = 0
+    for path, (label, ranges) in grouped.items():
+        requested += len(ranges)
+        if path in invalid:
+            parts.append(invalid[path])
+            continue
+        for line_range in _merge_ranges(ranges):
+            parts.append(_Part(label, path, line_range))
+    return parts, requested - len(parts)
+
+
+def _locate_part(part: _Part) -> _Part:
+    """确定一段的字节区间（按行读取时建立行偏移索引）"""
+    if part.error:
+        return part
+    try:
+        part.st = os.stat(part.path)
+        size = part.st.st_size
+        if os.path.isdir(part.path):
+            part.error = "❌ 是文件夹，不是文件"
+        elif part.line_range is None:
+            part.start, part.end = 0, size
+        else:
+            part.offsets = _line_offsets(part.path, part.st)
+            span_range = _line_range(part.offsets, size, *part.line_range)
+            if span_range is not None:
+                first, last, part.start, part.end = span_range
+                part.lines = (first, last)
+    except FileNotFoundError:
+        part.error = "❌ 文件未找到"
+    except PermissionError:
+        part.error = "❌ 没有权限读取文件"
+    except OSError as e:
+        part.error = f"❌ 读取文件时出错: {e}"
+    return part
+
+
+def _allocate(sizes: List[int], budget: int) -> List[int]:
+    """
+    在各段之间分配字节预算：小于平均份额的段完整保留，
+    剩余预算由较大的段平分
+
+    :param sizes: 各段字节数
+    :param budget: 总预算
+    :return: 各段可用的字节数
+    """
+    allocation = list(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        if sizes[pending[0]] > share:
+            for i in pending:
+                allocation[i] = share
+            break
+        i = pending.pop(0)
+        remaining -= sizes[i]
+    return allocation
+
+
+def _read_part(args: Tuple[_Part, Optional[int], str]) -> _Part:
+    part, budget, encoding = args
+    if part.error or part.size <= 0:
+        return part
+    try:
+        span = _FileSpan(part.path, part.st.st_size)
+        try:
+            if budget is None or part.size <= budget:
+                part.text = decode_text(
+                    span.read(part.start, part.end), encoding
+                )
+            else:
+                if part.offsets is None:
+                    part.offsets = _line_offsets(part.path, part.st)
+                part.text = _excerpt(
+                    span, part.start, part.end, budget, encoding, part.offsets
+                )
+                part.truncated = True
+        finally:
+            span.close()
+    except OSError as e:
+        part.error = f"❌ 读取文件时出错: {e}"
+    return part
+
+
+def read_files(
+    files: List[Union[str, Dict[str, Any]]],
+    encoding: str = "utf-8",
+    max_bytes: Optional[int] = None,
+) -> str:
+    """
+    一次并发读取多个文件（或文件中的行范围），比多次调用 read_file 快得多。
+    同一文件的重复或重叠请求会被合并；所有文件共用一个字节预算，小文件
+    完整返回，较大的文件平分剩余预算，超出部分只保留开头和结尾
+
+    :param files: 文件路径列表，每项为路径字符串，或
+        {"file_path": 路径, "start_line": 起始行, "end_line": 结束行}
+    :param encoding: 文件编码（默认 utf-8）
+    :param max_bytes: 所有文件合计最多返回的字节数（默认取配置；
+        不超过工具输出上限）
+    :return: 开头为读取摘要（含被截断的文件），之后每个文件以
+        "=== 路径 ===" 开头
+    """
+    if not files:
+        return "❌ 没有指定要读取的文件"
+
+    parts, merged = _parse_file_requests(files)
+    try:
+        budget = _read_budget(
+            max_bytes,
+            _SUMMARY_RESERVE
+            + sum(len(p.label) + _PART_RESERVE for p in parts),
+        )
+    except ValueError as e:
+        return f"❌ 无效的读取上限: {e}"
+    parts = _map(_locate_part, parts)
+    readable = [p for p in parts if not p.error and p.size > 0]
+    allocation: Dict[int, Optional[int]] = {}
+    if budget is not None:
+        shares = _allocate([p.size for p in readable], budget)
+        allocation = {id(p): share for p, share in zip(readable, shares)}
+    parts = _map(
+        _read_part, [(p, allocation.get(id(p)), encoding) for p in parts]
+    )
+
+    total = sum(len(p.text) for p in parts)
+    summary = [f"📄 读取了 {len(parts)} 段内容，共 {total} 个字符"]
+    if merged:
+        summary.append(f"（合并了 {merged} 个重复或重叠的请求）")
+    truncated = [p for p in parts if p.truncated]
+    if truncated:
+        labels = ", ".join(_part_label(p) for p in truncated)
+        summary.append(
+            f"\n⚠️ 超出预算（{budget} 字节）被截断: {labels}"
+            f"；可用 start_line/end_line 分段读取"
+        )
+    failed = [p for p in parts if p.error]
+    if failed:
+        summary.append(f"\n❌ {len(failed)} 个读取失败")
+
+    sections = ["".join(summary)]
+    for part in parts:
+        body = part.error or part.text
+        if not part.error and part.size <= 0:
+            body = "（空）"
+        sections.append(f"=== {_part_label(part)} ===\n{body}")
+    return "\n\n".join(sections)
+
+
+def _part_label(part: _Part) -> str:
+    if part.lines is not None:
+        return f"{part.label} (第 {part.lines[0]}-{part.lines[1]} 行)"
+    if part.line_range is not None and not part.error:
+        return f"{part.label} (第 {part.line_range[0]} 行起)"
+    return part.label
+
+
 def list_file_tree(root_path: str, indent: str = "  ") -> str:
     """
     生成指定文件夹下的文件树
 
+    与 os.walk 相同，符号链接目录只列出、不展开；指向允许目录之外的
+    符号链接不列出
+
     :param root_path: 根目录路径
     :param indent: 缩进样式（默认两个空格）
     :return: 文件树字符串
@@ -41,6 +643,7 @@ def list_file_tree(root_path: str, indent: str = "  ") -> str:
     tree_lines = []
 
     def _walk(dir_path: str, level: int = 0):
+        check_cancelled()
         try:
             items = sorted(os.listdir(dir_path))
         except PermissionError:
@@ -49,10 +652,13 @@ def list_file_tree(root_path: str, indent: str = "  ") -> str:
 
         for item in items:
             full_path = os.path.join(dir_path, item)
+            if escapes_root(full_path):
+                continue
             prefix = indent * level + "├─ " if level > 0 else ""
             if os.path.isdir(full_path):
                 tree_lines.append(f"{prefix}{item}/")
-                _walk(full_path, level + 1)
+                if not os.path.islink(full_path):
+                    _walk(full_path, level + 1)
             else:
                 tree_lines.append(f"{prefix}{item}")
 
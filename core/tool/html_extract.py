@@ -0,0 +1,246 @@
+"""
+HTML to compact text extraction for web tool output.
+
+去掉脚本、样式、导航、页脚等模板内容，只把正文转换成 Markdown 或纯文本，
+避免把整页 HTML 塞进 ReAct 轨迹。
+"""
+
+import re
+from typing import List, Optional
+from urllib.parse import urljoin
+
+# 整个删除的标签
+_DROP_TAGS = [
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "object", "embed", "button", "input", "select", "textarea",
+    "nav", "footer", "aside", "dialog",
+]
+
+# 只在正文之外删除的标签：文章内的 <header> 常含标题和作者，
+# 有的页面（如 ASP.NET）用一个 <form> 包住整个页面
+_OUTSIDE_MAIN_TAGS = ["form", "header"]
+
+# 这些 role 属于页面框架而不是正文
+_DROP_ROLES = {
+    "navigation", "banner", "contentinfo", "complementary", "search",
+    "dialog", "menu", "menubar",
+}
+
+# class / id 命中这些词的元素视为模板内容
+_BOILERPLATE = re.compile(
+    r"(^|[-_\s])(nav|navbar|menu|footer|sidebar|cookie|consent|advert|ads|"
+    r"banner|breadcrumbs?|share|social|popup|modal|newsletter|related)"
+    r"($|[-_\s])",
+    re.IGNORECASE,
+)
+
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "body", "figure",
+    "figcaption", "dl", "dt", "dd", "address", "details", "summary",
+}
+
+
+def _is_boilerplate(tag) -> bool:
+    if tag.name in ("main", "article", "body", "html"):
+        return False
+    attrs = tag.attrs or {}
+    if attrs.get("role") in _DROP_ROLES:
+        return True
+    if "hidden" in attrs or attrs.get("aria-hidden") == "true":
+        return True
+    style = attrs.get("style", "").replace(" ", "").lower()
+    if "display:none" in style or "visibility:hidden" in style:
+        return True
+    names = " ".join(attrs.get("class", [])) + " " + attrs.get("id", "")
+    return bool(_BOILERPLATE.search(names))
+
+
+def _main_content(soup):
+    main = soup.find("main") or soup.find(attrs={"role": "main"})
+    if main is not None:
+        return main
+    articles = soup.find_all("article")
+    if articles:
+        return max(articles, key=lambda a: len(a.get_text()))
+    return soup.body or soup
+
+
+def _inline(text: str) -> str:
+    return re.sub(r"\s+", " ", text)
+
+
+class _MarkdownWriter:
+    """把 BeautifulSoup 节点树渲染成 Markdown（plain=True 时不带标记）"""
+
+    def __init__(self, base_url: Optional[str], plain: bool = False):
+        self.base_url = base_url
+        self.plain = plain
+        self.blocks: List[str] = []
+        self.line: List[str] = []
+
+    def render(self, root) -> str:
+        self._children(root)
+        self._flush()
+        return "\n\n".join(b for b in self.blocks if b.strip())
+
+    def _flush(self, prefix: str = ""):
+        text = "".join(self.line).strip()
+        self.line = []
+        if text:
+            self.blocks.append(prefix + text)
+
+    def _children(self, tag):
+        from bs4 import NavigableString, Tag
+
+        for child in tag.children:
+            if isinstance(child, Tag):
+                self._tag(child)
+            elif isinstance(child, NavigableString) and not isinstance(
+                child, _comment_types()
+            ):
+                self.line.append(_inline(str(child)))
+
+    def _text_of(self, tag) -> str:
+        writer = _MarkdownWriter(self.base_url, self.plain)
+        writer._children(tag)
+        writer._flush()
+        return " ".join(writer.blocks)
+
+    def _tag(self, tag):
+        name = tag.name
+        if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._flush()
+            text = _inline(tag.get_text()).strip()
+            if text and not self.plain:
+                text = "#" * int(name[1]) + " " + text
+            if text:
+                self.blocks.append(text)
+        elif name == "pre":
+            self._flush()
+            code = tag.get_text().strip("\n")
+            if code.strip():
+                self.blocks.append(code if self.plain else f"```\n{code}\n```")
+        elif name == "code":
+            text = tag.get_text().strip()
+            if text:
+                self.line.append(text if self.plain else f"`{text}`")
+        elif name == "a":
+            text = self._text_of(tag).strip()
+            href = tag.get("href", "")
+            if (
+                href
+                and not href.startswith(("#", "javascript:"))
+                and text
+                and not self.plain
+            ):
+                if self.base_url:
+                    href = urljoin(self.base_url, href)
+                self.line.append(f"[{text}]({href})")
+            elif text:
+                self.line.append(text)
+        elif name == "img":
+            alt = (tag.get("alt") or "").strip()
+            if alt:
+                self.line.append(f"[图片: {alt}]")
+        elif name == "br":
+            self.line.append("\n")
+        elif name in ("ul", "ol"):
+            self._flush()
+            items = []
+            for i, li in enumerate(tag.find_all("li", recursive=False), 1):
+                marker = f"{i}." if name == "ol" else "-"
+                text = self._text_of(li).strip()
+                if text:
+                    items.append(f"{marker} {text}")
+            if items:
+                self.blocks.append("\n".join(items))
+        elif name == "table":
+            self._flush()
+            rows = []
+            for tr in tag.find_all("tr"):
+                cells = [
+                    _inline(c.get_text()).strip()
+                    for c in tr.find_all(["th", "td"])
+                ]
+                if any(cells):
+                    rows.append("| " + " | ".join(cells) + " |")
+            if rows:
+                self.blocks.append("\n".join(rows))
+        elif name == "blockquote":
+            self._flush()
+            text = self._text_of(tag).strip()
+            if text:
+                self.blocks.append(text if self.plain else "> " + text)
+        elif name in ("strong", "b"):
+            text = self._text_of(tag).strip()
+            if text:
+                self.line.append(text if self.plain else f"**{text}**")
+        elif name in _BLOCK_TAGS or name == "li":
+            self._flush()
+            self._children(tag)
+            self._flush()
+        else:
+            self._children(tag)
+
+
+def _comment_types():
+    from bs4 import Comment, Declaration, Doctype, ProcessingInstruction
+
+    return (Comment, Declaration, Doctype, ProcessingInstruction)
+
+
+def _truncate(text: str, max_chars: Optional[int]) -> str:
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = max_chars
+    return (
+        text[:cut].rstrip()
+        + f"\n\n... [已截断，正文共 {len(text)} 字符；"
+        f'如需完整页面可用 mode="html"] ...'
+    )
+
+
+def extract_content(
+    html: str,
+    mode: str = "markdown",
+    base_url: Optional[str] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    """
+    从 HTML 中提取正文
+
+    :param html: 页面 HTML
+    :param mode: 'markdown' 保留标题/列表/链接/代码块结构；'text' 纯文本
+    :param base_url: 用于把相对链接转换为绝对链接
+    :param max_chars: 输出字符数上限（超出部分截断并附带标记）
+    :return: 提取后的正文
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = _inline(soup.title.get_text()).strip() if soup.title else ""
+
+    for tag in soup.find_all(_DROP_TAGS):
+        tag.decompose()
+    main = _main_content(soup)
+    for tag in soup.find_all(_OUTSIDE_MAIN_TAGS):
+        if tag.decomposed:
+            continue
+        inside = any(parent is main for parent in tag.parents)
+        encloses = any(parent is tag for parent in main.parents)
+        if not inside and not encloses and tag is not main:
+            tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or any(parent is tag for parent in main.parents):
+            continue
+        if _is_boilerplate(tag):
+            tag.decompose()
+
+    plain = mode == "text"
+    body = _MarkdownWriter(base_url, plain).render(_main_content(soup))
+    if title and not body.startswith(title if plain else "# "):
+        body = f"{title if plain else '# ' + title}\n\n{body}"
+    body = re.sub(r"\n{3,}", "\n\n", body).strip()
+    return _truncate(body, max_chars)
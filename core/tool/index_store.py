@@ -0,0 +1,74 @@
+"""
+On-disk storage helpers for workspace indexes used by tools.
+
+索引默认保存在 ~/.mini-code-agent/cache/<kind>/ 下，每个工作区一个文件，
+文件名由工作区绝对路径（及其他区分参数）哈希得到。
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+DEFAULT_CACHE_DIR = Path.home() / ".mini-code-agent" / "cache"
+
+
+def index_file(
+    kind: str, root_path: str, *key_parts: str, base_dir: Optional[str] = None
+) -> Path:
+    """
+    计算某个工作区索引文件的路径
+
+    :param kind: 索引类型（用作子目录名，如 "search-index"）
+    :param root_path: 工作区根目录
+    :param key_parts: 额外区分参数（如编码）
+    :param base_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+    :return: 索引文件路径
+    """
+    key = "\0".join((os.path.abspath(root_path),) + key_parts)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    directory = Path(base_dir) if base_dir else DEFAULT_CACHE_DIR
+    return directory / kind / f"{digest}.pickle"
+
+
+def load_index(path: Path) -> Optional[Any]:
+    """
+    读取索引文件，不存在或已损坏时返回 None
+
+    :param path: 索引文件路径
+    :return: 反序列化后的对象
+    """
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ 索引文件已损坏，将重新构建: {path} ({e})")
+        return None
+
+
+def save_index(path: Path, data: Any) -> bool:
+    """
+    原子地写入索引文件（先写临时文件再重命名）
+
+    :param path: 索引文件路径
+    :param data: 要序列化的对象
+    :return: 是否写入成功
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+    except OSError as e:
+        print(f"⚠️ 无法保存索引: {path} ({e})")
+        return False
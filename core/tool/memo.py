@@ -0,0 +1,239 @@
+"""
+Run-scoped memoization of read-only tool calls.
+
+同一次运行中模型经常重复完全相同的只读调用（同一个 list_file_tree、
+search_in_files 或 read_file）。ToolMemo 按工具名和参数缓存结果，并记下
+每个结果依赖的路径；写工具改动某个路径时，依赖该路径、其上级目录树或其
+下级路径的结果失效。无法确定依赖或影响范围的调用按最保守的方式处理。
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .patching import EditTransaction, PatchError, parse_unified_diff
+
+# 只读工具 -> 其依赖路径所在的参数
+_READ_PATH_ARGS = {
+    "read_file": "file_path",
+    "file_outline": "file_path",
+    "list_file_tree": "root_path",
+    "search_in_files": "root_path",
+    "search_matches": "root_path",
+    "find_symbol": "root_path",
+    "find_references": "root_path",
+    "retrieve": "root_path",
+}
+
+# 不依赖工作区文件的只读工具，写操作不会使其失效
+_NO_PATH_TOOLS = frozenset({"fetch_website_html", "use_search_engine"})
+
+# 有副作用但不改动文件的工具
+_NO_WRITE_TOOLS = frozenset({"tell_human_something"})
+
+
+class MemoEntry(NamedTuple):
+    """一次只读调用的结果及其出处"""
+
+    result: Any
+    step: int
+    index: int
+    # 依赖的绝对路径；None 表示未知（任何写操作都会使其失效）
+    paths: Optional[Tuple[str, ...]]
+
+
+def _resolve(path: Any, base: Optional[str] = None) -> Optional[str]:
+    if not isinstance(path, str) or not path:
+        return None
+    # 与 apply_patch 一样解析符号链接，两边的路径才能比较
+    return os.path.realpath(os.path.join(base or "", path))
+
+
+def read_paths(name: str, args: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """
+    只读调用依赖的路径
+
+    :param name: 工具名
+    :param args: 调用参数
+    :return: 绝对路径元组；无法确定时返回 None
+    """
+    if name in _NO_PATH_TOOLS:
+        return ()
+    if name == "read_files":
+        paths = []
+        for item in args.get("files") or []:
+            if isinstance(item, dict):
+                item = item.get("file_path")
+            path = _resolve(item)
+            if path is None:
+                return None
+            paths.append(path)
+        return tuple(paths)
+    path = _resolve(args.get(_READ_PATH_ARGS.get(name, "")))
+    return None if path is None else (path,)
+
+
+def _patch_paths(args: Dict[str, Any]) -> Optional[List[str]]:
+    base = args.get("base_dir")
+    paths = []
+    if args.get("patch"):
+        try:
+            patches = parse_unified_diff(args["patch"])
+        except PatchError:
+            return None
+        resolve = EditTransaction(base).resolve
+        for file_patch in patches:
+            paths.extend(
+                resolve(path, True)
+                for path in (file_patch.old_path, file_patch.new_path)
+                if path
+            )
+    for edit in args.get("edits") or []:
+        if not isinstance(edit, dict):
+            return None
+        paths.append(_resolve(edit.get("file_path"), base))
+    return paths
+
+
+def written_paths(name: str, args: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    写调用可能改动的路径
+
+    :param name: 工具名
+    :param args: 调用参数
+    :return: 绝对路径列表；无法确定时返回 None
+    """
+    if name in _NO_WRITE_TOOLS:
+        return []
+    if name == "create_path":
+        paths = [_resolve(args.get("name"), args.get("base_path"))]
+    elif name == "edit_path":
+        path = _resolve(args.get("path"))
+        paths = [path]
+        if path is not None and args.get("new_name"):
+            paths.append(_resolve(args["new_name"], os.path.dirname(path)))
+    elif name == "replace_in_file":
+        paths = [_resolve(args.get("file_path"))]
+    elif name == "apply_patch":
+        paths = _patch_paths(args)
+    else:
+        return None
+    if paths is None or None in paths:
+        return None
+    return paths
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """两个路径相同，或其中一个位于另一个之下"""
+    if a == b:
+        return True
+    shorter, longer = sorted((a, b), key=len)
+    return longer.startswith(shorter.rstrip(os.sep) + os.sep)
+
+
+def _bypasses(args: Dict[str, Any]) -> bool:
+    """调用方要求最新结果（web 工具的 use_cache=False），不读也不写缓存"""
+    return args.get("use_cache") is False
+
+
+def _key(name: str, args: Dict[str, Any]) -> str:
+    return name + json.dumps(
+        args, sort_keys=True, ensure_ascii=False, default=str
+    )
+
+
+class ToolMemo:
+    """
+    Results of one run's read-only tool calls, keyed by tool and arguments.
+
+    Thread-safe: read-only calls of a step run concurrently.
+    """
+
+    def __init__(self, tools: Iterable[str]):
+        """
+        :param tools: 可以缓存结果的（只读）工具名
+        """
+        self.tools = frozenset(tools)
+        self._entries: Dict[str, MemoEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.invalidated = 0
+
+    def get(self, name: str, args: Dict[str, Any]) -> Optional[MemoEntry]:
+        """
+        查找相同调用的结果
+
+        :param name: 工具名
+        :param args: 调用参数
+        :return: 之前的结果；没有或已失效时返回 None
+        """
+        if name not in self.tools or _bypasses(args):
+            return None
+        with self._lock:
+            entry = self._entries.get(_key(name, args))
+            if entry is not None:
+                self.hits += 1
+            return entry
+
+    def put(
+        self,
+        name: str,
+        args: Dict[str, Any],
+        result: Any,
+        step: int,
+        index: int,
+    ):
+        """
+        记录一次只读调用的结果
+
+        :param name: 工具名
+        :param args: 调用参数
+        :param result: 工具输出
+        :param step: 所在步
+        :param index: 在该步中的序号（从 1 开始）
+        """
+        if name not in self.tools or _bypasses(args):
+            return
+        entry = MemoEntry(result, step, index, read_paths(name, args))
+        with self._lock:
+            self._entries[_key(name, args)] = entry
+
+    def invalidate(self, name: str, args: Dict[str, Any]):
+        """
+        写调用之后，丢弃依赖其改动路径的结果
+
+        :param name: 写工具名
+        :param args: 调用参数
+        """
+        paths = written_paths(name, args)
+        if paths == []:
+            return
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if paths is None
+                or entry.paths is None
+                or any(
+                    _overlaps(dep, path)
+                    for dep in entry.paths
+                    for path in paths
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        命中和失效计数
+
+        :return: hits/invalidated/entries
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "invalidated": self.invalidated,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,538 @@
+"""
+Unified diffs and search/replace edits applied to several files as one
+transaction.
+
+所有修改先在内存中应用：任何一处不匹配都不会写盘。全部校验通过后逐个文件
+写入同目录下的临时文件再重命名覆盖（原子替换），中途写入失败时把已写入的
+文件恢复为原内容、删除新建的文件。
+"""
+
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .content_cache import content_cache
+from .search_index import notify_changed
+
+DEV_NULL = "/dev/null"
+
+# write_atomic 的临时文件名：.{原文件名}.{8 位十六进制}.tmp
+_ATOMIC_TEMP_NAME = re.compile(r"^\..+\.[0-9a-f]{8}\.tmp$")
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+class PatchError(Exception):
+    """A patch that cannot be parsed, does not match or cannot be written."""
+
+
+@dataclass
+class Hunk:
+    """diff 中的一段修改；old_lines/new_lines 都包含上下文行"""
+
+    old_start: int
+    header: str
+    old_lines: List[str] = field(default_factory=list)
+    new_lines: List[str] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+    old_no_eol: bool = False  # "\ No newline at end of file"
+    new_no_eol: bool = False
+
+
+@dataclass
+class FilePatch:
+    """一个文件的修改；新建文件 old_path 为 None，删除文件 new_path 为 None"""
+
+    old_path: Optional[str]
+    new_path: Optional[str]
+    hunks: List[Hunk] = field(default_factory=list)
+
+
+def _header_path(text: str) -> Optional[str]:
+    path = text.split("\t", 1)[0].strip()
+    if len(path) >= 2 and path[0] == path[-1] == '"':
+        path = path[1:-1]
+    return None if path == DEV_NULL else path
+
+
+def _trim_tail(hunk: Hunk, loose: int):
+    """
+    去掉 hunk 末尾的空白上下文行（通常是补丁文本结尾的换行或被编辑器删掉
+    行首空格的空行）；上下文行同时出现在新旧两侧，去掉不影响修改内容
+    """
+    while loose and hunk.old_lines and hunk.new_lines:
+        if hunk.old_lines[-1] or hunk.new_lines[-1]:
+            break
+        hunk.old_lines.pop()
+        hunk.new_lines.pop()
+        loose -= 1
+
+
+def parse_unified_diff(text: str) -> List[FilePatch]:
+    """
+    解析 unified diff（diff -u / git diff 格式），忽略文件头之外的说明文字
+
+    不依赖 @@ 行中的行数（模型生成的补丁经常算错），以行首的
+    " "、"-"、"+" 判断每一行；@@ 行中的起始行号只用于定位。
+
+    :param text: 补丁文本
+    :return: 按出现顺序排列的 FilePatch 列表
+    :raises PatchError: 补丁格式错误
+    """
+    lines = text.replace("\r\n", "\n").split("\n")
+    patches: List[FilePatch] = []
+    current: Optional[FilePatch] = None
+    hunk: Optional[Hunk] = None
+    last = ""
+    loose = 0  # hunk 末尾连续的裸空行数
+
+    def _finish():
+        if hunk is not None:
+            _trim_tail(hunk, loose)
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if (
+            line.startswith("--- ")
+            and i + 1 < len(lines)
+            and lines[i + 1].startswith("+++ ")
+        ):
+            _finish()
+            current = FilePatch(
+                _header_path(line[4:]), _header_path(lines[i + 1][4:])
+            )
+            if current.old_path is None and current.new_path is None:
+                raise PatchError(f"文件头两侧都是 {DEV_NULL}: {line}")
+            patches.append(current)
+            hunk, loose = None, 0
+            i += 2
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if current is None:
+                raise PatchError(f"@@ 行之前缺少 ---/+++ 文件头: {line}")
+            _finish()
+            hunk, loose = Hunk(int(match.group(1)), line.strip()), 0
+            current.hunks.append(hunk)
+        elif hunk is None:
+            pass  # diff --git、index 等行或补丁外的说明文字
+        elif line.startswith("\\"):
+            if last in (" ", "-"):
+                hunk.old_no_eol = True
+            if last in (" ", "+"):
+                hunk.new_no_eol = True
+        elif line.startswith("-"):
+            hunk.old_lines.append(line[1:])
+            hunk.removed += 1
+            last, loose = "-", 0
+        elif line.startswith("+"):
+            hunk.new_lines.append(line[1:])
+            hunk.added += 1
+            last, loose = "+", 0
+        elif line.startswith(" ") or not line:
+            hunk.old_lines.append(line[1:])
+            hunk.new_lines.append(line[1:])
+            last = " "
+            loose = loose + 1 if not line else 0
+        else:
+            _finish()
+            hunk = None
+        i += 1
+    _finish()
+
+    if not patches:
+        raise PatchError("没有找到 ---/+++ 文件头，不是 unified diff")
+    for patch in patches:
+        if not patch.hunks and patch.old_path and patch.new_path:
+            if patch.old_path == patch.new_path:
+                raise PatchError(f"{patch.new_path}: 补丁中没有任何 @@ 段")
+    return patches
+
+
+def _locate(
+    lines: List[str], needle: List[str], expected: int, lower: int
+) -> Optional[int]:
+    """
+    在 lines[lower:] 中查找 needle，返回离 expected 最近的位置；
+    完全匹配优先，其次忽略行尾空白
+    """
+    size = len(needle)
+    first = needle[0].rstrip()
+    starts = [
+        i
+        for i in range(lower, len(lines) - size + 1)
+        if lines[i].rstrip() == first
+    ]
+    starts.sort(key=lambda i: (abs(i - expected), i))
+    for start in starts:
+        if lines[start:start + size] == needle:
+            return start
+    wanted = [line.rstrip() for line in needle]
+    for start in starts:
+        if [line.rstrip() for line in lines[start:start + size]] == wanted:
+            return start
+    return None
+
+
+def apply_hunks(
+    lines: List[str], eol: bool, hunks: List[Hunk], name: str
+) -> Tuple[List[str], bool, List[str]]:
+    """
+    在内存中依次应用一个文件的各个 hunk
+
+    :param lines: 文件各行（不含换行符）
+    :param eol: 文件是否以换行符结尾
+    :param hunks: 按位置排列的 hunk
+    :param name: 文件名（用于错误信息）
+    :return: (新的各行, 是否以换行符结尾, 错误信息列表)
+    """
+    result: List[str] = []
+    errors: List[str] = []
+    pos = 0  # 原文件中已处理到的位置
+    drift = 0  # 实际位置与 @@ 行号的偏差
+    for number, hunk in enumerate(hunks, 1):
+        stated = hunk.old_start - 1 if hunk.old_lines else hunk.old_start
+        expected = stated + drift
+        if hunk.old_lines:
+            start = _locate(lines, hunk.old_lines, expected, pos)
+        else:
+            start = min(max(expected, pos), len(lines))
+        if start is None:
+            first = next((line for line in hunk.old_lines if line.strip()), "")
+            errors.append(
+                f"{name}: 第 {number} 段 {hunk.header} 与文件内容不匹配"
+                f"（起始行: {first.strip()[:80]!r}），请重新读取文件后"
+                f"生成补丁"
+            )
+            continue
+        drift = start - stated
+        end = start + len(hunk.old_lines)
+        result.extend(lines[pos:start])
+        result.extend(hunk.new_lines)
+        pos = end
+        if end == len(lines):
+            if hunk.new_no_eol:
+                eol = False
+            elif hunk.old_no_eol:
+                eol = True
+    result.extend(lines[pos:])
+    return result, eol, errors
+
+
+def split_lines(text: str) -> Tuple[List[str], bool]:
+    """把文本拆成各行，并返回是否以换行符结尾"""
+    if not text:
+        return [], True
+    if text.endswith("\n"):
+        return text[:-1].split("\n"), True
+    return text.split("\n"), False
+
+
+def join_lines(lines: List[str], eol: bool) -> str:
+    """split_lines 的逆操作"""
+    if not lines:
+        return ""
+    return "\n".join(lines) + ("\n" if eol else "")
+
+
+def _changed_lines(old: str, new: str) -> Tuple[int, int]:
+    """一处替换增删的行数：去掉首尾相同的行后剩下的部分"""
+    a, b = old.split("\n"), new.split("\n")
+    while a and b and a[0] == b[0]:
+        a.pop(0)
+        b.pop(0)
+    while a and b and a[-1] == b[-1]:
+        a.pop()
+        b.pop()
+    return len(b), len(a)
+
+
+def is_atomic_temp(filename: str) -> bool:
+    """
+    文件名是否为 write_atomic 尚未重命名的临时文件（遍历工作区时应跳过）
+
+    :param filename: 文件名（不含目录）
+    :return: 是否为临时文件
+    """
+    return _ATOMIC_TEMP_NAME.match(filename) is not None
+
+
+def write_atomic(path: str, data: bytes, mode: Optional[int] = None):
+    """
+    原子地写入文件：写入同目录下的临时文件后重命名覆盖
+
+    :param path: 文件路径
+    :param data: 文件内容
+    :param mode: 文件权限（默认沿用原文件，新文件按 umask）
+    :raises OSError: 写入失败（原文件保持不变）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            pass
+    tmp_path = os.path.join(
+        directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp"
+    )
+    # 与 open() 一样以 0o666 创建，由内核按当前 umask 去掉权限位；
+    # 不能在导入时读取 umask（os.umask 会短暂修改整个进程的 umask）
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@dataclass
+class _FileState:
+    path: str
+    original: Optional[bytes]  # None 表示文件原本不存在
+    mode: Optional[int]
+    newline: str = "\n"
+    text: Optional[str] = None  # None 表示（修改后）文件不存在
+    added: int = 0
+    removed: int = 0
+
+    @property
+    def changed(self) -> bool:
+        if self.text is None:
+            return self.original is not None
+        return self.original != self.encoded()
+
+    def encoded(self) -> bytes:
+        text = self.text or ""
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)
+        return text.encode("utf-8")
+
+
+class EditTransaction:
+    """
+    Edits of several files collected in memory and written together.
+
+    Failed edits are recorded in `errors` instead of raising, so a single
+    call reports every mismatch; commit() refuses to write while any
+    error is recorded.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        :param base_dir: 相对路径的基准目录（默认当前目录）
+        """
+        self.base_dir = os.path.abspath(base_dir or os.getcwd())
+        self.errors: List[str] = []
+        self._files: Dict[str, _FileState] = {}
+
+    def resolve(self, path: str, strip_prefix: bool = False) -> str:
+        """
+        把补丁或参数中的路径解析为绝对路径（解析符号链接）
+
+        :param path: 路径
+        :param strip_prefix: 是否去掉 git 风格的 a/、b/ 前缀
+            （仅当带前缀的路径不存在时）
+        :return: 真实绝对路径
+        """
+        full = os.path.join(self.base_dir, path)
+        if (
+            strip_prefix
+            and path[:2] in ("a/", "b/")
+            and not os.path.lexists(full)
+        ):
+            full = os.path.join(self.base_dir, path[2:])
+        return os.path.realpath(full)
+
+    def _state(self, path: str) -> _FileState:
+        state = self._files.get(path)
+        if state is not None:
+            return state
+        try:
+            original = content_cache.read_bytes(path)
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            state = _FileState(path, None, None)
+        else:
+            if b"\0" in original[:8192]:
+                raise PatchError(f"{path}: 是二进制文件，无法应用补丁")
+            try:
+                text = original.decode("utf-8")
+            except UnicodeDecodeError:
+                raise PatchError(f"{path}: 不是 UTF-8 文本文件")
+            newline = "\r\n" if "\r\n" in text else "\n"
+            state = _FileState(
+                path, original, mode, newline, text.replace("\r\n", "\n")
+            )
+        self._files[path] = state
+        return state
+
+    def apply_file_patch(self, patch: FilePatch):
+        """在内存中应用一个文件的 diff（包括新建、删除和重命名）"""
+        try:
+            self._apply_file_patch(patch)
+        except (PatchError, OSError) as e:
+            self.errors.append(str(e))
+
+    def _apply_file_patch(self, patch: FilePatch):
+        if patch.old_path is None:
+            state = self._state(self.resolve(patch.new_path, True))
+            if state.text is not None:
+                raise PatchError(f"{state.path}: 文件已存在，无法新建")
+            lines, eol = [], True
+        else:
+            state = self._state(self.resolve(patch.old_path, True))
+            if state.text is None:
+                raise PatchError(f"{state.path}: 文件不存在")
+            lines, eol = split_lines(state.text)
+
+        lines, eol, errors = apply_hunks(lines, eol, patch.hunks, state.path)
+        if errors:
+            self.errors.extend(errors)
+            return
+        added = sum(hunk.added for hunk in patch.hunks)
+        removed = sum(hunk.removed for hunk in patch.hunks)
+
+        if patch.new_path is None:
+            if patch.hunks and lines:
+                raise PatchError(
+                    f"{state.path}: 删除文件的补丁没有删掉全部内容"
+                )
+            state.removed += len(split_lines(state.text)[0])
+            state.text = None
+            return
+
+        target = state
+        if patch.old_path is not None:
+            new_path = self.resolve(patch.new_path, True)
+            if new_path != state.path:
+                # 重命名：旧文件删除，内容移到新路径
+                target = self._state(new_path)
+                if target.text is not None:
+                    raise PatchError(f"{new_path}: 文件已存在，无法重命名")
+                target.newline = state.newline
+                # 与 git 一样，重命名保留原文件的权限（如可执行位）
+                target.mode = state.mode
+                state.text = None
+        target.text = join_lines(lines, eol)
+        target.added += added
+        target.removed += removed
+
+    def replace(
+        self,
+        path: str,
+        search: str,
+        replace: str,
+        replace_all: bool = False,
+    ):
+        """
+        在内存中做一次精确的文本替换；search 为空时新建文件
+
+        :param path: 文件路径（相对路径基于 base_dir）
+        :param search: 原文（必须与文件内容完全一致，含缩进）
+        :param replace: 替换后的文本
+        :param replace_all: 是否替换全部匹配（默认要求恰好匹配一处）
+        """
+        try:
+            state = self._state(self.resolve(path))
+        except (PatchError, OSError) as e:
+            self.errors.append(str(e))
+            return
+        search = search.replace("\r\n", "\n")
+        replace = replace.replace("\r\n", "\n")
+        if not search:
+            if state.text:
+                self.errors.append(
+                    f"{state.path}: search 为空只能用于新建文件，"
+                    f"但文件已存在且不为空"
+                )
+                return
+            state.text = replace
+            state.added += len(split_lines(replace)[0])
+            return
+        if state.text is None:
+            self.errors.append(f"{state.path}: 文件不存在")
+            return
+        count = state.text.count(search)
+        if count == 0:
+            hint = ""
+            if search.strip() and search.strip() in state.text:
+                hint = "（去掉首尾空白后能找到，请检查缩进和换行）"
+            self.errors.append(
+                f"{state.path}: 没有找到 search 文本{hint}: "
+                f"{search.strip()[:80]!r}"
+            )
+            return
+        if count > 1 and not replace_all:
+            self.errors.append(
+                f"{state.path}: search 文本出现了 {count} 次，请加入更多"
+                f"上下文使其唯一，或设置 replace_all: {search.strip()[:80]!r}"
+            )
+            return
+        state.text = state.text.replace(search, replace)
+        added, removed = _changed_lines(search, replace)
+        state.added += added * count
+        state.removed += removed * count
+
+    def commit(self) -> List[Tuple[str, str, int, int]]:
+        """
+        写入所有修改过的文件；有文件写入失败时回滚已写入的文件
+
+        :return: (状态 A/M/D, 路径, 增加行数, 删除行数) 列表
+        :raises PatchError: 存在未通过校验的修改，或写入失败（已回滚）
+        """
+        if self.errors:
+            raise PatchError("\n".join(self.errors))
+        changed = [s for s in self._files.values() if s.changed]
+        # 先写入再删除：删除放在最后，出错时需要恢复的文件更少
+        changed.sort(key=lambda s: s.text is None)
+        done: List[_FileState] = []
+        try:
+            for state in changed:
+                if state.text is None:
+                    os.remove(state.path)
+                else:
+                    os.makedirs(os.path.dirname(state.path), exist_ok=True)
+                    write_atomic(state.path, state.encoded(), state.mode)
+                done.append(state)
+        except OSError as e:
+            failures = self._rollback(done)
+            for restored in changed:
+                content_cache.invalidate(restored.path)
+            notify_changed(*(restored.path for restored in changed))
+            message = f"写入 {state.path} 失败: {e}；已回滚 {len(done)} 个文件"
+            if failures:
+                message += "\n回滚失败: " + "; ".join(failures)
+            raise PatchError(message)
+
+        notify_changed(*(state.path for state in changed))
+        summary = []
+        for state in changed:
+            if state.text is None:
+                content_cache.invalidate(state.path)
+                status = "D"
+            else:
+                content_cache.store(state.path, state.encoded())
+                status = "A" if state.original is None else "M"
+            summary.append((status, state.path, state.added, state.removed))
+        return summary
+
+    @staticmethod
+    def _rollback(done: List[_FileState]) -> List[str]:
+        failures = []
+        for state in reversed(done):
+            try:
+                if state.original is None:
+                    os.remove(state.path)
+                else:
+                    write_atomic(state.path, state.original, state.mode)
+            except OSError as e:
+                failures.append(f"{state.path}: {e}")
+        return failures
@@ -5,6 +5,9 @@ Path management tools for mini-code-agent.
 import os
 from typing import Optional
 
+from .content_cache import content_cache
+from .search_index import notify_changed
+
 
 def create_path(
     base_path: str,
@@ -32,6 +35,8 @@ def create_path(
             with open(target_path, "w", encoding="utf-8") as f:
                 if content:
                     f.write(content)
+            content_cache.store(target_path, (content or "").encode("utf-8"))
+            notify_changed(target_path)
             print(f"✅ 文件已创建: {os.path.abspath(target_path)}")
         else:
             # 创建文件夹
@@ -69,12 +74,17 @@ def edit_path(
             if new_content is not None:
                 with open(path, "w", encoding="utf-8") as f:
                     f.write(new_content)
+                content_cache.store(path, new_content.encode("utf-8"))
+                notify_changed(path)
                 print(f"✅ 文件内容已更新: {path}")
 
             # 修改文件名称
             if new_name:
                 new_path = os.path.join(os.path.dirname(path), new_name)
                 os.rename(path, new_path)
+                content_cache.invalidate(path)
+                content_cache.invalidate(new_path)
+                notify_changed(path, new_path)
                 print(f"✅ 文件已重命名: {new_path}")
                 return os.path.abspath(new_path)
             return os.path.abspath(path)
@@ -84,6 +94,9 @@ def edit_path(
             if new_name:
                 new_path = os.path.join(os.path.dirname(path), new_name)
                 os.rename(path, new_path)
+                content_cache.invalidate(path)
+                content_cache.invalidate(new_path)
+                notify_changed(path, new_path)
                 print(f"✅ 文件夹已重命名: {new_path}")
                 return os.path.abspath(new_path)
             return os.path.abspath(path)
@@ -0,0 +1,119 @@
+"""
+Lexical retrieval tool for mini-code-agent (BM25, fully offline).
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from .bm25_index import get_bm25_index, tokenize
+from .budget import check_cancelled
+from .confine import escapes_root
+from .content_cache import content_cache
+from .patching import is_atomic_temp
+from .search_index import decode_text
+from .settings import ScopedSettings
+
+
+@dataclass
+class RetrievalSettings:
+    """检索工具的设置；Agent 运行时使用根据 Config 生成的副本（见 settings.py）"""
+
+    index_dir: Optional[str] = None
+    chunk_lines: int = 50
+    max_file_bytes: int = 1024 * 1024
+    snippet_lines: int = 6
+    exclude_dirs: Set[str] = field(
+        default_factory=lambda: {
+            ".git",
+            ".idea",
+            "node_modules",
+            "__pycache__",
+            ".venv",
+            "venv",
+        }
+    )
+
+
+_settings = ScopedSettings("retrieval", "检索", RetrievalSettings())
+
+
+def configure_retrieval(**kwargs) -> RetrievalSettings:
+    """
+    修改检索工具的进程级默认设置
+
+    :param kwargs: RetrievalSettings 的字段
+    :return: 更新后的默认设置
+    """
+    return _settings.configure(**kwargs)
+
+
+def _walk_files(root_path: str) -> List[Tuple[str, os.stat_result]]:
+    """按 os.walk 顺序列出文件的绝对路径及 stat 信息"""
+    files = []
+    for dirpath, dirs, filenames in os.walk(root_path):
+        check_cancelled()
+        dirs[:] = [d for d in dirs if d not in _settings.exclude_dirs]
+        for filename in filenames:
+            if is_atomic_temp(filename):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            if escapes_root(path):
+                continue
+            try:
+                files.append((path, os.stat(path)))
+            except OSError:
+                continue
+    return files
+
+
+def _snippet(path: str, start: int, end: int, terms: Set[str]) -> List[str]:
+    """块内命中检索词最多的几行，按行号顺序排列"""
+    try:
+        lines = decode_text(content_cache.read_bytes(path)).split("\n")
+    except OSError:
+        return []
+    numbered = [
+        (i, lines[i - 1]) for i in range(start, min(end, len(lines)) + 1)
+    ]
+    ranked = sorted(
+        numbered,
+        key=lambda item: -sum(1 for t in tokenize(item[1]) if t in terms),
+    )
+    picked = sorted(ranked[:_settings.snippet_lines])
+    return [f"  {i}: {text.strip()[:200]}" for i, text in picked]
+
+
+def retrieve(query: str, root_path: str, k: int = 10) -> List[str]:
+    """
+    按与需求/问题的相关度（BM25 关键词检索）返回工作区中最相关的代码片段，
+    适合在不知道从哪里入手时先定位相关文件。首次调用会建立索引，之后增量更新
+
+    :param query: 需求描述或关键词（标识符、文件名、报错信息等）
+    :param root_path: 工作区根目录
+    :param k: 返回多少个片段（默认 10）
+    :return: 片段列表，每项首行为 "路径:起始行-结束行 (score 得分)"，其后是命中最多的几行
+    """
+    if not os.path.isdir(root_path):
+        return [f"❌ 不是文件夹: {root_path}"]
+
+    index = get_bm25_index(
+        root_path,
+        _settings.chunk_lines,
+        _settings.max_file_bytes,
+        _settings.index_dir,
+    )
+    with index.lock:
+        index.update(_walk_files(root_path))
+        index.save()
+        hits = index.search(query, k)
+
+    terms = set(tokenize(query))
+    result = []
+    for score, chunk in hits:
+        head = f"{chunk.path}:{chunk.start_line}-{chunk.end_line} "
+        lines = _snippet(chunk.path, chunk.start_line, chunk.end_line, terms)
+        result.append("\n".join([f"{head}(score {score:.2f})"] + lines))
+    if not result:
+        result.append(f"没有找到与查询相关的内容: {query}")
+    return result
@@ -0,0 +1,549 @@
+"""
+Persistent trigram index that narrows the candidate files of search_in_files.
+
+索引记录每个文件解码后内容包含的三元组（trigram），并按 mtime/size 增量更新。
+搜索前从正则中提取必然出现的字面量，只有包含其全部三元组的文件才需要
+真正运行正则。
+
+遍历工作区得到的文件列表连同每个目录的 mtime 保存在内存中，重复查询不再
+stat 每个文件，开销只与目录数和匹配数有关：
+- 写工具通过 notify_changed 报告改动的路径，下次查询时重新索引这些文件；
+- 新增、删除和重命名（包括编辑器和 git 的原子保存）会改变所在目录的 mtime，
+  查询时只重新列出这些目录；
+- 其他进程原地改写已有文件不改变目录的 mtime，文件列表超过 refresh_interval
+  秒后完整遍历一次，按文件 mtime/size 校验全部索引（0 表示每次都完整遍历，
+  结果与全量扫描完全一致）。
+
+索引改动后按 SAVE_INTERVAL 节流写回磁盘，进程退出时再写一次。
+"""
+
+import atexit
+import io
+import os
+import stat
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants  # type: ignore[no-redef]
+    import sre_parse  # type: ignore[no-redef]
+
+from .index_store import index_file, load_index, save_index
+
+INDEX_VERSION = 1
+
+# 超过该大小的文件不建立三元组，始终作为候选文件
+MAX_INDEXED_BYTES = 16 * 1024 * 1024
+
+# 三元组种类超过该数量的文件（通常是压缩/生成文件）同样始终作为候选
+MAX_FILE_TRIGRAMS = 100_000
+
+# 读取文件开头多少字节判断是否为二进制文件（二进制文件不建索引）
+BINARY_SNIFF_BYTES = 8192
+
+# 索引有改动时，两次写回磁盘之间至少间隔多少秒
+SAVE_INTERVAL = 30.0
+
+# mtime 距今不足该时长（纳秒）的目录每次查询都重新列出：同一时钟刻度内的
+# 两次改动 mtime 相同，粗粒度的文件系统上这个刻度可达 2 秒
+RACY_MTIME_NS = 2_000_000_000
+
+# (mtime_ns, size, file_id, trigram_count)；file_id 为 -1 表示未建索引，始终作为候选
+FileEntry = Tuple[int, int, int, int]
+
+_EMPTY = array("I")
+
+_REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEAT_OPS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+class DirListing(NamedTuple):
+    """一层目录的内容，文件和子目录均为绝对路径，按遍历顺序排列"""
+
+    path: str
+    mtime_ns: int  # 读取目录项之前取得的目录 mtime
+    files: List[str]
+    subdirs: List[str]
+
+
+class _Listing:
+    """某组 exclude_dirs 下工作区的文件列表，按目录保存"""
+
+    def __init__(self, walked_at: float):
+        self.walked_at = walked_at
+        # 目录 -> (mtime_ns, 文件列表)，按遍历顺序插入
+        self.dirs: Dict[str, Tuple[int, List[str]]] = {}
+
+    def paths(self) -> List[str]:
+        return [path for _, files in self.dirs.values() for path in files]
+
+
+def decode_text(data: bytes, encoding: str = "utf-8") -> str:
+    """
+    按 open(..., errors="ignore") 文本模式的语义解码字节（含换行符转换）
+
+    :param data: 文件原始字节
+    :param encoding: 文件编码
+    :return: 解码后的文本
+    """
+    with io.TextIOWrapper(
+        io.BytesIO(data), encoding=encoding, errors="ignore"
+    ) as f:
+        return f.read()
+
+
+def required_literals(pattern: str) -> List[str]:
+    """
+    提取匹配该正则时必然出现的字面量片段
+
+    对无法确定的结构（分支、字符集、可选重复、忽略大小写等）保守处理，
+    只会少提取，不会多提取。
+
+    :param pattern: 正则表达式
+    :return: 字面量列表（可能为空）
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return []
+
+    literals: List[str] = []
+
+    def _flush(run: List[str]):
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    def _walk(items, run: List[str]):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+            elif op is sre_constants.SUBPATTERN:
+                add_flags = av[1]
+                if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                    _flush(run)
+                    continue
+                _walk(av[-1], run)
+            elif op in _REPEAT_OPS:
+                _flush(run)
+                low, _, body = av
+                if low >= 1:
+                    inner: List[str] = []
+                    _walk(body, inner)
+                    _flush(inner)
+            else:
+                _flush(run)
+
+    run: List[str] = []
+    _walk(parsed, run)
+    _flush(run)
+    return literals
+
+
+def trigrams_of(text: str) -> Set[str]:
+    """
+    计算文本包含的全部三元组
+
+    :param text: 文本
+    :return: 三元组集合
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_trigrams(pattern: str) -> Set[str]:
+    """
+    计算匹配该正则的文件必然包含的三元组
+
+    :param pattern: 正则表达式
+    :return: 三元组集合（为空表示无法缩小范围）
+    """
+    grams: Set[str] = set()
+    for literal in required_literals(pattern):
+        grams |= trigrams_of(literal)
+    return grams
+
+
+class TrigramIndex:
+    """
+    A per-workspace trigram index persisted between processes.
+
+    Each indexed file gets an id; postings map a trigram to the sorted ids of
+    the files that contain it. When a file changes it is re-indexed under a
+    new id and the old id is dropped, so updates only touch changed files.
+
+    Thread-safe: concurrent searches of one workspace share the instance.
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        encoding: str = "utf-8",
+        index_dir: Optional[str] = None,
+    ):
+        """
+        :param root_path: 工作区根目录
+        :param encoding: 建立索引时使用的文件编码
+        :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.encoding = encoding
+        self.path = index_file(
+            "search-index", self.root_path, encoding, base_dir=index_dir
+        )
+        self.files: Dict[str, FileEntry] = {}
+        self.postings: Dict[str, array] = {}
+        self.next_id = 0
+        self.dead_entries = 0
+        self._by_id: Optional[Dict[int, str]] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._saved_at: Optional[float] = None
+        # exclude_dirs -> 遍历到的文件列表，仅保存在内存中
+        self._listings: Dict[FrozenSet[str], _Listing] = {}
+        # 写工具报告改动、尚未重新索引的路径
+        self._changed: Set[str] = set()
+
+        data = load_index(self.path)
+        if (
+            isinstance(data, dict)
+            and data.get("version") == INDEX_VERSION
+            and data.get("encoding") == encoding
+        ):
+            self.files = data["files"]
+            self.postings = data["postings"]
+            self.next_id = data["next_id"]
+            self.dead_entries = data["dead_entries"]
+
+    def update(self, entries: Iterable[Tuple[str, os.stat_result]]):
+        """
+        根据本次遍历得到的文件及其 stat 信息增量更新索引
+
+        :param entries: (文件绝对路径, stat 结果) 序列
+        """
+        with self._lock:
+            seen = set()
+            for path, st in entries:
+                seen.add(path)
+                self._update_file(path, st)
+
+            # 本次未遍历到的条目（例如被 exclude_dirs 排除）仅在文件已删除时清理
+            for path in [p for p in self.files if p not in seen]:
+                if not os.path.exists(path):
+                    self._drop(path)
+            self._maybe_compact()
+
+    def refresh(
+        self,
+        walk: Callable[[], Iterable[DirListing]],
+        scan: Callable[[str], Optional[DirListing]],
+        exclude_dirs: Iterable[str],
+        max_age: float,
+    ) -> List[str]:
+        """
+        返回工作区的文件列表，并保证其中文件的索引是最新的
+
+        max_age 秒内遍历过（相同 exclude_dirs）时复用上次的文件列表：只重新
+        索引 notify_changed 报告的路径，并重新列出 mtime 变化的目录；否则
+        调用 walk 完整遍历并按文件 mtime/size 增量更新。
+
+        :param walk: 完整遍历工作区，按遍历顺序返回每个目录的内容
+        :param scan: 重新列出一个目录；目录无法读取时返回 None
+        :param exclude_dirs: 遍历时排除的目录名
+        :param max_age: 文件列表最多复用多少秒（0 表示每次都遍历）
+        :return: 文件绝对路径列表（按遍历顺序）
+        """
+        key = frozenset(exclude_dirs)
+        with self._lock:
+            self._apply_changes()
+            listing = self._listings.get(key)
+            if (
+                listing is not None
+                and time.monotonic() - listing.walked_at < max_age
+                and self._rescan_changed_dirs(listing, scan)
+            ):
+                return listing.paths()
+
+            listing = _Listing(time.monotonic())
+            for entry in walk():
+                listing.dirs[entry.path] = (entry.mtime_ns, entry.files)
+            self.update(_stat_files(listing.paths()))
+            self._listings[key] = listing
+            return listing.paths()
+
+    def mark_changed(self, path: str):
+        """
+        记录被写工具改动（创建、修改、删除或重命名）的路径
+
+        :param path: 文件或目录的绝对路径
+        """
+        with self._lock:
+            self._changed.add(path)
+
+    def candidates(self, grams: Set[str]) -> Optional[Set[str]]:
+        """
+        返回可能包含全部三元组的文件集合
+
+        :param grams: 必然出现的三元组
+        :return: 候选文件路径集合；None 表示无法缩小范围
+        """
+        if not grams:
+            return None
+        with self._lock:
+            by_id = self._get_by_id()
+            lists = sorted(
+                (self.postings.get(gram, _EMPTY) for gram in grams), key=len
+            )
+            ids = {i for i in lists[0] if i in by_id}
+            for ids_with_gram in lists[1:]:
+                if not ids:
+                    break
+                ids = {i for i in ids if _contains(ids_with_gram, i)}
+
+            result = {by_id[i] for i in ids}
+            result.update(
+                path for path, entry in self.files.items() if entry[2] < 0
+            )
+            return result
+
+    def save(self, force: bool = False):
+        """
+        如有改动则写回磁盘；距上次写入不足 SAVE_INTERVAL 秒时推迟
+
+        :param force: 忽略时间间隔立即写入
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._dirty or (
+                not force
+                and self._saved_at is not None
+                and now - self._saved_at < SAVE_INTERVAL
+            ):
+                return
+            if save_index(
+                self.path,
+                {
+                    "version": INDEX_VERSION,
+                    "encoding": self.encoding,
+                    "files": self.files,
+                    "postings": self.postings,
+                    "next_id": self.next_id,
+                    "dead_entries": self.dead_entries,
+                },
+            ):
+                self._dirty = False
+                self._saved_at = now
+
+    def _apply_changes(self):
+        """重新索引写工具报告改动的文件"""
+        changed, self._changed = self._changed, set()
+        for path in changed:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is not None and stat.S_ISREG(st.st_mode):
+                self._update_file(path, st)
+            elif path in self.files:
+                self._drop(path)
+        # 新增、删除和重命名同时改变所在目录的 mtime，文件列表由
+        # _rescan_changed_dirs 更新
+        self._maybe_compact()
+
+    def _rescan_changed_dirs(
+        self,
+        listing: _Listing,
+        scan: Callable[[str], Optional[DirListing]],
+    ) -> bool:
+        """
+        重新列出 mtime 变化的目录，更新文件列表和其中文件的索引
+
+        :return: False 表示无法增量处理（目录被删除或出现新目录），需要完整遍历
+        """
+        now_ns = time.time_ns()
+        for dir_path, (mtime_ns, files) in list(listing.dirs.items()):
+            try:
+                current = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                return False
+            if current == mtime_ns and now_ns - mtime_ns > RACY_MTIME_NS:
+                continue
+            entry = scan(dir_path)
+            if entry is None or any(
+                subdir not in listing.dirs for subdir in entry.subdirs
+            ):
+                return False
+            listing.dirs[dir_path] = (entry.mtime_ns, entry.files)
+            kept = set(entry.files)
+            for path in files:
+                if path not in kept and path in self.files:
+                    self._drop(path)
+            for path, st in _stat_files(entry.files):
+                self._update_file(path, st)
+        self._maybe_compact()
+        return True
+
+    def _update_file(self, path: str, st: os.stat_result):
+        cached = self.files.get(path)
+        if (
+            cached is not None
+            and cached[0] == st.st_mtime_ns
+            and cached[1] == st.st_size
+        ):
+            return
+        if cached is not None:
+            self._drop(path)
+        self._add(path, st)
+
+    def _maybe_compact(self):
+        live_entries = sum(entry[3] for entry in self.files.values())
+        if self.dead_entries > max(live_entries, 100_000):
+            self._compact()
+
+    def _add(self, path: str, st: os.stat_result):
+        grams = self._read_trigrams(path, st)
+        if grams is None:
+            self.files[path] = (st.st_mtime_ns, st.st_size, -1, 0)
+        else:
+            file_id = self.next_id
+            self.next_id += 1
+            for gram in grams:
+                ids = self.postings.get(gram)
+                if ids is None:
+                    ids = self.postings[gram] = array("I")
+                ids.append(file_id)
+            self.files[path] = (
+                st.st_mtime_ns, st.st_size, file_id, len(grams)
+            )
+        self._mark_dirty()
+
+    def _drop(self, path: str):
+        entry = self.files.pop(path)
+        self.dead_entries += entry[3]
+        self._mark_dirty()
+
+    def _compact(self):
+        """从倒排表中清除已失效的文件 id"""
+        live = {entry[2] for entry in self.files.values() if entry[2] >= 0}
+        postings = {}
+        for gram, ids in self.postings.items():
+            kept = array("I", (i for i in ids if i in live))
+            if kept:
+                postings[gram] = kept
+        self.postings = postings
+        self.dead_entries = 0
+        self._mark_dirty()
+
+    def _read_trigrams(
+        self, path: str, st: os.stat_result
+    ) -> Optional[Set[str]]:
+        if st.st_size > MAX_INDEXED_BYTES:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return None
+        grams = trigrams_of(decode_text(data, self.encoding))
+        if len(grams) > MAX_FILE_TRIGRAMS:
+            return None
+        return grams
+
+    def _mark_dirty(self):
+        self._dirty = True
+        self._by_id = None
+
+    def _get_by_id(self) -> Dict[int, str]:
+        if self._by_id is None:
+            self._by_id = {
+                entry[2]: path
+                for path, entry in self.files.items()
+                if entry[2] >= 0
+            }
+        return self._by_id
+
+
+def _stat_files(
+    paths: Iterable[str],
+) -> List[Tuple[str, os.stat_result]]:
+    """stat 每个文件，跳过无法访问的文件"""
+    entries = []
+    for path in paths:
+        try:
+            entries.append((path, os.stat(path)))
+        except OSError:
+            continue
+    return entries
+
+
+def _contains(sorted_ids: array, file_id: int) -> bool:
+    pos = bisect_left(sorted_ids, file_id)
+    return pos < len(sorted_ids) and sorted_ids[pos] == file_id
+
+
+_open_indexes: Dict[Tuple[str, str, Optional[str]], TrigramIndex] = {}
+_open_lock = threading.Lock()
+
+
+def get_index(
+    root_path: str, encoding: str = "utf-8", index_dir: Optional[str] = None
+) -> TrigramIndex:
+    """
+    获取（并在进程内复用）某个工作区的三元组索引
+
+    :param root_path: 工作区根目录
+    :param encoding: 文件编码
+    :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+    :return: TrigramIndex 实例
+    """
+    key = (os.path.abspath(root_path), encoding, index_dir)
+    with _open_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = TrigramIndex(root_path, encoding, index_dir)
+            _open_indexes[key] = index
+        return index
+
+
+def notify_changed(*paths: str):
+    """
+    写工具改动路径后调用，让已打开的索引在下次查询时重新索引这些路径
+
+    :param paths: 被创建、修改、删除或重命名的文件/目录路径
+    """
+    with _open_lock:
+        indexes = list(_open_indexes.values())
+    for path in paths:
+        path = os.path.abspath(path)
+        for index in indexes:
+            if path.startswith(index.root_path.rstrip(os.sep) + os.sep):
+                index.mark_changed(path)
+
+
+@atexit.register
+def save_open_indexes():
+    """进程退出前写回所有推迟保存的索引"""
+    with _open_lock:
+        indexes = list(_open_indexes.values())
+    for index in indexes:
+        index.save(force=True)
@@ -2,9 +2,301 @@
 Search tools for mini-code-agent.
 """
 
+import asyncio
+import atexit
+import codecs
+import contextvars
+import io
+import mmap
 import os
 import re
-from typing import List, Optional, Set
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .budget import check_cancelled
+from .confine import escapes_root
+from .content_cache import content_cache
+from .patching import is_atomic_temp
+from .search_index import (
+    BINARY_SNIFF_BYTES,
+    DirListing,
+    decode_text,
+    get_index,
+    required_literals,
+    required_trigrams,
+)
+from .settings import ScopedSettings
+
+# 超过该大小的文件在并行引擎中通过 mmap 匹配
+MMAP_THRESHOLD = 1024 * 1024
+
+# 超过该大小的文件在 iter_search_matches 中逐行流式读取，不经过内容缓存
+STREAM_THRESHOLD = 1024 * 1024
+
+
+@dataclass
+class SearchSettings:
+    """搜索工具的设置；Agent 运行时使用根据 Config 生成的副本（见 settings.py）"""
+
+    use_index: bool = True
+    index_dir: Optional[str] = None
+    index_refresh_interval: float = 30.0
+    engine: str = "serial"
+    workers: Optional[int] = None
+    max_file_size: Optional[int] = None
+
+
+class SearchMatch(NamedTuple):
+    """一条行级匹配结果（行号从 1 开始，文本不含换行符）"""
+
+    path: str
+    line_no: int
+    line_text: str
+    before: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()
+
+
+_settings = ScopedSettings("search", "搜索", SearchSettings())
+_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def configure_search(**kwargs) -> SearchSettings:
+    """
+    修改搜索工具的进程级默认设置
+
+    :param kwargs: SearchSettings 的字段
+    :return: 更新后的默认设置
+    """
+    return _settings.configure(**kwargs)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """获取（并复用）指定进程数的进程池"""
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _pools[workers] = pool
+    return pool
+
+
+@atexit.register
+def shutdown_search_pools():
+    """关闭并行搜索使用的进程池"""
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _match_lines(stream, regex: "re.Pattern", encoding: str) -> bool:
+    """
+    逐行解码二进制流并匹配；解码与换行转换和 decode_text 相同，
+    小文件（BytesIO）和大文件（文件对象）走同一条路径
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="ignore")
+    try:
+        return any(regex.search(line) for line in text)
+    finally:
+        # 不关闭底层的流，由调用方负责
+        text.detach()
+
+
+def _scan_file_bytes(
+    file_path: str,
+    regex: "re.Pattern",
+    literals: List[bytes],
+    encoding: str,
+    max_file_size: Optional[int],
+) -> bool:
+    """并行引擎中单个文件的匹配：跳过二进制文件，先按字节查找必需字面量"""
+    try:
+        size = os.path.getsize(file_path)
+        if max_file_size is not None and size > max_file_size:
+            return False
+        with open(file_path, "rb") as f:
+            if b"\0" in f.read(BINARY_SNIFF_BYTES):
+                return False
+            if size == 0:
+                return False
+            if size < MMAP_THRESHOLD:
+                f.seek(0)
+                data = f.read()
+                if not all(lit in data for lit in literals):
+                    return False
+                return _match_lines(io.BytesIO(data), regex, encoding)
+            # 大文件只用 mmap 查找字面量，逐行匹配时流式读取文件
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if not all(mm.find(lit) != -1 for lit in literals):
+                    return False
+            f.seek(0)
+            return _match_lines(f, regex, encoding)
+    except (OSError, ValueError):
+        return False
+
+
+def _literal_bytes(pattern: str, encoding: str) -> List[bytes]:
+    """
+    必需字面量在文件中的字节形式，用于解码前的快速过滤
+
+    :param pattern: 正则表达式
+    :param encoding: 文件编码
+    :return: 字节串列表；无法可靠地按字节查找时为空（不过滤）
+    """
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return []
+    if name in ("utf-16", "utf-32"):
+        # 字节序由文件开头的 BOM 决定，无法预先知道字面量的字节形式
+        return []
+    literals = []
+    for literal in required_literals(pattern):
+        if "\n" in literal or "\r" in literal:
+            continue
+        encoder = codecs.getincrementalencoder(encoding)(errors="strict")
+        # 先编码空串：带 BOM 的编码（如 utf-8-sig）在这里输出 BOM，
+        # 之后编码的字面量不带 BOM
+        encoder.encode("")
+        try:
+            literals.append(encoder.encode(literal, final=True))
+        except UnicodeEncodeError:
+            continue
+    return literals
+
+
+def _scan_chunk(
+    paths: List[str],
+    pattern: str,
+    encoding: str,
+    max_file_size: Optional[int],
+) -> List[str]:
+    """进程池任务：返回一批文件中匹配的文件"""
+    regex = re.compile(pattern)
+    literals = _literal_bytes(pattern, encoding)
+    return [
+        path
+        for path in paths
+        if _scan_file_bytes(path, regex, literals, encoding, max_file_size)
+    ]
+
+
+def _search_parallel(
+    paths: List[str], pattern: str, encoding: str, workers: int
+) -> List[str]:
+    """把候选文件分批交给进程池匹配，结果保持原有顺序"""
+    if not paths:
+        return []
+    chunk_size = max(1, min(256, len(paths) // (workers * 8) or 1))
+    chunks = [
+        paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)
+    ]
+    max_file_size = _settings.max_file_size
+    pool = _get_pool(workers)
+    result = []
+    for matched in pool.map(
+        _scan_chunk,
+        chunks,
+        [pattern] * len(chunks),
+        [encoding] * len(chunks),
+        [max_file_size] * len(chunks),
+    ):
+        check_cancelled()
+        result.extend(matched)
+    return result
+
+
+def _scan_dir(dir_path: str, exclude_dirs: Set[str]) -> Optional[DirListing]:
+    """
+    列出一层目录；与 os.walk 相同，不进入被排除的目录和符号链接目录
+
+    先取目录的 mtime 再读取目录项，此后的改动一定会让 mtime 变化
+
+    :return: 目录内容；目录无法读取时为 None
+    """
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+    except OSError:
+        return None
+    files, subdirs = [], []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            if entry.name not in exclude_dirs and not entry.is_symlink():
+                subdirs.append(os.path.abspath(entry.path))
+            continue
+        if is_atomic_temp(entry.name):
+            # 其他线程正在原子写入的临时文件
+            continue
+        path = os.path.abspath(entry.path)
+        if escapes_root(path):
+            continue
+        files.append(path)
+    return DirListing(os.path.abspath(dir_path), mtime_ns, files, subdirs)
+
+
+def _walk_dirs(root_path: str, exclude_dirs: Set[str]) -> Iterator[DirListing]:
+    """按 os.walk 的顺序（自顶向下、深度优先）逐个产出目录的内容"""
+    stack = [os.path.abspath(root_path)]
+    while stack:
+        check_cancelled()
+        entry = _scan_dir(stack.pop(), exclude_dirs)
+        if entry is None:
+            continue
+        yield entry
+        stack.extend(reversed(entry.subdirs))
+
+
+def _walk_paths(root_path: str, exclude_dirs: Set[str]) -> Iterator[str]:
+    """按 os.walk 顺序逐个产出文件的绝对路径"""
+    for entry in _walk_dirs(root_path, exclude_dirs):
+        yield from entry.files
+
+
+def _candidate_files(
+    root_path: str, pattern: str, encoding: str, exclude_dirs: Set[str]
+) -> Iterator[str]:
+    """列出需要运行正则的文件，启用索引时先用三元组缩小范围"""
+    if not _settings.use_index:
+        return _walk_paths(root_path, exclude_dirs)
+
+    index = get_index(root_path, encoding, _settings.index_dir)
+    files = index.refresh(
+        lambda: _walk_dirs(root_path, exclude_dirs),
+        lambda dir_path: _scan_dir(dir_path, exclude_dirs),
+        exclude_dirs,
+        _settings.index_refresh_interval,
+    )
+    index.save()
+    candidates = index.candidates(required_trigrams(pattern))
+    if candidates is None:
+        return iter(files)
+    return iter([path for path in files if path in candidates])
+
+
+def _check_root(root_path: str) -> bool:
+    if not os.path.exists(root_path):
+        print(f"❌ 路径不存在: {root_path}")
+        return False
+    if not os.path.isdir(root_path):
+        print(f"❌ 不是文件夹: {root_path}")
+        return False
+    return True
 
 
 def search_in_files(
@@ -12,6 +304,7 @@ def search_in_files(
     pattern: str,
     encoding: str = "utf-8",
     exclude_dirs: Optional[Set[str]] = None,
+    engine: Optional[str] = None,
 ) -> List[str]:
     """
     在指定文件夹下搜索包含指定正则内容的文件，返回文件绝对路径列表
@@ -20,36 +313,228 @@ def search_in_files(
     :param pattern: 正则表达式
     :param encoding: 文件编码（默认 utf-8）
     :param exclude_dirs: 要忽略的目录名集合（默认忽略 .idea 和 node_modules 提高检索速度）
+    :param engine: 搜索引擎 'serial' 单线程 / 'parallel' 多进程并跳过二进制文件（默认取配置）
     :return: 匹配到的文件路径列表
     """
     if exclude_dirs is None:
         exclude_dirs = {".idea", "node_modules"}
 
-    if not os.path.exists(root_path):
-        print(f"❌ 路径不存在: {root_path}")
+    if not _check_root(root_path):
         return []
-    if not os.path.isdir(root_path):
-        print(f"❌ 不是文件夹: {root_path}")
+
+    engine = engine or _settings.engine
+    if engine not in ("serial", "parallel"):
+        print(f"❌ 不支持的搜索引擎: {engine}")
         return []
 
     regex = re.compile(pattern)
-    result = []
+    candidates = _candidate_files(root_path, pattern, encoding, exclude_dirs)
 
-    for dirpath, dirs, files in os.walk(root_path):
-        # 排除指定目录
-        dirs[:] = [d for d in dirs if d not in exclude_dirs]
+    if engine == "parallel":
+        workers = _settings.workers or os.cpu_count() or 1
+        return _search_parallel(list(candidates), pattern, encoding, workers)
 
-        for filename in files:
-            file_path = os.path.join(dirpath, filename)
+    max_file_size = _settings.max_file_size
+    result = []
+    for file_path in candidates:
+        check_cancelled()
+        if max_file_size is not None:
             try:
-                with open(
-                    file_path, "r", encoding=encoding, errors="ignore"
-                ) as f:
-                    for line in f:
-                        if regex.search(line):
-                            result.append(os.path.abspath(file_path))
-                            break
-            except (OSError, UnicodeDecodeError):
+                if os.path.getsize(file_path) > max_file_size:
+                    continue
+            except OSError:
+                continue
+        try:
+            if content_cache.cacheable(os.path.getsize(file_path)):
+                data = content_cache.read_bytes(file_path)
+                lines = io.StringIO(decode_text(data, encoding))
+                if any(regex.search(line) for line in lines):
+                    result.append(file_path)
                 continue
+            with open(file_path, "r", encoding=encoding, errors="ignore") as f:
+                for line in f:
+                    if regex.search(line):
+                        result.append(file_path)
+                        break
+        except (OSError, UnicodeDecodeError):
+            continue
+
+    return result
 
+
+def iter_search_matches(
+    root_path: str,
+    pattern: str,
+    encoding: str = "utf-8",
+    exclude_dirs: Optional[Set[str]] = None,
+    max_results: Optional[int] = None,
+    max_matches_per_file: Optional[int] = None,
+    context_lines: int = 0,
+) -> Iterator[SearchMatch]:
+    """
+    边搜索边逐条产出行级匹配结果，达到数量上限后立即停止扫描
+
+    二进制文件（开头包含 NUL 字节）会被跳过。
+
+    :param root_path: 搜索的根目录
+    :param pattern: 正则表达式
+    :param encoding: 文件编码（默认 utf-8）
+    :param exclude_dirs: 要忽略的目录名集合（默认忽略 .idea 和 node_modules）
+    :param max_results: 最多产出多少条匹配（默认不限）
+    :param max_matches_per_file: 每个文件最多产出多少条匹配（默认不限）
+    :param context_lines: 每条匹配附带的前后上下文行数
+    :return: SearchMatch 迭代器
+    """
+    if exclude_dirs is None:
+        exclude_dirs = {".idea", "node_modules"}
+    if not _check_root(root_path):
+        return
+
+    regex = re.compile(pattern)
+    max_file_size = _settings.max_file_size
+    produced = 0
+
+    for file_path in _candidate_files(
+        root_path, pattern, encoding, exclude_dirs
+    ):
+        check_cancelled()
+        limit = max_matches_per_file
+        if max_results is not None:
+            remaining = max_results - produced
+            limit = remaining if limit is None else min(limit, remaining)
+        try:
+            size = os.path.getsize(file_path)
+            if max_file_size is not None and size > max_file_size:
+                continue
+            lines = _read_lines(file_path, size, encoding)
+            try:
+                for match in _file_matches(
+                    file_path, lines, regex, limit, context_lines
+                ):
+                    yield match
+                    produced += 1
+            finally:
+                # 提前停止时立即关闭文件
+                lines.close()
+        except OSError:
+            continue
+        if max_results is not None and produced >= max_results:
+            return
+
+
+def _read_lines(file_path: str, size: int, encoding: str) -> Iterator[str]:
+    """
+    逐行产出文件文本（保留换行符），二进制文件不产出任何行
+
+    小文件经内容缓存读取；大文件流式读取且不放入缓存，
+    调用方停止迭代后不会再读取剩余部分
+    """
+    if size < STREAM_THRESHOLD and content_cache.cacheable(size):
+        data = content_cache.read_bytes(file_path)
+        if b"\0" not in data[:BINARY_SNIFF_BYTES]:
+            yield from io.StringIO(decode_text(data, encoding))
+        return
+    with open(file_path, "rb") as f:
+        if b"\0" in f.read(BINARY_SNIFF_BYTES):
+            return
+        f.seek(0)
+        yield from io.TextIOWrapper(f, encoding=encoding, errors="ignore")
+
+
+def _file_matches(
+    file_path: str,
+    lines: Iterator[str],
+    regex: "re.Pattern",
+    limit: Optional[int],
+    context_lines: int,
+) -> Iterator[SearchMatch]:
+    """
+    逐行匹配一个文件，找到 limit 条匹配（及其后文）后立即停止读取
+
+    lines 为保留行尾换行符的文本行，与逐行读取文件的匹配语义一致
+    """
+    before: Deque[str] = deque(maxlen=context_lines)
+    # 等待后文的匹配：(行号, 行内容, 前文, 已收集的后文)
+    pending: Deque[Tuple[int, str, Tuple[str, ...], List[str]]] = deque()
+    found = 0
+    for line_no, raw in enumerate(lines, start=1):
+        text = raw[:-1] if raw.endswith("\n") else raw
+        for _, _, _, after in pending:
+            after.append(text)
+        if (limit is None or found < limit) and regex.search(raw):
+            found += 1
+            pending.append((line_no, text, tuple(before), []))
+        while pending and len(pending[0][3]) >= context_lines:
+            no, line, prev, after = pending.popleft()
+            yield SearchMatch(file_path, no, line, prev, tuple(after))
+        if limit is not None and found >= limit and not pending:
+            return
+        before.append(text)
+    for no, line, prev, after in pending:
+        yield SearchMatch(file_path, no, line, prev, tuple(after))
+
+
+async def aiter_search_matches(
+    root_path: str, pattern: str, **kwargs
+) -> AsyncIterator[SearchMatch]:
+    """
+    iter_search_matches 的异步版本，在线程池中扫描，不阻塞事件循环
+
+    :param root_path: 搜索的根目录
+    :param pattern: 正则表达式
+    :param kwargs: 其余参数同 iter_search_matches
+    :return: SearchMatch 异步迭代器
+    """
+    loop = asyncio.get_running_loop()
+    matches = iter_search_matches(root_path, pattern, **kwargs)
+    done = object()
+    # run_in_executor 不传递 contextvars，生成器在调用方上下文的副本中推进
+    context = contextvars.copy_context()
+    try:
+        while True:
+            match = await loop.run_in_executor(
+                None, context.run, next, matches, done
+            )
+            if match is done:
+                return
+            yield match
+    finally:
+        matches.close()
+
+
+def search_matches(
+    root_path: str,
+    pattern: str,
+    max_results: int = 50,
+    max_matches_per_file: int = 5,
+    context_lines: int = 0,
+    encoding: str = "utf-8",
+) -> List[str]:
+    """
+    在指定文件夹下搜索正则，直接返回匹配的行（无需再读取整个文件）
+    每条结果格式为 "路径:行号: 行内容"，上下文行格式为 "路径-行号- 行内容"
+
+    :param root_path: 搜索的根目录
+    :param pattern: 正则表达式
+    :param max_results: 最多返回多少条匹配（默认 50，够用即停止搜索）
+    :param max_matches_per_file: 每个文件最多返回多少条匹配（默认 5）
+    :param context_lines: 每条匹配附带的前后上下文行数（默认 0）
+    :param encoding: 文件编码（默认 utf-8）
+    :return: 匹配行列表
+    """
+    result = []
+    for match in iter_search_matches(
+        root_path,
+        pattern,
+        encoding=encoding,
+        max_results=max_results,
+        max_matches_per_file=max_matches_per_file,
+        context_lines=context_lines,
+    ):
+        first = match.line_no - len(match.before)
+        for offset, text in enumerate(match.before):
+            result.append(f"{match.path}-{first + offset}- {text}")
+        result.append(f"{match.path}:{match.line_no}: {match.line_text}")
+        for offset, text in enumerate(match.after, start=1):
+            result.append(f"{match.path}-{match.line_no + offset}- {text}")
     return result
@@ -0,0 +1,117 @@
+"""
+Process defaults and per-context overrides of tool settings.
+
+每个工具模块的设置保存在一个 ScopedSettings 中：configure_* 修改进程级默认值；
+Agent 运行时用 use_tool_settings 在当前上下文（contextvars）中换上自己的一份，
+因此同一进程中并发运行、配置不同的多个 Agent 互不影响。工具在其他线程中
+执行时，需要用 contextvars.copy_context() 把调用方的上下文带过去。
+"""
+
+import contextvars
+import dataclasses
+from contextlib import contextmanager
+from typing import Any, Dict, Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_registry: Dict[str, "ScopedSettings"] = {}
+
+
+class ScopedSettings(Generic[T]):
+    """
+    A settings dataclass whose attributes resolve to the copy installed in
+    the current context, falling back to the process defaults.
+    """
+
+    def __init__(self, section: str, label: str, defaults: T):
+        """
+        :param section: 分区名（与 Config 中的分区对应，如 "search"）
+        :param label: 错误信息中的名称（如 "搜索"）
+        :param defaults: 进程级默认设置
+        """
+        object.__setattr__(self, "section", section)
+        object.__setattr__(self, "label", label)
+        object.__setattr__(self, "defaults", defaults)
+        object.__setattr__(
+            self, "_var", contextvars.ContextVar(f"{section}_settings")
+        )
+        _registry[section] = self
+
+    def current(self) -> T:
+        """当前上下文生效的设置"""
+        return self._var.get(self.defaults)
+
+    def derive(self, **kwargs) -> T:
+        """
+        以进程级默认值为基础，生成一份修改了部分字段的设置
+
+        :param kwargs: 设置字段
+        :return: 新的设置对象（不影响默认值）
+        :raises ValueError: 存在未知字段
+        """
+        self._check(kwargs)
+        return dataclasses.replace(self.defaults, **kwargs)
+
+    def configure(self, **kwargs) -> T:
+        """
+        修改进程级默认设置
+
+        :param kwargs: 设置字段
+        :return: 更新后的默认设置
+        :raises ValueError: 存在未知字段
+        """
+        self._check(kwargs)
+        for key, value in kwargs.items():
+            setattr(self.defaults, key, value)
+        return self.defaults
+
+    def _check(self, kwargs: Dict[str, Any]):
+        names = {field.name for field in dataclasses.fields(self.defaults)}
+        for key in kwargs:
+            if key not in names:
+                raise ValueError(f"未知的{self.label}设置: {key}")
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.current(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(
+            f"{self.section} 设置请通过 configure_* 或 use_tool_settings 修改"
+        )
+
+
+def derive_tool_settings(**sections: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    根据各分区的字段生成一组工具设置（供 use_tool_settings 使用）
+
+    :param sections: 分区名 -> 要修改的字段
+    :return: 分区名 -> 设置对象
+    :raises ValueError: 未知的分区或字段
+    """
+    result = {}
+    for section, kwargs in sections.items():
+        scoped = _registry.get(section)
+        if scoped is None:
+            raise ValueError(f"未知的工具设置分区: {section}")
+        result[section] = scoped.derive(**kwargs)
+    return result
+
+
+@contextmanager
+def use_tool_settings(settings: Dict[str, Any]) -> Iterator[None]:
+    """
+    在当前上下文中使用给定的工具设置，退出时恢复
+
+    :param settings: derive_tool_settings 的结果
+    """
+    tokens = [
+        (_registry[section], _registry[section]._var.set(value))
+        for section, value in settings.items()
+    ]
+    try:
+        yield
+    finally:
+        for scoped, token in reversed(tokens):
+            scoped._var.reset(token)
@@ -0,0 +1,305 @@
+"""
+Persistent symbol index of the Python files in a workspace.
+
+用 ast 解析 .py 文件，记录类、函数、方法、模块级/类级变量和导入及其起止行号。
+索引按需填充：查询时只解析包含该名称的文件（候选文件由 search_in_files 的
+三元组索引给出），结果按 mtime/size 缓存并持久化，文件改动后自动重新解析。
+"""
+
+import ast
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .content_cache import content_cache
+from .index_store import index_file, load_index, save_index
+from .search_index import decode_text
+
+INDEX_VERSION = 1
+
+# 超过该大小的文件不解析（通常是生成代码）
+MAX_PARSED_BYTES = 4 * 1024 * 1024
+
+# Python 3.11 的 ast.parse 在多线程并发时可能抛出
+# "AST constructor recursion depth mismatch"，解析时统一加锁
+_parse_lock = threading.Lock()
+
+# 可能包含嵌套语句的字段（if/for/while/try/with/match 等）
+_BLOCK_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+class Symbol(NamedTuple):
+    """一个定义或导入（行号从 1 开始）"""
+
+    name: str
+    qualname: str
+    kind: str  # class | function | method | variable | import
+    line: int
+    end_line: int
+    detail: str = ""
+    is_async: bool = False
+
+    def label(self, qualified: bool = True) -> str:
+        """如 "async method Agent.astream(self, ...)" """
+        prefix = "async " if self.is_async else ""
+        name = self.qualname if qualified else self.name
+        return f"{prefix}{self.kind} {name}{self.detail}"
+
+
+class FileSymbols(NamedTuple):
+    """一个文件的解析结果；error 不为空时表示无法解析"""
+
+    mtime_ns: int
+    size: int
+    symbols: Tuple[Symbol, ...]
+    error: Optional[str] = None
+
+
+def parse_module(source: str, filename: str = "<unknown>") -> ast.Module:
+    """
+    解析 Python 源码（线程安全）
+
+    :param source: 源码
+    :param filename: 文件名（用于错误信息）
+    :return: 语法树
+    :raises SyntaxError: 源码无法解析
+    """
+    with _parse_lock:
+        return ast.parse(source, filename)
+
+
+def _signature(node) -> str:
+    """函数参数与返回值注解的源码形式"""
+    text = f"({ast.unparse(node.args)})"
+    if node.returns is not None:
+        text += f" -> {ast.unparse(node.returns)}"
+    return text
+
+
+def _collect(
+    body: Iterable[ast.AST],
+    scope: Tuple[Tuple[str, str], ...],
+    symbols: List[Symbol],
+):
+    """只遍历语句（不进入表达式），收集定义；scope 为 (名称, 类型) 链"""
+    at_top = all(kind == "class" for _, kind in scope)
+    in_class = bool(scope) and scope[-1][1] == "class"
+    prefix = "".join(f"{name}." for name, _ in scope)
+
+    def _add(node, name: str, kind: str, detail: str = "", **extra):
+        symbols.append(
+            Symbol(
+                name=name,
+                qualname=prefix + name,
+                kind=kind,
+                line=node.lineno,
+                end_line=node.end_lineno or node.lineno,
+                detail=detail,
+                **extra,
+            )
+        )
+
+    for node in body:
+        if isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            _add(node, node.name, "class", f"({bases})" if bases else "")
+            _collect(node.body, scope + ((node.name, "class"),), symbols)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            _add(
+                node,
+                node.name,
+                "method" if in_class else "function",
+                _signature(node),
+                is_async=isinstance(node, ast.AsyncFunctionDef),
+            )
+            _collect(node.body, scope + ((node.name, "function"),), symbols)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            # 只记录模块级和类级的变量，函数内的局部变量不算定义
+            targets = (
+                node.targets if isinstance(node, ast.Assign)
+                else [node.target]
+            )
+            if at_top:
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        _add(node, target.id, "variable")
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                text = f"import {alias.name}"
+                if alias.asname:
+                    text += f" as {alias.asname}"
+                bound = alias.asname or alias.name.split(".")[0]
+                _add(node, bound, "import", text)
+        elif isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            for alias in node.names:
+                text = f"from {module} import {alias.name}"
+                if alias.asname:
+                    text += f" as {alias.asname}"
+                _add(node, alias.asname or alias.name, "import", text)
+        else:
+            for field in _BLOCK_FIELDS:
+                children = getattr(node, field, None)
+                if children:
+                    _collect(children, scope, symbols)
+
+
+def module_symbols(tree: ast.Module) -> List[Symbol]:
+    """
+    列出模块中的定义和导入
+
+    :param tree: parse_module 的结果
+    :return: 按出现顺序排列的 Symbol 列表
+    """
+    symbols: List[Symbol] = []
+    _collect(tree.body, (), symbols)
+    return symbols
+
+
+def reference_lines(tree: ast.Module, name: str) -> Set[int]:
+    """
+    标识符在模块中出现的行号：名称读写、属性访问（obj.name）和导入
+
+    :param tree: parse_module 的结果
+    :param name: 标识符
+    :return: 行号集合（不含 def/class 语句本身）
+    """
+    lines = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id == name:
+                lines.add(node.lineno)
+        elif isinstance(node, ast.Attribute):
+            if node.attr == name:
+                lines.add(node.end_lineno or node.lineno)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if name in (alias.asname, alias.name.split(".")[-1]):
+                    lines.add(node.lineno)
+    return lines
+
+
+def read_source(path: str) -> str:
+    """通过共享的内容缓存读取并解码源码文件"""
+    return decode_text(content_cache.read_bytes(path))
+
+
+def _read_file_symbols(path: str, st: os.stat_result) -> FileSymbols:
+    if st.st_size > MAX_PARSED_BYTES:
+        error = f"file larger than {MAX_PARSED_BYTES} bytes"
+        return FileSymbols(st.st_mtime_ns, st.st_size, (), error)
+    try:
+        tree = parse_module(read_source(path), path)
+    except (OSError, SyntaxError, ValueError) as e:
+        error = f"{type(e).__name__}: {e}"
+        return FileSymbols(st.st_mtime_ns, st.st_size, (), error)
+    return FileSymbols(
+        st.st_mtime_ns, st.st_size, tuple(module_symbols(tree))
+    )
+
+
+class SymbolIndex:
+    """
+    Cached definitions of the .py files of a workspace, persisted between
+    processes. Files are parsed when a query first needs them and again
+    only after their mtime or size changed.
+    """
+
+    def __init__(self, root_path: str, index_dir: Optional[str] = None):
+        """
+        :param root_path: 工作区根目录
+        :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.path = index_file(
+            "symbol-index", self.root_path, base_dir=index_dir
+        )
+        self.files: Dict[str, FileSymbols] = {}
+        self.lock = threading.Lock()
+        self._dirty = False
+
+        data = load_index(self.path)
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            self.files = data["files"]
+
+    def symbols(self, path: str) -> Tuple[Symbol, ...]:
+        """
+        某个文件的定义，文件改动过时重新解析
+
+        :param path: 文件绝对路径
+        :return: Symbol 元组（文件不存在或无法解析时为空）
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            if self.files.pop(path, None) is not None:
+                self._dirty = True
+            return ()
+        cached = self.files.get(path)
+        if (
+            cached is None
+            or cached.mtime_ns != st.st_mtime_ns
+            or cached.size != st.st_size
+        ):
+            cached = self.files[path] = _read_file_symbols(path, st)
+            self._dirty = True
+        return cached.symbols
+
+    def definitions(
+        self, paths: Iterable[str], name: str
+    ) -> List[Tuple[str, Symbol]]:
+        """
+        在给定文件中按名称查找定义；名称含 "." 时按限定名后缀匹配
+        （如 "Agent.run"）
+
+        :param paths: 候选文件绝对路径
+        :param name: 名称或限定名
+        :return: (文件路径, Symbol) 列表，按文件和行号排序
+        """
+        last = name.rsplit(".", 1)[-1]
+        result = []
+        for path in sorted(paths):
+            for symbol in self.symbols(path):
+                if symbol.name != last:
+                    continue
+                if "." in name and not (
+                    symbol.qualname == name
+                    or symbol.qualname.endswith("." + name)
+                ):
+                    continue
+                result.append((path, symbol))
+        return result
+
+    def save(self):
+        """如有改动则写回磁盘（顺便清理已删除文件的条目）"""
+        if not self._dirty:
+            return
+        for path in [p for p in self.files if not os.path.exists(p)]:
+            del self.files[path]
+        if save_index(
+            self.path, {"version": INDEX_VERSION, "files": self.files}
+        ):
+            self._dirty = False
+
+
+_open_indexes: Dict[Tuple[str, Optional[str]], SymbolIndex] = {}
+_open_lock = threading.Lock()
+
+
+def get_symbol_index(
+    root_path: str, index_dir: Optional[str] = None
+) -> SymbolIndex:
+    """
+    获取（并在进程内复用）某个工作区的符号索引
+
+    :param root_path: 工作区根目录
+    :param index_dir: 缓存根目录（默认 ~/.mini-code-agent/cache）
+    :return: SymbolIndex 实例
+    """
+    key = (os.path.abspath(root_path), index_dir)
+    with _open_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = SymbolIndex(root_path, index_dir)
+            _open_indexes[key] = index
+    return index
@@ -0,0 +1,182 @@
+"""
+Symbol lookup tools for mini-code-agent (Python workspaces).
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from .search_tools import iter_search_matches, search_in_files
+from .settings import ScopedSettings
+from .symbol_index import (
+    Symbol,
+    get_symbol_index,
+    module_symbols,
+    parse_module,
+    read_source,
+    reference_lines,
+)
+
+SYMBOL_KINDS = ("class", "function", "method", "variable", "import")
+
+
+@dataclass
+class SymbolSettings:
+    """符号工具的设置；Agent 运行时使用根据 Config 生成的副本（见 settings.py）"""
+
+    index_dir: Optional[str] = None
+    exclude_dirs: Set[str] = field(
+        default_factory=lambda: {
+            ".git",
+            ".idea",
+            "node_modules",
+            "__pycache__",
+            ".venv",
+            "venv",
+        }
+    )
+
+
+_settings = ScopedSettings("symbols", "符号", SymbolSettings())
+
+
+def configure_symbols(**kwargs) -> SymbolSettings:
+    """
+    修改符号工具的进程级默认设置
+
+    :param kwargs: SymbolSettings 的字段
+    :return: 更新后的默认设置
+    """
+    return _settings.configure(**kwargs)
+
+
+def _word_pattern(name: str) -> str:
+    return rf"\b{re.escape(name)}\b"
+
+
+def _format(path: str, symbol: Symbol) -> str:
+    if symbol.kind == "import":
+        return f"{path}:{symbol.line}: {symbol.detail}"
+    return f"{path}:{symbol.line}-{symbol.end_line}: {symbol.label()}"
+
+
+def find_symbol(
+    root_path: str,
+    name: str,
+    kind: Optional[str] = None,
+    include_imports: bool = False,
+) -> List[str]:
+    """
+    在工作区的 Python 文件中查找符号的定义位置（基于 ast 的符号索引）
+    每条结果格式为 "路径:起始行-结束行: 类型 限定名(参数)"，可直接用
+    read_file 的 start_line/end_line 读取该定义
+
+    :param root_path: 工作区根目录
+    :param name: 符号名（如 "run"），或限定名（如 "Agent.run"）
+    :param kind: 只返回该类型：class / function / method / variable / import
+    :param include_imports: 是否同时返回导入该名称的位置（默认否）
+    :return: 定义位置列表
+    """
+    if not os.path.isdir(root_path):
+        return [f"❌ 不是文件夹: {root_path}"]
+    if kind is not None and kind not in SYMBOL_KINDS:
+        return [f"❌ 未知的符号类型: {kind}（可选 {', '.join(SYMBOL_KINDS)}）"]
+
+    # 先用（带三元组索引的）文本搜索找出提到该名称的文件，只解析这些文件
+    last = name.rsplit(".", 1)[-1]
+    paths = [
+        path
+        for path in search_in_files(
+            root_path,
+            _word_pattern(last),
+            exclude_dirs=_settings.exclude_dirs,
+        )
+        if path.endswith(".py")
+    ]
+    index = get_symbol_index(root_path, _settings.index_dir)
+    with index.lock:
+        matches = index.definitions(paths, name)
+        index.save()
+    return [
+        _format(path, symbol)
+        for path, symbol in matches
+        if (kind is None or symbol.kind == kind)
+        and (include_imports or kind == "import" or symbol.kind != "import")
+    ]
+
+
+def find_references(
+    root_path: str, name: str, max_results: int = 100
+) -> List[str]:
+    """
+    在工作区的 Python 文件中查找标识符被使用的位置（变量、函数调用、属性访问、导入），
+    不含字符串和注释中的同名文本。每条结果格式为 "路径:行号: 行内容"
+
+    :param root_path: 工作区根目录
+    :param name: 标识符（不含模块或类前缀，如 "run"）
+    :param max_results: 最多返回多少条（默认 100）
+    :return: 引用位置列表
+    """
+    if not os.path.isdir(root_path):
+        return [f"❌ 不是文件夹: {root_path}"]
+    name = name.rsplit(".", 1)[-1]
+
+    result = []
+    current, lines = None, set()
+    for match in iter_search_matches(
+        root_path, _word_pattern(name), exclude_dirs=_settings.exclude_dirs
+    ):
+        if not match.path.endswith(".py"):
+            continue
+        if match.path != current:
+            current = match.path
+            try:
+                tree = parse_module(read_source(current), current)
+                lines = reference_lines(tree, name)
+            except (OSError, SyntaxError, ValueError):
+                lines = set()
+        if match.line_no not in lines:
+            continue
+        if len(result) >= max_results:
+            result.append(f"...（已达到 {max_results} 条上限，请缩小范围）")
+            break
+        text = match.line_text.strip()
+        result.append(f"{match.path}:{match.line_no}: {text}")
+    return result
+
+
+def file_outline(file_path: str, include_imports: bool = False) -> str:
+    """
+    列出 Python 文件的结构：类、函数、方法和模块级变量及其行号范围，
+    比读取整个文件省得多。每行格式为 "起始行-结束行 类型 名称(参数)"
+
+    :param file_path: Python 文件路径
+    :param include_imports: 是否列出导入语句（默认否）
+    :return: 文件结构
+    """
+    try:
+        source = read_source(file_path)
+    except FileNotFoundError:
+        return f"❌ 文件未找到: {file_path}"
+    except OSError as e:
+        return f"❌ 读取文件时出错: {e}"
+    try:
+        symbols = module_symbols(parse_module(source, file_path))
+    except (SyntaxError, ValueError) as e:
+        return f"❌ 无法解析 Python 文件: {file_path} ({e})"
+
+    line_count = source.count("\n") + (0 if source.endswith("\n") else 1)
+    lines = [f"{file_path} ({line_count} 行)"]
+    for symbol in symbols:
+        if symbol.kind == "import" and not include_imports:
+            continue
+        depth = symbol.qualname.count(".")
+        if symbol.kind == "import":
+            label = symbol.detail
+        else:
+            label = symbol.label(qualified=False)
+        lines.append(
+            f"{'  ' * depth}{symbol.line}-{symbol.end_line} {label}"
+        )
+    return "\n".join(lines)
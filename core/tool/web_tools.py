@@ -3,73 +3,234 @@ Web interaction tools for mini-code-agent.
 """
 
 import asyncio
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+from .browser_pool import get_browser_pool
+from .disk_cache import DiskCache
+from .html_extract import extract_content
+from .settings import ScopedSettings
 
-async def fetch_website_html(url: str, wait: int = 3) -> str:
+DEFAULT_CACHE_DIR = Path.home() / ".mini-code-agent" / "cache" / "web"
+
+
+@dataclass
+class WebSettings:
+    """网页工具的设置；Agent 运行时使用根据 Config 生成的副本（见 settings.py）"""
+
+    cache_enabled: bool = True
+    cache_ttl: int = 24 * 3600
+    cache_max_bytes: int = 256 * 1024 * 1024
+    cache_dir: Optional[str] = None
+    max_output_chars: Optional[int] = 20000
+
+
+_settings = ScopedSettings("web", "网页工具", WebSettings())
+# (缓存目录, 大小上限) -> DiskCache；不同 Agent 可以使用不同的缓存目录
+_caches: Dict[Tuple[str, int], DiskCache] = {}
+_caches_lock = threading.Lock()
+_refreshing: set = set()
+_refreshing_lock = threading.Lock()
+# 后台刷新结果的写盘线程（不占用浏览器的事件循环线程）
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+
+def configure_web(**kwargs) -> WebSettings:
+    """
+    修改网页工具的进程级默认设置
+
+    :param kwargs: WebSettings 的字段
+    :return: 更新后的默认设置
+    """
+    return _settings.configure(**kwargs)
+
+
+def get_web_cache() -> Optional[DiskCache]:
+    """
+    获取当前设置对应的网页响应磁盘缓存（未启用时返回 None）
+
+    :return: DiskCache 实例
+    """
+    if not _settings.cache_enabled:
+        return None
+    key = (
+        _settings.cache_dir or str(DEFAULT_CACHE_DIR),
+        _settings.cache_max_bytes,
+    )
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = DiskCache(*key)
+        return cache
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化 URL 作为缓存键：协议和主机小写、去掉默认端口和锚点、查询参数排序
+
+    :param url: 原始 URL
+    :return: 规范化后的 URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(":")
+    if (scheme, port) in (("http", "80"), ("https", "443")):
+        netloc = host
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def _refresh(key: str, render: Callable[[Any], Awaitable[Any]], cache):
+    """在浏览器池后台重新抓取过期条目（同一个键同时只刷新一次）"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def _store(future):
+        try:
+            if not future.cancelled() and future.exception() is None:
+                cache.set(key, future.result())
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    def _done(future):
+        # 回调在浏览器的事件循环线程中执行：写盘交给写入线程，
+        # 以免阻塞同一循环上其他页面的渲染
+        try:
+            _get_writer().submit(_store, future)
+        except RuntimeError:
+            # 解释器退出时写入线程已关闭，放弃这次刷新
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    get_browser_pool().submit(render).add_done_callback(_done)
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="web-cache-write"
+            )
+        return _writer
+
+
+async def _cached_render(
+    key: str, render: Callable[[Any], Awaitable[Any]], use_cache: bool
+) -> Any:
+    """带磁盘缓存地渲染页面：过期条目先返回旧值，同时在后台刷新"""
+    cache = get_web_cache() if use_cache else None
+    if cache is None:
+        return await get_browser_pool().run(render)
+
+    hit = cache.get(key)
+    if hit is not None:
+        value, created_at = hit
+        if time.time() - created_at > _settings.cache_ttl:
+            _refresh(key, render, cache)
+        return value
+
+    value = await get_browser_pool().run(render)
+    cache.set(key, value)
+    return value
+
+
+async def fetch_website_html(
+    url: str, wait: int = 3, use_cache: bool = True, mode: str = "markdown"
+) -> str:
     """
     使用 Playwright 抓取指定url动态渲染后的网页内容
+    默认去掉脚本、样式、导航等模板内容，只返回正文的 Markdown
 
     :param url: 目标 URL
     :param wait: 页面加载后等待的秒数（等待 JS 渲染）
-    :return: 渲染完成后的 HTML
+    :param use_cache: 是否使用本地缓存（需要最新内容时传 False）
+    :param mode: 'markdown' 正文 Markdown / 'text' 正文纯文本 / 'html' 原始 HTML
+    :return: 渲染完成后的网页内容
     """
-    from playwright.async_api import async_playwright
+    if mode not in ("markdown", "text", "html"):
+        raise ValueError(f"不支持的输出模式: {mode}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)  # True=无头模式
-        page = await browser.new_page()
+    async def _render(page) -> str:
         await page.goto(url, wait_until="networkidle")  # 等待页面加载完成
         await asyncio.sleep(wait)  # 额外等几秒给JS渲染
-        html = await page.content()
-        await browser.close()
+        return await page.content()
+
+    html = await _cached_render(
+        f"html:{normalize_url(url)}", _render, use_cache
+    )
+    if mode == "html":
         return html
+    return extract_content(
+        html, mode=mode, base_url=url, max_chars=_settings.max_output_chars
+    )
 
 
-async def use_search_engine(question: str, engine: str = "bing") -> List[dict]:
+def _parse_bing_results(html: str) -> List[dict]:
+    """用 BeautifulSoup 解析 Bing 搜索结果页"""
+    from bs4 import BeautifulSoup
+
+    results = []
+    soup = BeautifulSoup(html, "html.parser")
+    for li in soup.select("li.b_algo"):
+        # 标题
+        title_tag = li.select_one("h2 a")
+        title = title_tag.get_text(strip=True) if title_tag else ""
+        # URL
+        url = (
+            title_tag.get("href")
+            if title_tag and title_tag.has_attr("href")
+            else ""
+        )
+        # 描述
+        desc_tag = li.select_one("p")
+        desc = desc_tag.get_text(strip=True) if desc_tag else ""
+        if title and url:
+            results.append({"title": title, "url": url, "desc": desc})
+    return results
+
+
+async def use_search_engine(
+    question: str, engine: str = "bing", use_cache: bool = True
+) -> List[dict]:
     """
     使用 Playwright 打开搜索引擎并解析搜索结果
     当前支持: Bing (https://cn.bing.com)
 
     :param question: 搜索关键词
     :param engine: 搜索引擎 ('bing')
+    :param use_cache: 是否使用本地缓存（需要最新结果时传 False）
     :return: [{'title': str, 'url': str, 'desc': str}, ...]
     """
-    from playwright.async_api import async_playwright
-    from bs4 import BeautifulSoup
-
     if engine != "bing":
         raise ValueError("目前仅支持 Bing 搜索")
 
     search_url = f"https://cn.bing.com/search?q={question}"
-    results = []
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page()
-        page.set_default_timeout(30000)
 
+    async def _render(page) -> List[dict]:
         await page.goto(search_url, wait_until="networkidle")
         await page.wait_for_timeout(1500)  # 等待渲染完成
+        return _parse_bing_results(await page.content())
 
-        html = await page.content()
-        await browser.close()
-
-        # 用 BeautifulSoup 解析 HTML
-        soup = BeautifulSoup(html, "html.parser")
-        for li in soup.select("li.b_algo"):
-            # 标题
-            title_tag = li.select_one("h2 a")
-            title = title_tag.get_text(strip=True) if title_tag else ""
-            # URL
-            url = (
-                title_tag.get("href")
-                if title_tag and title_tag.has_attr("href")
-                else ""
-            )
-            # 描述
-            desc_tag = li.select_one("p")
-            desc = desc_tag.get_text(strip=True) if desc_tag else ""
-            if title and url:
-                results.append({"title": title, "url": url, "desc": desc})
-    return results
+    query = " ".join(question.lower().split())
+    return await _cached_render(
+        f"search:{engine}:{query}", _render, use_cache
+    )
@@ -0,0 +1,244 @@
+"""
+Per-step tracing for Agent runs.
+
+A Tracer hands out one RunTrace per run. The run loop records a span for
+every LM call and tool invocation (duration, token counts, input/output
+byte sizes) and forwards each finished span to the configured sinks:
+JsonlSink, MemorySink or CallbackSink. When tracing is disabled no Tracer
+exists and the run loop skips all of this.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Span:
+    """One timed operation inside a run."""
+
+    run_id: str
+    kind: str  # "run" | "lm" | "tool"
+    name: str
+    start: float
+    duration_ms: float
+    step: Optional[int] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MemorySink:
+    """Keeps spans in a list (bounded by max_spans)."""
+
+    def __init__(self, max_spans: int = 100000):
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.max_spans:
+                del self.spans[: len(self.spans) - self.max_spans]
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Appends one JSON object per span to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def emit(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CallbackSink:
+    """Calls fn(span) for every finished span."""
+
+    def __init__(self, fn: Callable[[Span], None]):
+        self.fn = fn
+
+    def emit(self, span: Span):
+        self.fn(span)
+
+    def close(self):
+        pass
+
+
+def byte_size(value: Any) -> int:
+    """UTF-8 size of a value's text form."""
+    if isinstance(value, (dict, list)):
+        try:
+            value = json.dumps(value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            pass
+    return len(str(value).encode("utf-8"))
+
+
+class RunTrace:
+    """
+    Collects the spans of a single run and forwards them to the sinks.
+    """
+
+    def __init__(self, tracer: "Tracer", run_id: str):
+        self.tracer = tracer
+        self.run_id = run_id
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, start: float, **fields) -> Span:
+        """
+        Record a finished span that began at perf_counter() value start.
+
+        :param kind: "lm", "tool" or "run"
+        :param name: Model or tool name
+        :param start: time.perf_counter() when the operation began
+        :param fields: Other Span fields (step, tokens, byte sizes, error)
+        :return: The recorded span
+        """
+        now = time.perf_counter()
+        span = Span(
+            run_id=self.run_id,
+            kind=kind,
+            name=name,
+            start=self.start + (start - self._t0),
+            duration_ms=(now - start) * 1000,
+            **fields,
+        )
+        with self._lock:
+            self.spans.append(span)
+        self.tracer.emit(span)
+        return span
+
+    def finish(self, steps: int, error: Optional[str] = None) -> Span:
+        """Record the span covering the whole run."""
+        with self._lock:
+            spans = list(self.spans)
+        return self.record(
+            "run",
+            "agent",
+            self._t0,
+            step=steps,
+            prompt_tokens=sum(s.prompt_tokens for s in spans),
+            completion_tokens=sum(s.completion_tokens for s in spans),
+            error=error,
+        )
+
+    def summary(self) -> str:
+        """Format a table of calls, time, tokens and bytes per LM/tool."""
+        with self._lock:
+            spans = list(self.spans)
+        return format_summary(spans)
+
+
+def format_summary(spans: List[Span]) -> str:
+    """
+    Aggregate spans per (kind, name) into a fixed-width table.
+
+    :param spans: Spans of one or more runs
+    :return: Table text
+    """
+    rows: Dict[tuple, Dict[str, float]] = defaultdict(
+        lambda: defaultdict(float)
+    )
+    for span in spans:
+        if span.kind == "run":
+            continue
+        row = rows[(span.kind, span.name)]
+        row["calls"] += 1
+        row["errors"] += 1 if span.error else 0
+        row["total_ms"] += span.duration_ms
+        row["max_ms"] = max(row["max_ms"], span.duration_ms)
+        row["tokens_in"] += span.prompt_tokens
+        row["tokens_out"] += span.completion_tokens
+        row["bytes_in"] += span.input_bytes
+        row["bytes_out"] += span.output_bytes
+
+    header = (
+        f"{'kind':<5} {'name':<28} {'calls':>5} {'err':>4} {'total ms':>10} "
+        f"{'avg ms':>9} {'max ms':>9} {'tok in':>8} {'tok out':>8} "
+        f"{'KB in':>8} {'KB out':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    ordered = sorted(rows.items(), key=lambda item: -item[1]["total_ms"])
+    for (kind, name), row in ordered:
+        lines.append(
+            f"{kind:<5} {name[:28]:<28} {int(row['calls']):>5} "
+            f"{int(row['errors']):>4} {row['total_ms']:>10.1f} "
+            f"{row['total_ms'] / row['calls']:>9.1f} {row['max_ms']:>9.1f} "
+            f"{int(row['tokens_in']):>8} {int(row['tokens_out']):>8} "
+            f"{row['bytes_in'] / 1024:>8.1f} {row['bytes_out'] / 1024:>8.1f}"
+        )
+    total = next((s for s in reversed(spans) if s.kind == "run"), None)
+    if total is not None:
+        lines.append("-" * len(header))
+        lines.append(
+            f"run {total.run_id}: {total.duration_ms / 1000:.2f}s, "
+            f"{total.step} steps, {total.prompt_tokens} prompt + "
+            f"{total.completion_tokens} completion tokens"
+        )
+    return "\n".join(lines)
+
+
+class Tracer:
+    """
+    Fans finished spans out to a list of sinks.
+    """
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        """
+        :param sinks: Objects with emit(span) and close() methods
+        """
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        """Attach another sink (e.g. CallbackSink) at runtime."""
+        self.sinks.append(sink)
+
+    def start_run(self, run_id: Optional[str] = None) -> RunTrace:
+        """
+        Begin tracing a run.
+
+        :param run_id: Identifier for the run (random if omitted)
+        :return: RunTrace collecting the run's spans
+        """
+        return RunTrace(self, run_id or uuid.uuid4().hex[:12])
+
+    def emit(self, span: Span):
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception as e:
+                print(f"⚠️ 写入追踪数据失败: {e}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
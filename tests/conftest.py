@@ -0,0 +1,66 @@
+"""
+Shared pytest fixtures.
+
+Every test starts from the default tool settings and keeps its indexes and
+caches under tmp_path instead of ~/.mini-code-agent.
+"""
+
+import dataclasses
+
+import pytest
+
+from core.tool import (
+    file_tools,
+    retrieval_tools,
+    search_tools,
+    symbol_tools,
+    web_tools,
+)
+
+_SETTINGS_MODULES = (
+    file_tools,
+    retrieval_tools,
+    search_tools,
+    symbol_tools,
+    web_tools,
+)
+
+
+@pytest.fixture(autouse=True)
+def tool_settings(tmp_path):
+    """Restore the default tool settings after each test."""
+    saved = [
+        dataclasses.asdict(module._settings.defaults)
+        for module in _SETTINGS_MODULES
+    ]
+    index_dir = str(tmp_path / "index")
+    search_tools.configure_search(index_dir=index_dir)
+    symbol_tools.configure_symbols(index_dir=index_dir)
+    retrieval_tools.configure_retrieval(index_dir=index_dir)
+    web_tools.configure_web(cache_dir=str(tmp_path / "web"))
+    yield
+    for module, settings in zip(_SETTINGS_MODULES, saved):
+        module._settings.configure(**settings)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """A small source tree; returns a function that writes more files."""
+    root = tmp_path / "ws"
+    root.mkdir()
+
+    def write(rel: str, text: str = "", data: bytes = None) -> str:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if data is not None:
+            path.write_bytes(data)
+        else:
+            path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    write("pkg/alpha.py", "def alpha():\n    return 'needle one'\n")
+    write("pkg/beta.py", "def beta():\n    return 'other'\n")
+    write("docs/readme.txt", "a needle in docs\n")
+    write("node_modules/dep.js", "needle in dependency\n")
+    write.root = str(root)
+    return write
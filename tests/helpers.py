@@ -0,0 +1,37 @@
+"""Helpers for tests that run a whole Agent against a scripted LM."""
+
+from dspy.utils.dummies import DummyLM
+
+from core.agent import Agent
+from core.config import AgentConfig, Config, DSPyConfig
+
+
+def step(*calls, thought="next"):
+    """One ReAct step answer: tool calls given as (name, args) pairs."""
+    return {
+        "next_thought": thought,
+        "next_tool_calls": [
+            {"name": name, "args": args} for name, args in calls
+        ],
+    }
+
+
+def finish(solution="done"):
+    """The finishing step followed by the extract answer."""
+    return [
+        step(("finish", {}), thought="finished"),
+        {"reasoning": "ok", "solution": solution},
+    ]
+
+
+def make_agent(answers, lm=None, fast_lm=None, **sections) -> Agent:
+    """
+    Agent whose LM replays `answers`; sections are Config sections.
+
+    With fast_lm, steps are routed to it first (routing.fast_model).
+    """
+    sections.setdefault("agent", AgentConfig())
+    config = Config(
+        dspy=DSPyConfig(model="dummy", api_key="test"), **sections
+    )
+    return Agent(config=config, lm=lm or DummyLM(answers), fast_lm=fast_lm)
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import AgentConfig, FileConfig, SearchConfig
+from core.tool import browser_pool, read_file
+from core.tool.content_cache import ContentCache, content_cache
+from core.tool.file_tools import _settings as file_settings
+from core.tool.settings import use_tool_settings
+
+from .helpers import finish, make_agent, step
+
+ROUNDS = 4
+
+
+def _big_file(workspace):
+    return workspace(
+        "big.txt", "".join(f"line {i}\n" for i in range(3000))
+    )
+
+
+def test_agent_settings_apply_only_inside_its_runs(workspace):
+    default = file_settings.defaults.read_max_bytes
+    agent = make_agent([], files=FileConfig(read_max_bytes=123))
+    try:
+        # 创建 Agent 不改变进程级默认值
+        assert file_settings.read_max_bytes == default
+        with use_tool_settings(agent.tool_settings):
+            assert file_settings.read_max_bytes == 123
+        assert file_settings.read_max_bytes == default
+    finally:
+        agent.close()
+
+
+def test_concurrent_agents_keep_their_own_tool_settings(workspace):
+    path = _big_file(workspace)
+    budgets = [200 + 150 * i for i in range(6)]
+    agents, expected = [], []
+    for i, budget in enumerate(budgets):
+        # 一步内两个只读调用：在工具线程池和超时线程中执行
+        script = []
+        for _ in range(ROUNDS):
+            script.append(step(
+                ("read_file", {"file_path": path}),
+                ("read_file", {"file_path": path, "start_line": 2}),
+            ))
+            script.extend(finish(f"agent {i}"))
+        agent = make_agent(
+            script,
+            files=FileConfig(read_max_bytes=budget),
+            search=SearchConfig(
+                index_dir=os.path.join(workspace.root, f"index-{i}")
+            ),
+            agent=AgentConfig(max_iters=4, memoize_tools=False),
+        )
+        agents.append(agent)
+        with use_tool_settings(agent.tool_settings):
+            expected.append(read_file(path))
+
+    def run(i):
+        return [agents[i]("read the big file") for _ in range(ROUNDS)]
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(agents)) as pool:
+            outcomes = list(pool.map(run, range(len(agents))))
+    finally:
+        for agent in agents:
+            agent.close()
+    assert len(set(expected)) == len(budgets)
+    for i, results in enumerate(outcomes):
+        for result in results:
+            assert result.solution == f"agent {i}"
+            assert result.trajectory["observation_0_1"] == expected[i]
+
+
+def test_browser_pool_is_reference_counted(monkeypatch):
+    closed = []
+    monkeypatch.setattr(
+        browser_pool.BrowserPool, "close", lambda self: closed.append(self)
+    )
+    first = make_agent([])
+    second = make_agent([])
+    pool = browser_pool.get_browser_pool()
+    first.close()
+    first.close()
+    assert closed == [] and browser_pool.get_browser_pool() is pool
+    second.close()
+    assert closed == [pool]
+
+
+def test_shared_content_cache_fits_the_largest_agent(monkeypatch):
+    monkeypatch.setattr(content_cache, "max_bytes", 1000)
+    large = make_agent([], files=FileConfig(cache_max_bytes=8000))
+    # 后创建的 Agent 要求更小的上限时不缩小共享缓存
+    small = make_agent([], files=FileConfig(cache_max_bytes=2000))
+    assert content_cache.max_bytes == 8000
+    large.close()
+    assert content_cache.max_bytes == 2000
+    large.close()
+    small.close()
+    assert content_cache.max_bytes == 2000
+
+
+def test_content_cache_resize_keeps_recent_entries(tmp_path):
+    cache = ContentCache(max_bytes=4000)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(bytes(400))
+        cache.read_bytes(str(path))
+        paths.append(str(path))
+    cache.resize(1600)
+    # 缩小时只淘汰最久未使用的条目
+    assert cache.stats()["entries"] == 4
+    cache.read_bytes(paths[-1])
+    cache.read_bytes(paths[0])
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["bytes"] <= 1600
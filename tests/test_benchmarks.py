@@ -0,0 +1,85 @@
+import json
+import os
+
+from benchmarks.__main__ import main
+from benchmarks.harness import Case, compare_results, run_case
+from benchmarks.workspace import ensure_workspace, generate_workspace
+
+
+def _files(root):
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                found[os.path.relpath(path, root)] = f.read()
+    return found
+
+
+def test_workspaces_are_deterministic_and_cached(tmp_path):
+    first = generate_workspace(str(tmp_path / "a"), 120, seed=3)
+    second = generate_workspace(str(tmp_path / "b"), 120, seed=3)
+    assert first == second
+    assert _files(tmp_path / "a") == _files(tmp_path / "b")
+    assert first["n_files"] == 120 and first["needles"]
+
+    manifest = ensure_workspace("40", base_dir=str(tmp_path / "cache"))
+    marker = os.path.join(manifest["root"], "marker")
+    open(marker, "w").close()
+    again = ensure_workspace("40", base_dir=str(tmp_path / "cache"))
+    # 已生成的工作区直接复用，不重新生成
+    assert again["root"] == manifest["root"] and os.path.exists(marker)
+
+
+def test_in_process_cases_report_timing_and_errors(tmp_path):
+    calls = []
+    ok = Case("tools", "ok", lambda state: calls.append(state) or 10.0,
+              setup=lambda ctx: "state", teardown=calls.append, repeat=3)
+    result = run_case(ok, {"scratch": str(tmp_path)}, isolate=False)
+    assert calls == ["state"] * 4
+    assert result["repeat"] == 3 and result["error"] is None
+    assert result["min_s"] <= result["median_s"]
+    assert result["throughput"] > 0
+
+    def boom(state):
+        raise RuntimeError("broken case")
+
+    failed = run_case(Case("tools", "bad", boom), {}, isolate=False)
+    assert failed["repeat"] == 0 and "broken case" in failed["error"]
+
+
+def test_compare_marks_regressions_and_improvements():
+    def results(**medians):
+        return {
+            "commit": "abc",
+            "meta": {"size": "small"},
+            "results": [
+                {"suite": "tools", "name": name, "median_s": median}
+                for name, median in medians.items()
+            ],
+        }
+
+    table = compare_results(
+        results(slow=1.0, fast=1.0, same=1.0),
+        results(slow=1.5, fast=0.5, same=1.01, added=1.0),
+    )
+    lines = {line.split()[1]: line for line in table.splitlines()[3:]}
+    assert lines["slow"].endswith("⚠️")
+    assert lines["fast"].endswith("✅")
+    assert not lines["same"].endswith(("⚠️", "✅"))
+    assert lines["added"].endswith("new")
+
+
+def test_run_command_saves_results_from_child_processes(tmp_path, capsys):
+    output = tmp_path / "out.json"
+    code = main([
+        "run", "--size", "60", "--workspace-dir", str(tmp_path / "ws"),
+        "--suite", "tools", "--filter", "list_file_tree", "--repeat", "1",
+        "--output", str(output),
+    ])
+    assert code == 0
+    data = json.loads(output.read_text())
+    assert data["meta"]["n_files"] == 60
+    [result] = data["results"]
+    assert result["name"] == "list_file_tree" and result["error"] is None
+    assert "list_file_tree" in capsys.readouterr().out
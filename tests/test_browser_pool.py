@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from core.tool.browser_pool import BrowserPool
+
+
+class _FakePage:
+    def __init__(self):
+        self.closed = False
+        self.timeout = None
+
+    def set_default_timeout(self, timeout):
+        self.timeout = timeout
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakeContext:
+    def __init__(self):
+        self.pages = []
+
+    async def new_page(self):
+        page = _FakePage()
+        self.pages.append(page)
+        return page
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A BrowserPool whose pages come from a fake Playwright context."""
+    context = _FakeContext()
+
+    async def ensure_context(self):
+        return context
+
+    monkeypatch.setattr(BrowserPool, "_ensure_context", ensure_context)
+    pool = BrowserPool(max_concurrency=2, timeout_ms=1234)
+    pool.context = context
+    yield pool
+    pool.close()
+
+
+def test_pages_are_reused_across_event_loops(pool):
+    async def page_id(page):
+        return id(page)
+
+    # 每次 asyncio.run 都是新的事件循环，页面仍来自同一个浏览器线程
+    first = asyncio.run(pool.run(page_id))
+    second = asyncio.run(pool.run(page_id))
+    assert first == second
+    assert len(pool.context.pages) == 1
+    assert pool.context.pages[0].timeout == 1234
+
+
+def test_concurrent_pages_are_bounded(pool):
+    active, peak = [0], [0]
+
+    async def render(page):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.05)
+        active[0] -= 1
+        return page
+
+    async def main():
+        return await asyncio.gather(*(pool.run(render) for _ in range(6)))
+
+    pages = asyncio.run(main())
+    assert peak[0] == 2
+    assert len(set(map(id, pages))) == 2
+
+
+def test_failed_pages_are_closed_and_replaced(pool):
+    async def fail(page):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.run(fail))
+    assert pool.context.pages[0].closed
+
+    async def ok(page):
+        return page
+
+    assert asyncio.run(pool.run(ok)) is pool.context.pages[1]
+
+
+def test_submit_runs_in_the_background_and_close_stops_the_loop(pool):
+    async def title(page):
+        return "title"
+
+    assert pool.submit(title).result(5) == "title"
+    thread = pool._thread
+    pool.close()
+    assert not thread.is_alive()
+    assert pool._loop is None
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from core.react import BatchReAct, ToolCall
+from core.tool.budget import (
+    ToolBudget,
+    ToolBudgetError,
+    ToolLimits,
+    check_cancelled,
+    run_with_budget,
+    truncate_output,
+)
+
+
+def test_per_tool_limits_override_and_disable():
+    budget = ToolBudget(
+        default=ToolLimits(10, 100),
+        per_tool={"slow": ToolLimits(timeout_s=60), "big": ToolLimits(0, 0)},
+    )
+    assert budget.limits("slow") == ToolLimits(60, 100)
+    assert budget.limits("big") == ToolLimits(None, None)
+    assert budget.limits("other") == ToolLimits(10, 100)
+
+
+def test_timeout_stops_cooperative_tool():
+    stopped = threading.Event()
+
+    def loop_forever():
+        try:
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+        finally:
+            stopped.set()
+
+    start = time.monotonic()
+    with pytest.raises(ToolBudgetError) as info:
+        run_with_budget(loop_forever, "walk", ToolLimits(timeout_s=0.1))
+    assert info.value.kind == "timeout"
+    assert info.value.observation()["timeout_s"] == 0.1
+    assert time.monotonic() - start < 1
+    assert stopped.wait(1)
+
+
+def test_cancel_event_stops_the_call():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(ToolBudgetError) as info:
+        run_with_budget(
+            lambda: time.sleep(1), "slow", ToolLimits(timeout_s=5), cancel
+        )
+    assert info.value.kind == "cancelled"
+
+
+def test_truncation_keeps_head_and_tail():
+    text = "HEAD" + "x" * 1000 + "TAIL"
+    out = truncate_output(text, 100)
+    assert out.startswith("HEAD") and out.endswith("TAIL")
+    assert "908 of 1008 chars omitted from the middle" in out
+    assert truncate_output("short", 100) == "short"
+
+
+def test_list_truncation_keeps_first_and_last_items():
+    items = [f"item {i}" for i in range(100)]
+    out = truncate_output(items, 100)
+    assert out[0] == "item 0" and out[-1] == "item 99"
+    marker = next(item for item in out if item.startswith("...[truncated"))
+    kept = len(out) - 1
+    assert f"{100 - kept} of 100 items" in marker
+    assert truncate_output(items[:3], 100) == items[:3]
+
+
+def test_write_tools_are_not_timed_out():
+    written = []
+
+    def slow_write(path: str) -> str:
+        """Write something slowly."""
+        time.sleep(0.3)
+        written.append(path)
+        return f"wrote {path}"
+
+    def slow_read(path: str) -> str:
+        """Read something slowly."""
+        time.sleep(0.3)
+        return path
+
+    react = BatchReAct(
+        "question -> answer",
+        tools=[slow_write, slow_read],
+        read_only_tools={"slow_read"},
+        budget=ToolBudget(default=ToolLimits(timeout_s=0.05)),
+    )
+    try:
+        result, error = react._invoke_call(
+            ToolCall(name="slow_write", args={"path": "a"})
+        )
+        assert (result, error) == ("wrote a", None)
+        assert written == ["a"]
+        result, error = react._invoke_call(
+            ToolCall(name="slow_read", args={"path": "b"})
+        )
+        assert error.startswith("timeout") and result["error"] == "timeout"
+    finally:
+        react.close()
@@ -0,0 +1,149 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+from dspy.utils.dummies import DummyLM
+
+from core import checkpoint as checkpoint_module
+from core.agent import Agent
+from core.checkpoint import CheckpointStore
+
+from .helpers import finish, step
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CONFIG = """\
+dspy:
+  model: "dummy"
+  api_key: "test"
+agent:
+  max_iters: 10
+retrieval:
+  prime_first_step: false
+search:
+  index_dir: "{home}/index"
+web:
+  cache_dir: "{home}/web"
+tracing:
+  enabled: false
+checkpoint:
+  enabled: true
+  directory: "{home}/checkpoints"
+"""
+
+# 子进程：按脚本运行，第 kill_at 次请求 LM 时用 SIGKILL 自杀（此时之前
+# 的各步都已完成并写入检查点）
+_KILL_CHILD = """\
+import json, os, signal, sys
+from dspy.utils.dummies import DummyLM
+from core.agent import Agent
+
+args = json.load(open(sys.argv[1]))
+
+
+class KillingLM(DummyLM):
+    def __call__(self, *a, **kw):
+        if len(self.history) + 1 == args["kill_at"]:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return super().__call__(*a, **kw)
+
+
+agent = Agent(config_path=args["home"])
+agent.lm = KillingLM(args["script"])
+agent.run("tidy up", run_id="killed")
+sys.exit("run finished before it was killed")
+"""
+
+
+def test_killed_run_resumes_without_repeating_work(tmp_path, workspace):
+    home = tmp_path / "home"
+    (home / ".mini-code-agent").mkdir(parents=True)
+    (home / ".mini-code-agent" / "config.yaml").write_text(
+        _CONFIG.format(home=home)
+    )
+    root = workspace.root
+    script = [
+        step(("read_file", {"file_path": f"{root}/pkg/alpha.py"})),
+        step(("create_path", {"base_path": root, "name": "made.txt",
+                              "content": "one\n"})),
+        step(("read_file", {"file_path": f"{root}/made.txt"})),
+        *finish("resumed"),
+    ]
+    args = tmp_path / "kill.json"
+    args.write_text(
+        json.dumps({"home": str(home), "script": script, "kill_at": 3})
+    )
+    child = subprocess.run(
+        [sys.executable, "-c", _KILL_CHILD, str(args)],
+        cwd=REPO,
+        capture_output=True,
+        text=True,
+    )
+    assert child.returncode == -signal.SIGKILL, child.stderr[-2000:]
+    assert os.path.exists(os.path.join(root, "made.txt"))
+
+    agent = Agent(config_path=str(home))
+    try:
+        assert agent.checkpoints.latest_unfinished() == "killed"
+        assert agent.checkpoints.runs()[0]["steps"] == 2
+        remaining = script[2:]
+        agent.lm = DummyLM(remaining)
+        result = agent.resume()
+    finally:
+        agent.close()
+    assert result.solution == "resumed"
+    assert result.run_id == "killed"
+    assert len(agent.lm.history) == len(remaining)
+    assert "one" in str(result.trajectory["observation_2_1"])
+    assert agent.checkpoints.runs()[0]["finished"]
+    assert agent.checkpoints.latest_unfinished() is None
+
+
+def _run(store, run_id, finished=True, close=True, age=0):
+    checkpoint = store.create(run_id, inputs={"requirement": run_id})
+    if finished:
+        checkpoint.record_result({"solution": run_id})
+    if close:
+        checkpoint.close()
+    stamp = time.time() - 100 + age
+    os.utime(checkpoint.path, (stamp, stamp))
+    return checkpoint
+
+
+def test_prune_keeps_unfinished_and_locked_runs(tmp_path):
+    store = CheckpointStore(str(tmp_path), keep_runs=2)
+    store.keep_runs = 0
+    locked = _run(store, "locked", close=False, age=0)
+    _run(store, "old-unfinished", finished=False, age=1)
+    for age, run_id in enumerate(["f1", "f2", "f3"], start=2):
+        _run(store, run_id, age=age)
+    store.keep_runs = 2
+    _run(store, "new", age=10)
+    try:
+        remaining = {run["run_id"] for run in store.runs()}
+        assert remaining == {"new", "f3", "locked", "old-unfinished"}
+        assert not (tmp_path / "f1.json").exists()
+    finally:
+        locked.close()
+
+
+def test_resume_picks_a_run_from_summaries(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path), keep_runs=0)
+    _run(store, "done", age=3)
+    running = _run(store, "running", finished=False, close=False, age=2)
+    _run(store, "stopped", finished=False, age=1)
+
+    def no_reads(path):
+        raise AssertionError(f"read {path}")
+
+    monkeypatch.setattr(checkpoint_module, "read_records", no_reads)
+    try:
+        assert store.latest_unfinished() == "stopped"
+        with pytest.raises(ValueError, match="in use"):
+            store.load("running")
+    finally:
+        running.close()
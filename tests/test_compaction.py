@@ -0,0 +1,80 @@
+from core.compaction import TrajectoryCompactor, step_of
+from core.config import AgentConfig
+
+from .helpers import finish, make_agent, step
+
+
+def _trajectory(sizes):
+    """Steps with one read_file call each, observations of given sizes."""
+    trajectory = {}
+    for idx, size in enumerate(sizes):
+        trajectory[f"thought_{idx}"] = "t"
+        trajectory[f"tool_calls_{idx}"] = [
+            {"name": "read_file", "args": {"file_path": f"f{idx}"}}
+        ]
+        trajectory[f"observation_{idx}_1"] = str(idx) * size
+    return trajectory
+
+
+def test_step_of_parses_trajectory_keys():
+    assert step_of("observation_3_1") == 3
+    assert step_of("tool_calls_12") == 12
+    assert step_of("observation_0_skipped") == 0
+
+
+def test_trajectory_within_budget_is_unchanged():
+    compactor = TrajectoryCompactor(max_tokens=10_000)
+    trajectory = _trajectory([2000, 2000])
+    assert compactor.compact(trajectory) == trajectory
+    assert compactor.stats()["compacted_calls"] == 0
+
+
+def test_oldest_large_observations_are_stubbed_first():
+    compactor = TrajectoryCompactor(
+        max_tokens=1000, keep_recent_steps=1, min_observation_chars=1000
+    )
+    trajectory = _trajectory([2000, 500, 2000, 2000, 2000])
+    view = compactor.compact(trajectory)
+    # 只替换到放得下为止：最旧的大观察先被替换，小观察和最近一步不动
+    assert view["observation_0_1"].startswith(
+        '[compacted: read_file({"file_path": "f0"}) returned 2000 chars'
+    )
+    assert view["observation_1_1"] == trajectory["observation_1_1"]
+    assert view["observation_2_1"].startswith("[compacted:")
+    assert view["observation_3_1"].startswith("[compacted:")
+    assert view["observation_4_1"] == trajectory["observation_4_1"]
+    assert trajectory["observation_0_1"] == "0" * 2000
+    stats = compactor.stats()
+    assert stats["observations_stubbed"] == 3
+    assert stats["bytes_saved"] > 5000
+
+
+def test_compaction_stops_once_the_trajectory_fits():
+    compactor = TrajectoryCompactor(max_tokens=1000, keep_recent_steps=0)
+    view = compactor.compact(_trajectory([2000, 2000, 2000]))
+    assert view["observation_0_1"].startswith("[compacted:")
+    assert view["observation_1_1"].startswith("[compacted:")
+    assert view["observation_2_1"] == "2" * 2000
+
+
+def test_agent_keeps_the_full_trajectory_and_reports_savings(workspace):
+    path = workspace("big.txt", "x" * 6000)
+    script = [
+        step(("read_file", {"file_path": path})),
+        step(("read_file", {"file_path": path, "start_line": 1})),
+        step(("list_file_tree", {"root_path": workspace.root})),
+        *finish(),
+    ]
+    agent = make_agent(
+        script,
+        agent=AgentConfig(
+            trajectory_max_tokens=1000, compaction_keep_steps=1
+        ),
+    )
+    try:
+        result = agent("read it")
+    finally:
+        agent.close()
+    assert result.trajectory["observation_0_1"] == "x" * 6000
+    assert result.compaction["observations_stubbed"] >= 1
+    assert agent.compaction_stats()["bytes_saved"] > 0
@@ -0,0 +1,68 @@
+import os
+
+from core.tool import edit_path, read_file, replace_in_file
+from core.tool.content_cache import ContentCache, content_cache
+
+
+def test_hits_until_the_file_changes_on_disk(tmp_path):
+    cache = ContentCache()
+    path = tmp_path / "f.txt"
+    path.write_bytes(b"one")
+    assert cache.read_bytes(str(path)) == b"one"
+    assert cache.read_bytes(str(path)) == b"one"
+    path.write_bytes(b"three")
+    # 大小和 mtime 变化后重新读取
+    assert cache.read_bytes(str(path)) == b"three"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["bytes"] == 5
+
+
+def test_evicts_least_recently_used_and_skips_large_files(tmp_path):
+    cache = ContentCache(max_bytes=1000)
+    paths = []
+    for name in ("f0", "f1", "f2", "f3", "big", "extra"):
+        path = tmp_path / name
+        path.write_bytes(bytes(300 if name == "big" else 250))
+        paths.append(str(path))
+    for path in paths[:4]:
+        cache.read_bytes(path)
+    cache.read_bytes(paths[0])
+    # 超过上限 1/4 的文件不放入缓存
+    cache.read_bytes(paths[4])
+    assert cache.stats()["entries"] == 4
+    cache.read_bytes(paths[5])
+    assert cache.stats()["evictions"] == 1
+    hits = cache.stats()["hits"]
+    cache.read_bytes(paths[0])
+    assert cache.stats()["hits"] == hits + 1
+    cache.read_bytes(paths[1])
+    assert cache.stats()["hits"] == hits + 1
+    assert cache.stats()["bytes"] <= 1000
+
+
+def test_invalidate_drops_a_directory_and_its_files(tmp_path):
+    cache = ContentCache()
+    (tmp_path / "d").mkdir()
+    inside = tmp_path / "d" / "a"
+    sibling = tmp_path / "dx"
+    for path in (inside, sibling):
+        path.write_bytes(b"x")
+        cache.read_bytes(str(path))
+    cache.invalidate(str(tmp_path / "d"))
+    assert cache.stats()["entries"] == 1
+    cache.read_bytes(str(sibling))
+    assert cache.stats()["hits"] == 1
+
+
+def test_write_tools_keep_the_shared_cache_coherent(workspace):
+    content_cache.clear()
+    path = workspace("code.py", "value = 1\n")
+    assert read_file(path) == "value = 1\n"
+    assert replace_in_file(path, "1", "22")
+    misses = content_cache.stats()["misses"]
+    assert read_file(path) == "value = 22\n"
+    assert content_cache.stats()["misses"] == misses
+    new_path = edit_path(path, new_name="renamed.py")
+    assert read_file(new_path) == "value = 22\n"
+    assert not os.path.exists(path)
@@ -0,0 +1,91 @@
+import os
+import threading
+
+from core.tool.disk_cache import DiskCache
+
+
+def _files(cache):
+    return [n for n in os.listdir(cache.directory) if n.endswith(".json")]
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = DiskCache(str(tmp_path), 10_000)
+    assert cache.get("a") is None
+    cache.set("a", {"x": 1})
+    value, created_at = cache.get("a")
+    assert value == {"x": 1} and created_at > 0
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == sum(
+        os.path.getsize(tmp_path / n) for n in _files(cache)
+    )
+
+
+def test_running_total_tracks_overwrite_and_delete(tmp_path):
+    cache = DiskCache(str(tmp_path), 10_000)
+    cache.set("a", "x" * 100)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y")
+    cache.delete("b")
+    cache.delete("missing")
+    on_disk = sum(os.path.getsize(tmp_path / n) for n in _files(cache))
+    assert cache.stats()["bytes"] == on_disk
+    assert cache.stats()["entries"] == 1
+
+
+def test_total_is_loaded_from_existing_directory(tmp_path):
+    DiskCache(str(tmp_path), 10_000).set("a", "x" * 50)
+    reopened = DiskCache(str(tmp_path), 10_000)
+    assert reopened.stats()["entries"] == 1
+    reopened.set("b", "y")
+    assert reopened.stats()["entries"] == 2
+
+
+def test_failed_replace_removes_the_temp_file(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), 10_000)
+    cache.set("a", "old")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    cache.set("a", "new")
+    assert os.listdir(tmp_path) == _files(cache)
+    assert cache.get("a")[0] == "old"
+    assert cache.stats()["entries"] == 1
+
+
+def test_evicts_oldest_only_when_over_cap(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), 400)
+    scans = []
+    real = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or real())
+    for i in range(3):
+        cache.set(f"k{i}", "v" * 20)
+    # 首次扫描得到总量，之后未超限时不再扫描目录
+    assert len(scans) == 1
+    os.utime(cache._path("k0"), (1, 1))
+    for i in range(3, 8):
+        cache.set(f"k{i}", "v" * 20)
+    assert cache.stats()["evictions"] > 0
+    assert cache.get("k0") is None
+    assert cache.get("k7") is not None
+    assert cache.stats()["bytes"] <= 400
+
+
+def test_counters_are_exact_under_threads(tmp_path):
+    cache = DiskCache(str(tmp_path), 1_000_000)
+    cache.set("present", 1)
+
+    def worker():
+        for _ in range(200):
+            cache.get("present")
+            cache.get("absent")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = cache.stats()
+    assert stats["hits"] == 1600 and stats["misses"] == 1600
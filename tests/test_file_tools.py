@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+from core.tool import budget, file_tools
+from core.tool.budget import ToolCancelled, ToolLimits, run_with_budget
+from core.tool.confine import confine_tools
+from core.tool.file_tools import (
+    configure_files,
+    list_file_tree,
+    read_file,
+    read_files,
+)
+
+
+def _lines(count: int) -> str:
+    return "".join(f"line {i:04d}\n" for i in range(1, count + 1))
+
+
+def test_line_ranges_use_cached_offsets(workspace):
+    path = workspace("big.txt", _lines(100))
+    assert read_file(path, start_line=3, end_line=4) == (
+        "line 0003\nline 0004\n"
+    )
+    cached = file_tools._line_index[path][2]
+    assert read_file(path, start_line=99) == "line 0099\nline 0100\n"
+    assert file_tools._line_index[path][2] is cached
+
+    time.sleep(0.01)
+    workspace("big.txt", "first\nsecond\n")
+    assert read_file(path, start_line=2, end_line=2) == "second\n"
+
+
+@pytest.mark.parametrize("chunk", [None, 1, 2, 3])
+def test_line_ranges_follow_universal_newlines(workspace, monkeypatch, chunk):
+    if chunk is not None:
+        monkeypatch.setattr(file_tools, "_INDEX_CHUNK", chunk)
+    path = workspace("mixed.txt", data=b"a\rb\r\nc\nd\r")
+    assert read_file(path, start_line=1, end_line=1) == "a\n"
+    assert read_file(path, start_line=2, end_line=3) == "b\nc\n"
+    assert read_file(path, start_line=4) == "d\n"
+    assert read_file(path, start_line=5) == ""
+    assert file_tools._line_index[path][2].tolist() == [0, 2, 5, 7, 9]
+    output = read_files([{"file_path": path, "start_line": 2, "end_line": 2}])
+    assert "b\n" in output and "a\n" not in output and "c\n" not in output
+
+
+def test_line_index_evicts_least_recent(workspace, monkeypatch):
+    monkeypatch.setattr(file_tools, "_LINE_INDEX_ENTRIES", 2)
+    monkeypatch.setattr(file_tools, "_line_index", OrderedDict())
+    paths = [workspace(f"f{i}.txt", _lines(3)) for i in range(3)]
+    for path in paths:
+        read_file(path, start_line=1, end_line=1)
+    assert paths[0] not in file_tools._line_index
+    assert all(path in file_tools._line_index for path in paths[1:])
+    # 上限变小后一次淘汰到上限以内
+    monkeypatch.setattr(file_tools, "_LINE_INDEX_ENTRIES", 1)
+    read_file(paths[0], start_line=1, end_line=1)
+    assert list(file_tools._line_index) == [paths[0]]
+
+
+def test_mmap_ranges_and_excerpts(workspace):
+    text = _lines(2000)
+    path = workspace("huge.txt", text)
+    configure_files(mmap_threshold=1024)
+    assert read_file(path, start_byte=10, end_byte=30) == text[10:30]
+    assert read_file(path, start_line=1500, end_line=1501) == (
+        "line 1500\nline 1501\n"
+    )
+    excerpt = read_file(path, max_bytes=200)
+    assert excerpt.startswith("line 0001\n")
+    assert excerpt.endswith("line 2000\n")
+    assert "已截断" in excerpt and len(excerpt) < 400
+
+
+@pytest.mark.parametrize(
+    "start, end", [(1, 0), ("abc", 3), (5, 2), (1.5, None), (0, 3)]
+)
+def test_invalid_line_ranges_are_errors(workspace, capsys, start, end):
+    path = os.path.join(workspace.root, "pkg", "alpha.py")
+    assert read_file(path, start_line=start, end_line=end) == ""
+    assert "无效的行范围" in capsys.readouterr().out
+
+    other = os.path.join(workspace.root, "pkg", "beta.py")
+    output = read_files(
+        [{"file_path": path, "start_line": start, "end_line": end}, other]
+    )
+    assert "❌ 无效的行范围" in output
+    assert "def beta" in output and "1 个读取失败" in output
+
+
+@pytest.mark.parametrize("max_bytes", [-5, "abc", 1.5])
+def test_invalid_max_bytes_are_errors(workspace, capsys, max_bytes):
+    path = workspace("short.txt", "eighteen bytes ok\n")
+    assert read_file(path, max_bytes=max_bytes) == ""
+    assert "无效的读取上限" in capsys.readouterr().out
+    assert read_files([path], max_bytes=max_bytes).startswith(
+        "❌ 无效的读取上限"
+    )
+
+
+def test_numeric_strings_are_line_numbers(workspace):
+    path = workspace("nums.txt", _lines(5))
+    output = read_files(
+        [{"file_path": path, "start_line": "2", "end_line": "3"}]
+    )
+    assert "line 0002\nline 0003\n" in output
+    assert "line 0004" not in output
+
+
+def test_budget_follows_the_tool_output_limit(workspace):
+    paths = [workspace(f"m{i}.txt", _lines(500)) for i in range(3)]
+    configure_files(read_max_bytes=None)
+    limit = 3000
+    output = run_with_budget(
+        lambda: read_files(paths), "read_files", ToolLimits(None, limit)
+    )
+    assert len(output) <= limit
+    assert "[truncated:" not in output
+    assert output.count("已截断") == 3
+    for path in paths:
+        assert f"=== {path} ===\nline 0001" in output
+
+    single = run_with_budget(
+        lambda: read_file(paths[0]), "read_file", ToolLimits(None, 1000)
+    )
+    assert len(single) <= 1000 and "[truncated:" not in single
+    assert single.endswith("line 0500\n")
+
+
+def test_workers_stop_when_the_call_is_cancelled(workspace):
+    configure_files(read_workers=2)
+    stop = threading.Event()
+    seen = []
+
+    def read(item):
+        seen.append(item)
+        stop.set()
+        time.sleep(0.05)
+        return item
+
+    token = budget._call.set(budget._CallState(stop))
+    try:
+        with pytest.raises(ToolCancelled):
+            file_tools._map(read, list(range(20)))
+    finally:
+        budget._call.reset(token)
+    time.sleep(0.2)
+    assert len(seen) <= 2
+
+
+def test_file_tree_stays_in_the_confined_workspace(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("top secret\n")
+    repo = tmp_path / "repo"
+    (repo / "src").mkdir(parents=True)
+    (repo / "src" / "main.py").write_text("")
+    (repo / "escape").symlink_to(outside)
+    (repo / "src" / "loop").symlink_to(repo)
+    with confine_tools(str(repo)):
+        tree = list_file_tree(str(repo))
+    # 指向外部的链接不列出，指向内部的链接目录只列出不展开
+    assert tree.splitlines() == ["src/", "  ├─ loop/", "  ├─ main.py"]
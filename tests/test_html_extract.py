@@ -0,0 +1,54 @@
+from core.tool.html_extract import extract_content
+
+_PAGE = """
+<html><head><title>Release notes</title><script>var x = 1;</script></head>
+<body><form id="aspnetForm" action="/page">
+  <header><div>Site wide banner text</div></header>
+  <nav><a href="/">Home</a></nav>
+  <main><article>
+    <header><h1>Version 2.0</h1><p>By the release team</p></header>
+    <p>The new <a href="/docs/api">API</a> is faster.</p>
+    <form><label>Rate this page</label></form>
+  </article></main>
+  <footer>Copyright</footer>
+</form></body></html>
+"""
+
+
+def test_page_wide_form_and_article_header_are_kept():
+    text = extract_content(_PAGE, base_url="https://example.com/notes/")
+    assert "# Version 2.0" in text
+    assert "By the release team" in text
+    assert "[API](https://example.com/docs/api)" in text
+    assert "Rate this page" in text
+    for boilerplate in ("Site wide banner", "Home", "Copyright", "var x"):
+        assert boilerplate not in text
+
+
+def test_headers_and_forms_outside_main_are_dropped():
+    html = (
+        "<body><header>Logo and tagline</header>"
+        "<form><p>Subscribe to the newsletter form</p></form>"
+        "<article><p>Body text</p></article></body>"
+    )
+    text = extract_content(html, mode="text")
+    assert text == "Body text"
+
+
+def test_boilerplate_classed_wrapper_around_main_is_kept():
+    html = (
+        '<body><div class="layout has-sidebar"><main><h1>Title</h1>'
+        "<p>Main body</p></main>"
+        '<aside class="sidebar">Related links</aside></div></body>'
+    )
+    text = extract_content(html, mode="text")
+    assert "Title" in text and "Main body" in text
+    assert "Related links" not in text
+
+
+def test_long_content_is_cut_with_a_marker():
+    paragraphs = "".join(f"<p>para {i}</p>" for i in range(200))
+    html = f"<main>{paragraphs}</main>"
+    text = extract_content(html, max_chars=300)
+    assert text.startswith("para 0") and len(text) < 400
+    assert "已截断" in text
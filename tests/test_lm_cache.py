@@ -0,0 +1,65 @@
+import pytest
+
+from core.lm_cache import CachedLM, LMCacheMiss, cache_key, wrap_lm
+from core.tool.disk_cache import DiskCache
+
+
+class CountingLM:
+    """Minimal stand-in for a dspy LM: counts calls and echoes the prompt."""
+
+    model = "fake/model"
+    model_type = "chat"
+    num_retries = 0
+
+    def __init__(self):
+        self.kwargs = {"temperature": 0.0, "api_key": "secret"}
+        self.calls = 0
+
+    def __call__(self, prompt=None, messages=None, **kwargs):
+        self.calls += 1
+        return [f"answer {self.calls} to {messages[-1]['content']}"]
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_key_ignores_api_params_but_not_sampling(tmp_path):
+    lm = CountingLM()
+    base = cache_key(lm, None, MESSAGES, {})
+    lm.kwargs["api_key"] = "other"
+    assert cache_key(lm, None, MESSAGES, {}) == base
+    assert cache_key(lm, None, MESSAGES, {"temperature": 1.0}) != base
+    assert base.startswith("lm:") and len(base) == 3 + 64
+
+
+def test_read_through_then_replay(tmp_path):
+    inner = CountingLM()
+    lm = wrap_lm(inner, "read_through", str(tmp_path))
+    first = lm(messages=MESSAGES)
+    assert lm(messages=MESSAGES) == first
+    assert inner.calls == 1
+    assert lm.history[-1]["cache_hit"] is True
+
+    replay = wrap_lm(CountingLM(), "replay", str(tmp_path))
+    assert replay(messages=MESSAGES) == first
+    with pytest.raises(LMCacheMiss):
+        replay(messages=[{"role": "user", "content": "new"}])
+
+
+def test_record_always_calls_and_overwrites(tmp_path):
+    inner = CountingLM()
+    lm = CachedLM(inner, DiskCache(str(tmp_path), 1 << 20), "record")
+    lm(messages=MESSAGES)
+    second = lm(messages=MESSAGES)
+    assert inner.calls == 2 and lm.recorded == 2
+    replay = wrap_lm(CountingLM(), "replay", str(tmp_path))
+    assert replay(messages=MESSAGES) == second
+
+
+def test_wrap_lm_off_and_rewrap(tmp_path):
+    inner = CountingLM()
+    assert wrap_lm(inner, "off") is inner
+    wrapped = wrap_lm(inner, "record", str(tmp_path))
+    assert wrap_lm(wrapped, "off") is inner
+    with pytest.raises(ValueError):
+        wrap_lm(inner, "bogus")
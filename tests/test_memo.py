@@ -0,0 +1,110 @@
+import os
+
+from dspy.utils.dummies import DummyLM
+from dspy.utils.exceptions import ContextWindowExceededError
+
+from core.tool.memo import ToolMemo, read_paths, written_paths
+
+from .helpers import finish, make_agent, step
+
+
+def test_paths_of_reads_and_writes(tmp_path):
+    root = str(tmp_path)
+    target = os.path.join(root, "a.py")
+    assert read_paths("read_file", {"file_path": target}) == (target,)
+    assert read_paths("fetch_website_html", {"url": "x"}) == ()
+    assert read_paths("read_file", {}) is None
+    assert written_paths("create_path", {
+        "base_path": root, "name": "a.py"
+    }) == [target]
+    assert written_paths("edit_path", {
+        "path": target, "new_name": "b.py"
+    }) == [target, os.path.join(root, "b.py")]
+    assert written_paths("tell_human_something", {}) == []
+    assert written_paths("unknown_tool", {}) is None
+
+
+def test_writes_drop_only_results_that_overlap(tmp_path):
+    root = str(tmp_path)
+    a, b = os.path.join(root, "a.py"), os.path.join(root, "b.py")
+    memo = ToolMemo({"read_file", "list_file_tree", "use_search_engine"})
+    memo.put("read_file", {"file_path": a}, "A", 0, 1)
+    memo.put("read_file", {"file_path": b}, "B", 0, 2)
+    memo.put("list_file_tree", {"root_path": root}, "tree", 0, 3)
+    memo.put("use_search_engine", {"query": "q"}, "web", 0, 4)
+    memo.invalidate("replace_in_file", {"file_path": a})
+    # 改动 a.py：a.py 的结果和包含它的目录树失效
+    assert memo.get("read_file", {"file_path": a}) is None
+    assert memo.get("list_file_tree", {"root_path": root}) is None
+    assert memo.get("read_file", {"file_path": b}).result == "B"
+    assert memo.get("use_search_engine", {"query": "q"}).result == "web"
+    # 无法确定改动路径的写操作清空所有结果
+    memo.invalidate("unknown_tool", {})
+    assert memo.stats() == {"hits": 2, "invalidated": 4, "entries": 0}
+
+
+def test_use_cache_false_bypasses_the_memo():
+    memo = ToolMemo({"fetch_website_html"})
+    fresh = {"url": "https://example.com", "use_cache": False}
+    memo.put("fetch_website_html", fresh, "old page", 0, 1)
+    assert memo.get("fetch_website_html", fresh) is None
+    memo.put("fetch_website_html", {"url": "https://example.com"}, "page", 0, 1)
+    assert memo.get("fetch_website_html", fresh) is None
+    assert memo.stats()["entries"] == 1
+
+
+def test_repeated_reads_are_served_from_the_memo(workspace):
+    path = workspace("notes.txt", "first line of a long note\n" * 10)
+    read = ("read_file", {"file_path": path})
+    agent = make_agent([
+        step(read),
+        step(read),
+        step(("replace_in_file", {
+            "file_path": path, "pattern": "first", "replacement": "second",
+        })),
+        step(read),
+        *finish(),
+    ])
+    try:
+        result = agent("read the notes twice")
+    finally:
+        agent.close()
+    trajectory = result.trajectory
+    assert trajectory["observation_1_1"].startswith(
+        "Unchanged since step 0: same output as observation_0_1"
+    )
+    assert trajectory["observation_3_1"].startswith("second line")
+    assert result.tool_memo["hits"] == 1
+    assert result.tool_memo["invalidated"] == 1
+
+
+class OverflowOnceLM(DummyLM):
+    """Overflows the context window on one call, then answers normally."""
+
+    def __init__(self, answers, overflow_call):
+        super().__init__(answers)
+        self.overflow_call = overflow_call
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == self.overflow_call:
+            raise ContextWindowExceededError(model=self.model)
+        return super().__call__(*args, **kwargs)
+
+
+def test_no_unchanged_reference_once_old_steps_are_truncated(workspace):
+    path = workspace("notes.txt", "first line of a long note\n" * 10)
+    read = ("read_file", {"file_path": path})
+    lm = OverflowOnceLM(
+        [step(read), step(("list_file_tree", {})), step(read), *finish()],
+        overflow_call=3,
+    )
+    agent = make_agent([], lm=lm)
+    try:
+        result = agent("read the notes again")
+    finally:
+        agent.close()
+    # 第 0 步已从提示词中截掉，引用它会让模型看不到内容
+    assert result.trajectory["observation_2_1"].startswith("first line")
+    assert result.compaction["truncated_steps"] == 1
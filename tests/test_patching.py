@@ -0,0 +1,103 @@
+import os
+import stat
+
+import pytest
+
+from core.tool import apply_patch, patching
+from core.tool.patching import EditTransaction, PatchError, write_atomic
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o027)
+    yield 0o027
+    os.umask(previous)
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_files_follow_the_current_umask(tmp_path, umask):
+    path = tmp_path / "new.txt"
+    write_atomic(str(path), b"data")
+    assert _mode(path) == 0o666 & ~umask
+    assert not hasattr(patching, "_UMASK")
+    assert [p.name for p in tmp_path.iterdir()] == ["new.txt"]
+
+
+def test_existing_files_keep_their_mode(tmp_path, umask):
+    path = tmp_path / "tool.sh"
+    path.write_text("echo one\n")
+    os.chmod(path, 0o751)
+    write_atomic(str(path), b"echo two\n")
+    assert _mode(path) == 0o751
+    assert path.read_text() == "echo two\n"
+
+
+def test_renamed_files_keep_the_source_mode(tmp_path):
+    script = tmp_path / "run.sh"
+    script.write_text("#!/bin/sh\necho old\n")
+    os.chmod(script, 0o755)
+    patch = (
+        "--- a/run.sh\n+++ b/bin.sh\n@@ -1,2 +1,2 @@\n"
+        " #!/bin/sh\n-echo old\n+echo new\n"
+    )
+    result = apply_patch(patch=patch, base_dir=str(tmp_path))
+    assert not script.exists(), result
+    target = tmp_path / "bin.sh"
+    assert target.read_text() == "#!/bin/sh\necho new\n"
+    assert _mode(target) == 0o755
+
+
+def test_a_mismatch_writes_nothing(tmp_path):
+    first = tmp_path / "a.txt"
+    first.write_text("one\n")
+    transaction = EditTransaction(str(tmp_path))
+    transaction.replace("a.txt", "one", "uno")
+    transaction.replace("b.txt", "", "created\n")
+    transaction.replace("a.txt", "missing", "x")
+    with pytest.raises(PatchError, match="没有找到"):
+        transaction.commit()
+    assert first.read_text() == "one\n"
+    assert not (tmp_path / "b.txt").exists()
+
+
+def test_multi_file_diff_creates_deletes_and_tolerates_drift(tmp_path):
+    code = tmp_path / "code.py"
+    code.write_text("# header\n" * 3 + "a = 1\nb = 2\nc = 3\n")
+    old = tmp_path / "old.txt"
+    old.write_text("bye\n")
+    # @@ 行号与文件不符时按上下文定位
+    patch = (
+        "--- a/code.py\n+++ b/code.py\n@@ -1,3 +1,3 @@\n"
+        " a = 1\n-b = 2\n+b = 20\n c = 3\n"
+        "--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,2 @@\n+hello\n+world\n"
+        "--- a/old.txt\n+++ /dev/null\n@@ -1 +0,0 @@\n-bye\n"
+    )
+    result = apply_patch(patch=patch, base_dir=str(tmp_path))
+    assert result.startswith("✅ 已修改 3 个文件 (+3 -2)"), result
+    assert code.read_text().endswith("a = 1\nb = 20\nc = 3\n")
+    assert (tmp_path / "new.txt").read_text() == "hello\nworld\n"
+    assert not old.exists()
+
+
+def test_search_replace_edits_apply_in_order(tmp_path):
+    path = tmp_path / "conf.ini"
+    path.write_text("x = 1\ny = 1\n")
+    result = apply_patch(
+        edits=[
+            {"file_path": "conf.ini", "search": "= 1", "replace": "= 2",
+             "replace_all": True},
+            {"file_path": "conf.ini", "search": "y = 2", "replace": "y = 3"},
+        ],
+        base_dir=str(tmp_path),
+    )
+    assert result.startswith("✅"), result
+    assert path.read_text() == "x = 2\ny = 3\n"
+    ambiguous = apply_patch(
+        edits=[{"file_path": str(path), "search": "= ", "replace": ":"}]
+    )
+    assert ambiguous.startswith("❌ 补丁未应用")
+    assert path.read_text() == "x = 2\ny = 3\n"
+    assert apply_patch() == "❌ 需要提供 patch 或 edits"
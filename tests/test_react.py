@@ -0,0 +1,89 @@
+import threading
+
+import dspy
+from dspy.utils.dummies import DummyLM
+
+from core.react import BatchReAct
+
+from .helpers import finish, step
+
+
+def _react(log, barrier, **kwargs):
+    def probe(name: str) -> str:
+        """Read-only probe; waits until the whole group is running."""
+        barrier.wait()
+        log.append(("probe", name))
+        return f"probe {name}"
+
+    def write(text: str) -> str:
+        """Write tool; must never overlap other calls."""
+        log.append(("write", text))
+        return f"wrote {text}"
+
+    return BatchReAct(
+        "requirement -> solution",
+        tools=[probe, write],
+        read_only_tools={"probe"},
+        memoize=False,
+        **kwargs,
+    )
+
+
+def _run(react, answers):
+    with dspy.context(lm=DummyLM(answers)):
+        try:
+            return react(requirement="go")
+        finally:
+            react.close()
+
+
+def test_read_only_calls_run_concurrently_and_writes_in_order():
+    log = []
+    # 三个只读调用只有同时在运行时才能通过屏障
+    react = _react(log, threading.Barrier(3, timeout=5))
+    result = _run(react, [
+        step(
+            ("probe", {"name": "a"}),
+            ("probe", {"name": "b"}),
+            ("probe", {"name": "c"}),
+            ("write", {"text": "x"}),
+        ),
+        *finish("ok"),
+    ])
+    assert result.solution == "ok"
+    assert sorted(log[:3]) == [("probe", n) for n in "abc"]
+    assert log[3] == ("write", "x")
+    trajectory = result.trajectory
+    assert [trajectory[f"observation_0_{i}"] for i in range(1, 5)] == [
+        "probe a", "probe b", "probe c", "wrote x",
+    ]
+
+
+def test_calls_beyond_the_step_limit_are_skipped():
+    log = []
+    react = _react(log, threading.Barrier(1), max_calls_per_step=2)
+    result = _run(react, [
+        step(
+            ("write", {"text": "1"}),
+            ("probe", {"name": "a"}),
+            ("write", {"text": "2"}),
+        ),
+        *finish(),
+    ])
+    assert log == [("write", "1"), ("probe", "a")]
+    assert "['write']" in result.trajectory["observation_0_skipped"]
+
+
+def test_finish_ends_the_batch_it_appears_in():
+    log = []
+    react = _react(log, threading.Barrier(1))
+    result = _run(react, [
+        step(
+            ("probe", {"name": "a"}),
+            ("finish", {}),
+            ("write", {"text": "late"}),
+        ),
+        {"reasoning": "ok", "solution": "done"},
+    ])
+    assert log == [("probe", "a")]
+    assert result.trajectory["observation_0_finish"] == "Completed."
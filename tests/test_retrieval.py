@@ -0,0 +1,81 @@
+import os
+
+from core.config import RetrievalConfig, SearchConfig
+from core.tool import replace_in_file, retrieve
+from core.tool.bm25_index import tokenize
+from core.tool.retrieval_tools import configure_retrieval
+
+from .helpers import finish, make_agent
+
+
+def _billing(workspace):
+    return workspace(
+        "app/billing.py",
+        "def compute_invoice_total(items):\n    return sum(items)\n",
+    )
+
+
+def test_tokenize_splits_identifiers_and_cjk():
+    assert tokenize("parseHTTPRequest snake_case 中文检索") == [
+        "parsehttprequest", "parse", "http", "request",
+        "snake_case", "snake", "case",
+        "中文", "文检", "检索",
+    ]
+
+
+def test_retrieve_ranks_matching_chunks_first(workspace):
+    path = _billing(workspace)
+    workspace("app/other.py", "def unrelated():\n    pass\n")
+    hits = retrieve("invoice total is wrong", workspace.root, k=3)
+    assert hits[0].startswith(f"{path}:1-")
+    assert "  1: def compute_invoice_total(items):" in hits[0]
+    assert retrieve("zzzunknown", workspace.root) == [
+        "没有找到与查询相关的内容: zzzunknown"
+    ]
+
+
+def test_retrieve_chunks_files_and_follows_edits(workspace):
+    configure_retrieval(chunk_lines=2)
+    path = workspace("long.py", "a = 1\nb = 2\nc = 3\nshipping = 4\n")
+    assert retrieve("shipping", workspace.root, k=1)[0].startswith(
+        f"{path}:3-4 "
+    )
+    assert replace_in_file(path, "shipping", "freight")
+    assert retrieve("freight", workspace.root, k=1)[0].startswith(
+        f"{path}:3-4 "
+    )
+    assert retrieve("shipping", workspace.root)[0].startswith("没有找到")
+
+
+def test_file_size_limit_gets_its_own_index(workspace):
+    _billing(workspace)
+    workspace("app/big.py", "invoice = 1\n" * 200)
+
+    def found_big(limit):
+        configure_retrieval(max_file_bytes=limit)
+        hits = retrieve("invoice", workspace.root)
+        return any("big.py" in hit for hit in hits)
+
+    assert not found_big(100)
+    assert found_big(1024 * 1024)
+    # 改回原上限时复用原来的索引，而不是沿用刚才建的条目
+    assert not found_big(100)
+
+
+def test_priming_adds_a_retrieval_step_before_the_first_lm_call(workspace):
+    path = _billing(workspace)
+    agent = make_agent(
+        finish(),
+        retrieval=RetrievalConfig(prime_first_step=True, prime_k=2),
+        search=SearchConfig(
+            index_dir=os.path.join(workspace.root, ".index")
+        ),
+    )
+    try:
+        result = agent.run("fix the invoice total", workspace=workspace.root)
+    finally:
+        agent.close()
+    trajectory = result.trajectory
+    assert trajectory["tool_calls_0"][0]["name"] == "retrieve"
+    assert trajectory["observation_0_1"][0].startswith(f"{path}:1-")
+    assert trajectory["tool_calls_1"][0]["name"] == "finish"
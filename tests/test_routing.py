@@ -0,0 +1,130 @@
+import os
+
+import pytest
+from dspy.utils.dummies import DummyLM
+from dspy.utils.exceptions import ContextWindowExceededError
+
+from core.config import RetrievalConfig
+from core.react import BatchReAct
+
+from .helpers import finish, make_agent, step
+
+
+class OverflowLM(DummyLM):
+    """A fast model whose context window nothing fits into."""
+
+    def __init__(self):
+        super().__init__([])
+        self.model = "fast-dummy"
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        raise ContextWindowExceededError(model=self.model)
+
+
+def test_fast_overflow_escalates_before_truncating(workspace):
+    alpha = os.path.join(workspace.root, "pkg", "alpha.py")
+    beta = os.path.join(workspace.root, "pkg", "beta.py")
+    answers = [
+        step(("read_file", {"file_path": alpha})),
+        step(("read_file", {"file_path": beta})),
+        *finish("both read"),
+    ]
+    fast = OverflowLM()
+    agent = make_agent(
+        answers,
+        fast_lm=fast,
+        retrieval=RetrievalConfig(prime_first_step=False),
+    )
+    try:
+        result = agent.run("read both files")
+    finally:
+        agent.close()
+    assert result.solution == "both read"
+    # 每一步快速模型都只试一次，没有为它截断轨迹
+    assert fast.calls == 3
+    assert result.routing["escalations"] == {"context_window": 3}
+    assert len(agent.lm.history) == len(answers)
+    assert "thought_0" in result.trajectory
+    last_prompt = str(agent.lm.history[2]["messages"])
+    assert "needle one" in last_prompt
+
+
+def _trajectory():
+    return {
+        "thought_0": "look",
+        "tool_calls_0": [],
+        "observation_0_1": "first",
+        "thought_1": "again",
+        "tool_calls_1": [],
+        "observation_1_1": "second",
+    }
+
+
+def test_truncation_works_on_a_copy():
+    react = BatchReAct("question -> answer", tools=[])
+    trajectory = _trajectory()
+    prompts = []
+
+    def module(**kwargs):
+        prompts.append(kwargs["trajectory"])
+        if len(prompts) == 1:
+            raise ContextWindowExceededError(model="strong")
+        return "ok"
+
+    result = react._call_with_potential_trajectory_truncation(
+        module, trajectory, question="q"
+    )
+    assert result == "ok"
+    assert trajectory == _trajectory()
+    assert "first" in prompts[0] and "first" not in prompts[1]
+    assert "second" in prompts[1]
+
+    prompts.clear()
+    with pytest.raises(ContextWindowExceededError):
+        react._call_with_potential_trajectory_truncation(
+            module, trajectory, truncate=False, question="q"
+        )
+    assert len(prompts) == 1
+
+
+def test_doubtful_fast_steps_escalate_with_their_reason(workspace):
+    alpha = os.path.join(workspace.root, "pkg", "alpha.py")
+    beta = os.path.join(workspace.root, "pkg", "beta.py")
+    read_alpha = ("read_file", {"file_path": alpha})
+    fast = DummyLM([
+        step(read_alpha),
+        step(read_alpha),
+        step(("no_such_tool", {})),
+        step(),
+        # 解析失败时 dspy 会换一种格式再问一次
+        {"unrelated": "output"},
+        {"unrelated": "output"},
+        step(("finish", {})),
+    ])
+    fast.model = "fast-dummy"
+    strong = [
+        step(("read_file", {"file_path": beta})),
+        step(read_alpha),
+        step(("list_file_tree", {"root_path": workspace.root})),
+        step(("read_file", {"file_path": beta, "start_line": 2})),
+        *finish("checked"),
+    ]
+    agent = make_agent(strong, fast_lm=fast)
+    try:
+        result = agent.run("look around")
+    finally:
+        agent.close()
+    assert result.solution == "checked"
+    routing = result.routing
+    assert routing["fast_steps"] == 1
+    assert routing["escalations"] == {
+        reason: 1
+        for reason in (
+            "repeat", "unknown_tool", "no_calls", "parse_error", "finish"
+        )
+    }
+    assert routing["models"]["fast-dummy"]["calls"] == 6
+    assert routing["models"]["dummy"]["calls"] == 6
+    assert agent.model_stats()["escalated_steps"] == 5
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+from core.tool import replace_in_file, search_in_files
+from core.tool.search_index import (
+    TrigramIndex,
+    required_literals,
+    required_trigrams,
+)
+from core.tool.search_tools import configure_search
+
+
+def _names(paths):
+    return sorted(os.path.basename(p) for p in paths)
+
+
+def _age_dirs(root):
+    """把目录的 mtime 调到一小时前，使其不再处于 RACY_MTIME_NS 窗口内"""
+    past = time.time() - 3600
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (past, past))
+
+
+def test_required_literals_are_conservative():
+    assert required_literals(r"def\s+alpha") == ["def", "alpha"]
+    assert required_literals(r"(?i)needle") == []
+    assert required_literals(r"a|b") == []
+    assert required_literals(r"x(yz)?w") == ["x", "w"]
+    assert required_trigrams(r"needle") == {"nee", "eed", "edl", "dle"}
+
+
+def test_indexed_search_matches_full_scan(workspace):
+    root = workspace.root
+    for pattern in (r"needle", r"def\s+\w+", r"ret.rn 'oth", r"(?i)NEEDLE"):
+        configure_search(use_index=False)
+        expected = search_in_files(root, pattern)
+        configure_search(use_index=True)
+        assert search_in_files(root, pattern) == expected
+
+
+def test_write_tools_reindex_within_refresh_interval(workspace):
+    configure_search(index_refresh_interval=3600)
+    root = workspace.root
+    assert _names(search_in_files(root, "haystack")) == []
+    beta = os.path.join(root, "pkg", "beta.py")
+    assert replace_in_file(beta, "other", "haystack")
+    assert _names(search_in_files(root, "haystack")) == ["beta.py"]
+
+
+def test_external_changes_are_seen_by_the_next_search(workspace):
+    root = workspace.root
+    notes = workspace("notes/todo.txt", "nothing yet\n")
+    _age_dirs(root)
+    assert search_in_files(root, "fresh_token") == []
+    # 新增和删除改变所在目录的 mtime，下一次查询立即可见
+    workspace("pkg/gamma.py", "fresh_token = 1\n")
+    os.remove(os.path.join(root, "docs", "readme.txt"))
+    assert _names(search_in_files(root, "fresh_token")) == ["gamma.py"]
+    assert _names(search_in_files(root, "needle")) == ["alpha.py"]
+    # 原地改写由完整遍历发现
+    with open(notes, "a", encoding="utf-8") as f:
+        f.write("fresh_token = 2\n")
+    configure_search(index_refresh_interval=0)
+    assert _names(search_in_files(root, "fresh_token")) == [
+        "gamma.py", "todo.txt",
+    ]
+
+
+def test_repeat_search_does_not_stat_every_file(workspace, monkeypatch):
+    root = workspace.root
+    for i in range(50):
+        workspace(f"src/m{i}.py", f"value_{i} = {i}\n")
+    workspace("src/target.py", "unique_marker = 1\n")
+    _age_dirs(root)
+    assert _names(search_in_files(root, "unique_marker")) == ["target.py"]
+
+    statted = []
+    real_stat = os.stat
+    monkeypatch.setattr(
+        os, "stat", lambda path, *a, **kw: statted.append(path)
+        or real_stat(path, *a, **kw),
+    )
+    found = search_in_files(root, "unique_marker")
+    monkeypatch.undo()
+    assert _names(found) == ["target.py"]
+    # 只 stat 了目录和匹配的文件
+    files = {p for p in statted if not os.path.isdir(p)}
+    assert files <= set(found)
+
+
+def test_atomic_write_temp_files_are_not_listed(workspace):
+    workspace("pkg/.alpha.py.0123abcd.tmp", "needle in flight\n")
+    for use_index in (True, False):
+        configure_search(use_index=use_index)
+        assert _names(search_in_files(workspace.root, "needle")) == [
+            "alpha.py", "readme.txt",
+        ]
+
+
+def test_save_is_throttled(workspace, tmp_path):
+    index = TrigramIndex(workspace.root, index_dir=str(tmp_path / "i"))
+    index.update([(p, os.stat(p)) for p in [workspace("a.txt", "abcd")]])
+    index.save()
+    saved = os.stat(index.path).st_mtime_ns
+    index.update([(p, os.stat(p)) for p in [workspace("b.txt", "efgh")]])
+    index.save()
+    assert os.stat(index.path).st_mtime_ns == saved
+    index.save(force=True)
+    reloaded = TrigramIndex(workspace.root, index_dir=str(tmp_path / "i"))
+    assert len(reloaded.files) == 2
+
+
+def test_concurrent_searches_share_one_index(workspace):
+    root = workspace.root
+    files = [
+        workspace(f"gen/m{i}.py", f"value_{i} = 'needle' # 0\n")
+        for i in range(8)
+    ]
+    configure_search(index_refresh_interval=0)
+    expected = sorted(search_in_files(root, "needle"))
+    errors, results = [], []
+
+    def worker(path):
+        try:
+            for k in range(1, 6):
+                # 原子写入，读者不会看到写了一半的文件
+                replace_in_file(path, r"# \d+", f"# {k}")
+                results.append(sorted(search_in_files(root, "needle")))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in files]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(results) == 40
+    assert all(result == expected for result in results)
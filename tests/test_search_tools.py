@@ -0,0 +1,143 @@
+import asyncio
+import os
+
+import pytest
+
+from core.tool import (
+    aiter_search_matches,
+    iter_search_matches,
+    search_in_files,
+    search_matches,
+    search_tools,
+)
+from core.tool.search_tools import _literal_bytes, _scan_chunk
+
+
+def test_literals_are_encoded_without_a_bom():
+    assert _literal_bytes("needle", "utf-8-sig") == [b"needle"]
+    assert _literal_bytes("needle", "utf-16-le") == [
+        "needle".encode("utf-16-le")
+    ]
+    # 字节序由文件的 BOM 决定：不按字节过滤
+    assert _literal_bytes("needle", "utf-16") == []
+    assert _literal_bytes("needle", "no-such-codec") == []
+
+
+def test_bom_files_match_in_the_parallel_scan(workspace):
+    data = "first\nneedle here\n".encode("utf-8-sig")
+    path = workspace("bom.txt", data=data)
+    assert _scan_chunk([path], "needle", "utf-8-sig", None) == [path]
+
+
+@pytest.mark.parametrize("threshold", [1 << 30, 1])
+def test_small_and_mmap_files_share_newline_handling(
+    workspace, monkeypatch, threshold
+):
+    monkeypatch.setattr(search_tools, "MMAP_THRESHOLD", threshold)
+    old_mac = workspace("cr.txt", data=b"start\rneedle end\rtail\r")
+    windows = workspace("crlf.txt", data=b"start\r\nneedle end\r\ntail\r\n")
+    assert _scan_chunk([old_mac, windows], r"needle end$", "utf-8", None) == [
+        old_mac,
+        windows,
+    ]
+
+
+def test_serial_and_parallel_engines_agree(workspace):
+    workspace("cr.txt", data=b"one\rneedle end\r")
+    workspace("bom.py", data="x = 1\nneedle end\n".encode("utf-8-sig"))
+    search_tools.configure_search(workers=2, use_index=False)
+    serial = search_in_files(workspace.root, r"needle end$", engine="serial")
+    parallel = search_in_files(
+        workspace.root, r"needle end$", engine="parallel"
+    )
+    assert sorted(serial) == sorted(parallel)
+    assert len(serial) == 2
+
+
+def test_search_matches_formats_lines_and_context(workspace):
+    path = workspace("ctx.txt", "one\ntwo needle\nthree\n")
+    os.remove(os.path.join(workspace.root, "pkg", "alpha.py"))
+    os.remove(os.path.join(workspace.root, "docs", "readme.txt"))
+    assert search_matches(workspace.root, "needle", context_lines=1) == [
+        f"{path}-1- one",
+        f"{path}:2: two needle",
+        f"{path}-3- three",
+    ]
+
+
+def test_matches_skip_binary_files_and_cap_per_file(workspace):
+    workspace("blob.bin", data=b"\0needle\n")
+    path = workspace("many.txt", "needle\n" * 5)
+    matches = [
+        match
+        for match in iter_search_matches(
+            workspace.root, "needle", max_matches_per_file=2
+        )
+        if match.path == path
+    ]
+    assert [match.line_no for match in matches] == [1, 2]
+    found = {m.path for m in iter_search_matches(workspace.root, "needle")}
+    assert not any(path.endswith("blob.bin") for path in found)
+    assert not any("node_modules" in path for path in found)
+
+
+def test_iteration_stops_reading_files_at_max_results(
+    workspace, monkeypatch
+):
+    for i in range(20):
+        workspace(f"many/f{i}.txt", "needle\n")
+    reads = []
+    read_bytes = search_tools.content_cache.read_bytes
+    monkeypatch.setattr(
+        search_tools.content_cache,
+        "read_bytes",
+        lambda path: reads.append(path) or read_bytes(path),
+    )
+    matches = iter_search_matches(workspace.root, "needle", max_results=3)
+    assert len(list(matches)) == 3
+    assert len(reads) == 3
+
+
+def test_large_files_are_streamed_past_the_content_cache(
+    workspace, monkeypatch
+):
+    path = workspace(
+        "big.log", "head\nneedle here\ntail\n" + "filler line\n" * 400_000
+    )
+    opened = []
+    monkeypatch.setattr(
+        search_tools,
+        "open",
+        lambda *args, **kwargs: opened.append(open(*args, **kwargs))
+        or opened[-1],
+        raising=False,
+    )
+    monkeypatch.setattr(
+        search_tools.content_cache,
+        "read_bytes",
+        lambda path: pytest.fail(f"read {path} through the cache"),
+    )
+    monkeypatch.setattr(search_tools, "STREAM_THRESHOLD", 0)
+    matches = iter_search_matches(
+        os.path.dirname(path), "needle", context_lines=1
+    )
+    match = next(m for m in matches if m.path == path)
+    assert (match.line_no, match.before, match.after) == (
+        2, ("head",), ("tail",),
+    )
+    big = next(f for f in opened if f.name == path)
+    # 找到匹配后只读了开头的少量缓冲，没有读完整个文件
+    assert big.tell() < os.path.getsize(path) // 10
+    matches.close()
+    assert big.closed
+
+
+def test_async_iteration_matches_the_sync_iterator(workspace):
+    async def collect():
+        return [m async for m in aiter_search_matches(
+            workspace.root, "needle"
+        )]
+
+    assert asyncio.run(collect()) == list(
+        iter_search_matches(workspace.root, "needle")
+    )
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from core.config import AgentConfig, Config, DSPyConfig, ServerConfig
+from core.server import AgentServer
+
+from .helpers import finish, make_agent, step
+
+TOKEN = "secret-token"
+
+
+def _server(answers, **settings) -> AgentServer:
+    settings.setdefault("port", 0)
+    config = Config(
+        dspy=DSPyConfig(model="dummy", api_key="test"),
+        agent=AgentConfig(),
+        server=ServerConfig(agents=1, **settings),
+    )
+    server = AgentServer(config=config)
+    server._create_agents = lambda: server.agents.append(make_agent(answers))
+    return server
+
+
+async def _request(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    head = {"Content-Length": str(len(data)), **(headers or {})}
+    lines = [f"{method} {path} HTTP/1.1", "Host: test"]
+    lines += [f"{name}: {value}" for name, value in head.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, head.decode("latin-1"), payload
+
+
+def _events(payload: bytes):
+    """Decode a chunked NDJSON body; check it ends with the last chunk."""
+    events = []
+    while True:
+        size, _, payload = payload.partition(b"\r\n")
+        size = int(size, 16)
+        if size == 0:
+            return events
+        events.append(json.loads(payload[:size]))
+        payload = payload[size + 2:]
+
+
+def _serve(server, scenario):
+    async def main():
+        listener = await server.start()
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+
+    return asyncio.run(main())
+
+
+JSON = {"Content-Type": "application/json"}
+AUTH = {**JSON, "Authorization": f"Bearer {TOKEN}"}
+
+
+def test_requests_need_the_token_and_json():
+    server = _server([], token=TOKEN)
+    body = {"requirement": "hi"}
+    cases = [
+        ("GET", "/health", None, {}, 401),
+        ("GET", "/health", None, {"Authorization": "Bearer wrong"}, 401),
+        ("POST", "/run", body, {**AUTH, "Content-Type": "text/plain"}, 415),
+        ("POST", "/run", body, {**AUTH, "Origin": "http://evil.test"}, 403),
+        ("GET", "/health", None, AUTH, 200),
+    ]
+
+    async def scenario(port):
+        return [
+            (await _request(port, method, path, data, headers))[0]
+            for method, path, data, headers, _ in cases
+        ]
+
+    assert _serve(server, scenario) == [case[-1] for case in cases]
+
+
+def test_public_address_requires_a_token():
+    server = _server([], host="0.0.0.0")
+    with pytest.raises(ValueError, match="server.token"):
+        asyncio.run(server.start())
+
+
+def test_workspace_must_lie_in_workspace_root(tmp_path):
+    outside = _server([])
+    root = tmp_path / "root"
+    (root / "repo").mkdir(parents=True)
+    inside = _server([], workspace_root=str(root))
+    expected = (str((root / "repo").resolve()), False)
+    assert inside._workspace("repo") == expected
+    for server, requested in ((outside, str(tmp_path)), (inside, "..")):
+        async def scenario(port, requested=requested):
+            return await _request(port, "POST", "/run", {
+                "requirement": "hi", "workspace": requested}, JSON)
+
+        status, _, payload = _serve(server, scenario)
+        assert status == 400, payload
+
+
+def test_tools_are_confined_to_a_fresh_workspace(tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("top secret")
+    answers = [
+        step(("read_file", {"file_path": str(secret)})),
+        *finish("checked"),
+    ]
+    server = _server(answers)
+
+    async def scenario(port):
+        return await _request(port, "POST", "/run", {"requirement": "x"}, JSON)
+
+    status, _, payload = _serve(server, scenario)
+    events = _events(payload)
+    assert status == 200
+    workspace = events[0]["workspace"]
+    denied = [
+        e for e in events
+        if e["event"] == "tool_result" and e["name"] == "read_file"
+    ]
+    assert denied and "Access denied" in denied[0]["error"]
+    assert "top secret" not in payload.decode()
+    assert events[-1]["event"] == "result"
+    assert events[-1]["solution"] == "checked"
+    assert not os.path.exists(workspace)
+
+
+def test_failures_end_the_stream_with_an_error_event():
+    server = _server([])
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    async def scenario(port):
+        server.agents[0].astream = broken
+        return await _request(port, "POST", "/run", {"requirement": "x"}, JSON)
+
+    status, _, payload = _serve(server, scenario)
+    events = _events(payload)
+    assert status == 200
+    assert events[-1]["event"] == "error"
+    assert "RuntimeError: boom" in events[-1]["error"]
+    assert server.status()["idle"] == 1
+
+
+def test_confined_paths_resolve_in_the_workspace(tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("top secret\n")
+    repo = tmp_path / "root" / "repo"
+    repo.mkdir(parents=True)
+    (repo / "notes.txt").write_text("secret plans are public\n")
+    (repo / "leak.txt").symlink_to(secret)
+    answers = [
+        step(
+            ("search_matches", {"root_path": ".", "pattern": "secret"}),
+            ("read_file", {"file_path": "notes.txt"}),
+        ),
+        *finish("checked"),
+    ]
+    server = _server(answers, workspace_root=str(tmp_path / "root"))
+
+    async def scenario(port):
+        return await _request(port, "POST", "/run", {
+            "requirement": "x", "workspace": "repo"}, JSON)
+
+    status, _, payload = _serve(server, scenario)
+    results = {
+        e["name"]: e for e in _events(payload) if e["event"] == "tool_result"
+    }
+    assert status == 200
+    assert results["read_file"]["error"] is None
+    assert results["read_file"]["observation"] == "secret plans are public\n"
+    matches = results["search_matches"]["observation"]
+    assert [m.split(":")[0] for m in matches] == [str(repo / "notes.txt")]
+    assert "top secret" not in payload.decode()
+
+
+def test_agent_pool_does_not_change_global_dspy_settings():
+    import dspy
+
+    default = dspy.settings.async_max_workers
+    config = Config(
+        dspy=DSPyConfig(model="dummy", api_key="test"),
+        agent=AgentConfig(),
+        server=ServerConfig(agents=default + 2),
+    )
+    server = AgentServer(config=config)
+    server._create_agents()
+    try:
+        assert dspy.settings.async_max_workers == default
+        with server.agents[0]._run_context():
+            assert dspy.settings.async_max_workers == default + 2
+    finally:
+        server.close()
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+
+
+def test_importing_core_agent_skips_heavy_dependencies():
+    heavy = ("dspy", "pydantic", "yaml", "litellm", "playwright", "bs4")
+    loaded = _python(
+        "import sys, core.agent\n"
+        f"print([m for m in {heavy!r} if m in sys.modules])"
+    )
+    assert loaded == "[]"
+
+
+def test_signature_is_created_once_on_first_access():
+    import core.agent
+
+    first = core.agent.CodeAgentSignature
+    assert core.agent.CodeAgentSignature is first
+    assert "requirement" in first.input_fields
+    with pytest.raises(AttributeError):
+        core.agent.no_such_attribute
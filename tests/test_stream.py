@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from contextlib import aclosing
+
+from dspy.utils.dummies import DummyLM
+
+from .helpers import finish, make_agent, step
+
+
+def _script(path):
+    return [
+        step(("read_file", {"file_path": path}), thought="look"),
+        step(("read_file", {"file_path": path, "start_line": 2})),
+        *finish("all done"),
+    ]
+
+
+def test_stream_yields_step_events_then_the_result(workspace):
+    path = workspace("a.txt", "one\ntwo\n")
+    agent = make_agent(_script(path))
+    try:
+        events = list(agent.stream("read it", stream_tokens=False))
+    finally:
+        agent.close()
+    kinds = [event["event"] for event in events]
+    assert kinds[:4] == ["step", "thought", "tool_call", "tool_result"]
+    assert kinds.count("step") == 3 and kinds[-1] == "result"
+    assert events[1]["text"] == "look"
+    result = events[-1]
+    assert (result["solution"], result["steps"]) == ("all done", 3)
+    tool_result = events[3]
+    assert tool_result["observation"] == "one\ntwo\n"
+    assert tool_result["error"] is None
+
+
+class _GatedLM(DummyLM):
+    """Holds every call after the first until the gate opens."""
+
+    def __init__(self, answers, gate):
+        super().__init__(answers)
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls > 1:
+            self.gate.wait(5)
+        return super().__call__(*args, **kwargs)
+
+
+def test_closing_the_stream_cancels_the_run(workspace):
+    path = workspace("a.txt", "one\ntwo\n")
+    cancel = threading.Event()
+    lm = _GatedLM(_script(path), cancel)
+    agent = make_agent([], lm=lm)
+    seen = []
+
+    async def until_first_tool_call():
+        events = agent.astream("read it", False, cancel)
+        async with aclosing(events):
+            async for event in events:
+                seen.append(event["event"])
+                if event["event"] == "tool_call":
+                    break
+
+    try:
+        asyncio.run(until_first_tool_call())
+    finally:
+        agent.close()
+    assert cancel.is_set() and seen[-1] == "tool_call"
+    # 关闭时等待运行停止：第二步的 LM 调用最多开始一次，不会走到最终答案
+    assert lm.calls <= 2
+
+
+def test_a_preset_cancel_event_ends_with_cancelled(workspace):
+    agent = make_agent(_script(workspace("a.txt", "x\n")))
+    cancel = threading.Event()
+    cancel.set()
+
+    async def collect():
+        return [e async for e in agent.astream("go", False, cancel)]
+
+    try:
+        events = asyncio.run(collect())
+    finally:
+        agent.close()
+    assert [event["event"] for event in events] == ["cancelled"]
+    assert events[0]["run_id"] is None
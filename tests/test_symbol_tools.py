@@ -0,0 +1,89 @@
+from core.tool import (
+    file_outline,
+    find_references,
+    find_symbol,
+    replace_in_file,
+)
+
+SOURCE = '''import os
+from typing import List
+
+LIMIT = 3
+
+
+class Runner:
+    """Runs things."""
+
+    def run(self, steps: int = 1) -> List[str]:
+        # run in a comment
+        return ["run"] * steps
+
+
+def run(path):
+    return Runner().run(LIMIT) + [os.sep]
+'''
+
+
+def _tree(workspace):
+    path = workspace("pkg/mod.py", SOURCE)
+    use = workspace("pkg/use.py", "x = Runner().run()\n")
+    workspace("docs/run.txt", "run Runner.run\n")
+    return path, use
+
+
+def test_find_symbol_returns_definition_spans(workspace):
+    path, _ = _tree(workspace)
+    root = workspace.root
+    assert find_symbol(root, "run") == [
+        f"{path}:10-12: method Runner.run(self, steps: int=1) -> List[str]",
+        f"{path}:15-16: function run(path)",
+    ]
+    assert find_symbol(root, "Runner.run", kind="method") == [
+        f"{path}:10-12: method Runner.run(self, steps: int=1) -> List[str]",
+    ]
+    assert find_symbol(root, "List") == []
+    assert find_symbol(root, "List", include_imports=True) == [
+        f"{path}:2: from typing import List"
+    ]
+    assert find_symbol(root, "run", kind="bogus")[0].startswith("❌")
+
+
+def test_find_symbol_sees_edits_made_by_write_tools(workspace):
+    path, _ = _tree(workspace)
+    assert find_symbol(workspace.root, "Runner") == [
+        f"{path}:7-12: class Runner"
+    ]
+    assert replace_in_file(
+        path, "LIMIT = 3\n", "LIMIT = 3\n\n\nclass Runner2:\n    pass\n"
+    )
+    assert find_symbol(workspace.root, "Runner2") == [
+        f"{path}:7-8: class Runner2"
+    ]
+    assert find_symbol(workspace.root, "Runner") == [
+        f"{path}:11-16: class Runner"
+    ]
+
+
+def test_find_references_skips_strings_comments_and_definitions(workspace):
+    path, use = _tree(workspace)
+    assert find_references(workspace.root, "Runner.run") == [
+        f"{path}:16: return Runner().run(LIMIT) + [os.sep]",
+        f"{use}:1: x = Runner().run()",
+    ]
+    assert find_references(workspace.root, "run", max_results=1)[-1] == (
+        "...（已达到 1 条上限，请缩小范围）"
+    )
+
+
+def test_file_outline_lists_nested_spans(workspace):
+    path, _ = _tree(workspace)
+    assert file_outline(path).splitlines() == [
+        f"{path} (16 行)",
+        "4-4 variable LIMIT",
+        "7-12 class Runner",
+        "  10-12 method run(self, steps: int=1) -> List[str]",
+        "15-16 function run(path)",
+    ]
+    assert "import os" in file_outline(path, include_imports=True)
+    broken = workspace("pkg/broken.py", "def (:\n")
+    assert file_outline(broken).startswith("❌ 无法解析")
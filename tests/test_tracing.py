@@ -0,0 +1,60 @@
+import json
+
+from core.config import TracingConfig
+from core.tracing import CallbackSink, JsonlSink, MemorySink, Tracer, byte_size
+
+from .helpers import finish, make_agent, step
+
+
+def test_run_trace_fans_spans_out_to_every_sink(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    memory, seen = MemorySink(max_spans=2), []
+
+    def broken(span):
+        raise RuntimeError("sink down")
+
+    tracer = Tracer([JsonlSink(str(path)), memory, CallbackSink(broken)])
+    tracer.add_sink(CallbackSink(seen.append))
+    trace = tracer.start_run("run1")
+    start = trace._t0
+    trace.record("tool", "read_file", start, step=0, output_bytes=10)
+    trace.record("lm", "model", start, prompt_tokens=5, completion_tokens=2)
+    total = trace.finish(steps=1)
+    tracer.close()
+
+    # 一个 sink 出错不影响其他 sink
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["kind"] for line in lines] == ["tool", "lm", "run"]
+    assert [span.kind for span in memory.spans] == ["lm", "run"]
+    assert len(seen) == 3
+    assert (total.prompt_tokens, total.completion_tokens) == (5, 2)
+    summary = trace.summary()
+    assert "read_file" in summary
+    assert "run run1:" in summary and "1 steps" in summary
+
+
+def test_byte_size_measures_utf8_json():
+    assert byte_size("é") == 2
+    assert byte_size({"a": 1}) == len('{"a": 1}')
+
+
+def test_agent_records_lm_and_tool_spans(workspace, capsys):
+    path = workspace("a.txt", "hello\n")
+    agent = make_agent(
+        [step(("read_file", {"file_path": path})), *finish()],
+        tracing=TracingConfig(enabled=True, memory=True),
+    )
+    extra = []
+    agent.add_trace_sink(CallbackSink(extra.append))
+    try:
+        agent("read a file")
+    finally:
+        agent.close()
+    spans = agent.trace_spans()
+    kinds = [span.kind for span in spans]
+    assert kinds.count("lm") == 3
+    tool = next(span for span in spans if span.kind == "tool")
+    assert (tool.name, tool.step, tool.output_bytes) == ("read_file", 0, 6)
+    assert kinds[-1] == "run" and spans[-1].step == 2
+    assert len(extra) == len(spans)
+    assert "📊 运行统计" in capsys.readouterr().out
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from core.tool import web_tools
+from core.tool.web_tools import (
+    _cached_render,
+    fetch_website_html,
+    normalize_url,
+)
+
+
+def test_normalize_url_ignores_cosmetic_differences():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&a=1#frag") == (
+        normalize_url("https://example.com/a?a=1&b=2")
+    )
+    assert normalize_url("http://example.com") == "http://example.com/"
+
+
+class _FakePage:
+    def __init__(self, html):
+        self.html = html
+        self.urls = []
+
+    async def goto(self, url, wait_until=None):
+        self.urls.append(url)
+
+    async def content(self):
+        return self.html
+
+
+class _RenderingPool:
+    """Runs renders against a fake page in the caller's event loop."""
+
+    def __init__(self, html):
+        self.page = _FakePage(html)
+
+    async def run(self, render):
+        return await render(self.page)
+
+
+def test_fetched_pages_are_cached_under_the_normalized_url(monkeypatch):
+    html = "<html><body><main><h1>Title</h1><p>Body text</p></main></body>"
+    pool = _RenderingPool(html)
+    monkeypatch.setattr(web_tools, "get_browser_pool", lambda: pool)
+
+    def fetch(url, **kwargs):
+        return asyncio.run(fetch_website_html(url, wait=0, **kwargs))
+
+    assert "# Title" in fetch("https://example.com/doc?b=1&a=2")
+    assert fetch("HTTPS://example.com:443/doc?a=2&b=1", mode="html") == html
+    assert pool.page.urls == ["https://example.com/doc?b=1&a=2"]
+    # 需要最新内容时绕过缓存
+    assert fetch("https://example.com/doc?a=2&b=1", mode="text",
+                 use_cache=False).startswith("Title")
+    assert len(pool.page.urls) == 2
+
+
+class _FakePool:
+    """Completes submitted renders on its own "browser loop" thread."""
+
+    def __init__(self, value):
+        self.value = value
+        self.runs = 0
+
+    async def run(self, render):
+        self.runs += 1
+        return self.value
+
+    def submit(self, render):
+        future = Future()
+
+        def finish():
+            future.set_result(self.value)
+
+        threading.Thread(target=finish, name="browser-loop").start()
+        return future
+
+
+class _RecordingCache:
+    def __init__(self, value, age):
+        self.entry = (value, time.time() - age)
+        self.writes = []
+
+    def get(self, key):
+        return self.entry
+
+    def set(self, key, value):
+        self.writes.append((key, value, threading.current_thread().name))
+        self.entry = (value, time.time())
+
+
+def test_stale_entries_refresh_off_the_browser_loop(monkeypatch):
+    pool = _FakePool("fresh")
+    cache = _RecordingCache("stale", age=10 * 24 * 3600)
+    monkeypatch.setattr(web_tools, "get_browser_pool", lambda: pool)
+    monkeypatch.setattr(web_tools, "get_web_cache", lambda: cache)
+
+    value = asyncio.run(_cached_render("k", None, use_cache=True))
+    assert value == "stale"
+    deadline = time.monotonic() + 5
+    while web_tools._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    [(key, fresh, thread)] = cache.writes
+    assert (key, fresh) == ("k", "fresh")
+    assert thread.startswith("web-cache-write")
+    assert "k" not in web_tools._refreshing
+    assert asyncio.run(_cached_render("k", None, use_cache=True)) == "fresh"
+    assert pool.runs == 0